@@ -0,0 +1,95 @@
+"""Checkpoints of the stages of a run, so that a failed run can be resumed instead of started over.
+
+Each stage writes its output to a run directory under ``executor.cache_dir``, keyed by the date and a hash
+of the config, so that a resumed run only picks up the work of the same day with the same settings. A run
+with ``executor.resume`` reuses the stages that completed, and redoes the rest.
+"""
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, fields
+from datetime import datetime
+from typing import Any
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+from .protocol import CorpusPaper, Paper
+
+
+def config_hash(config:DictConfig) -> str:
+    """Hash of the settings that shape the output of a run, leaving out whether it resumes.
+
+    Interpolations are hashed as written, so that secrets read from the environment are never resolved here.
+    """
+    settings = OmegaConf.to_container(config, resolve=False)
+    settings.get("executor", {}).pop("resume", None)
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def paper_to_dict(paper:Paper) -> dict[str, Any]:
+    # The full text is left out: it is large, and the artifact cache keeps it across runs anyway.
+    data = asdict(paper)
+    data.pop("full_text")
+    if data["score"] is not None:
+        data["score"] = float(data["score"])
+    return data
+
+
+def paper_from_dict(data:dict[str, Any]) -> Paper:
+    names = {f.name for f in fields(Paper)}
+    return Paper(**{k: v for k, v in data.items() if k in names})
+
+
+def corpus_paper_to_dict(paper:CorpusPaper) -> dict[str, Any]:
+    return {**asdict(paper), "added_date": paper.added_date.isoformat()}
+
+
+def corpus_paper_from_dict(data:dict[str, Any]) -> CorpusPaper:
+    return CorpusPaper(**{**data, "added_date": datetime.fromisoformat(data["added_date"])})
+
+
+class RunCheckpoint:
+    """The run directory of one day and config, with one JSON file per completed stage."""
+    def __init__(self, config:DictConfig, date:str | None = None):
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        self.path = os.path.join(config.executor.cache_dir, "runs", f"{date}-{config_hash(config)}")
+        self.resume = bool(config.executor.get("resume"))
+        if self.resume and os.path.isdir(self.path):
+            logger.info(f"Resuming the run in {self.path}, completed stages: {', '.join(self.stages()) or 'none'}")
+        else:
+            if self.resume:
+                logger.info(f"No earlier run to resume in {self.path}, starting from scratch")
+            shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+    def stages(self) -> list[str]:
+        return sorted(f.removesuffix(".json") for f in os.listdir(self.path) if f.endswith(".json"))
+
+    def load(self, stage:str) -> Any | None:
+        """The output of a completed stage, or None if it has not completed."""
+        path = os.path.join(self.path, f"{stage}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, stage:str, data:Any):
+        path = os.path.join(self.path, f"{stage}.json")
+        # Written under a temporary name first, so that a crash never leaves a truncated checkpoint behind.
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def load_corpus(self) -> list[CorpusPaper] | None:
+        data = self.load("corpus")
+        return None if data is None else [corpus_paper_from_dict(d) for d in data]
+
+    def save_corpus(self, corpus:list[CorpusPaper]):
+        self.save("corpus", [corpus_paper_to_dict(c) for c in corpus])
+
+    def load_papers(self, stage:str) -> list[Paper] | None:
+        data = self.load(stage)
+        return None if data is None else [paper_from_dict(d) for d in data]
+
+    def save_papers(self, stage:str, papers:list[Paper]):
+        self.save(stage, [paper_to_dict(p) for p in papers])
@@ -0,0 +1,2 @@
+from .base import get_corpus_source_cls
+from . import api, sqlite
@@ -0,0 +1,35 @@
+from .base import BaseCorpusSource, register_corpus_source, resolve_collection_paths, CORPUS_ITEM_TYPES
+from .mirror import ZoteroMirror
+from ..protocol import CorpusPaper
+from pyzotero import zotero
+from datetime import datetime
+from loguru import logger
+import os
+
+
+@register_corpus_source("api")
+class ApiCorpusSource(BaseCorpusSource):
+    def fetch_corpus(self) -> list[CorpusPaper]:
+        zot = zotero.Zotero(self.config.zotero.user_id, 'user', self.config.zotero.api_key)
+        if cache_dir := self.config.executor.get("cache_dir"):
+            mirror = ZoteroMirror(os.path.join(cache_dir, "zotero_mirror.sqlite"))
+            try:
+                mirror.sync(zot, self.config.zotero.user_id)
+                collections = mirror.load_collections()
+                corpus = mirror.load_items()
+            finally:
+                mirror.close()
+        else:
+            collections = zot.everything(zot.collections())
+            corpus = zot.everything(zot.items(itemType=' || '.join(CORPUS_ITEM_TYPES)))
+        collection_paths = resolve_collection_paths({
+            c['key']: (c['data']['name'], c['data']['parentCollection']) for c in collections
+        })
+        corpus = [c for c in corpus if c['data']['abstractNote'] != '']
+        logger.info(f"Fetched {len(corpus)} zotero papers")
+        return [CorpusPaper(
+            title=c['data']['title'],
+            abstract=c['data']['abstractNote'],
+            added_date=datetime.strptime(c['data']['dateAdded'], '%Y-%m-%dT%H:%M:%SZ'),
+            paths=[collection_paths[col] for col in c['data']['collections']]
+        ) for c in corpus]
@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+from omegaconf import DictConfig
+from ..protocol import CorpusPaper
+from functools import cache
+from typing import Type
+
+CORPUS_ITEM_TYPES = ('conferencePaper', 'journalArticle', 'preprint')
+
+
+def resolve_collection_paths(collections:dict[str, tuple[str, str | None]]) -> dict[str, str]:
+    """Map each collection key to its full path, given the name and parent key of every collection."""
+    @cache
+    def get_collection_path(col_key:str) -> str:
+        name, parent = collections[col_key]
+        if parent in collections:
+            return get_collection_path(parent) + '/' + name
+        else:
+            return name
+    return {k: get_collection_path(k) for k in collections}
+
+
+class BaseCorpusSource(ABC):
+    name: str
+    def __init__(self, config:DictConfig):
+        self.config = config
+
+    @abstractmethod
+    def fetch_corpus(self) -> list[CorpusPaper]:
+        pass
+
+registered_corpus_sources = {}
+
+def register_corpus_source(name:str):
+    def decorator(cls):
+        registered_corpus_sources[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+def get_corpus_source_cls(name:str) -> Type[BaseCorpusSource]:
+    if name not in registered_corpus_sources:
+        raise ValueError(f"Corpus source {name} not found")
+    return registered_corpus_sources[name]
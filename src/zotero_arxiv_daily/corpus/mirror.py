@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+from typing import Any
+from loguru import logger
+from pyzotero import zotero
+from .base import CORPUS_ITEM_TYPES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS collections (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    parent TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    date_added TEXT NOT NULL,
+    collections TEXT NOT NULL
+);
+"""
+
+
+class ZoteroMirror:
+    """A local SQLite copy of the parts of a Zotero library used to build the corpus.
+
+    The mirror remembers the library version it was last synced to, so that each run only
+    pulls the items and collections modified since then and applies the deletions reported
+    by the Zotero API. An empty mirror, or one that belongs to another library, triggers a full sync.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _get_meta(self, key:str) -> str | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key:str, value:Any):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def library_version(self) -> int | None:
+        version = self._get_meta('library_version')
+        return int(version) if version is not None else None
+
+    def sync(self, zot:zotero.Zotero, library_id:str):
+        library_id = str(library_id)
+        since = self.library_version
+        if since is not None and self._get_meta('library_id') != library_id:
+            logger.info("Zotero mirror belongs to another library. Rebuilding it.")
+            since = None
+        # Read the version before fetching, so that changes made during the sync are picked up next time.
+        version = zot.last_modified_version()
+        if since is not None and version == since:
+            logger.info(f"Zotero mirror is up to date at library version {version}")
+            return
+        with self.conn:
+            if since is None:
+                logger.info("Zotero mirror is empty. Running a full sync.")
+                self.conn.execute("DELETE FROM collections")
+                self.conn.execute("DELETE FROM items")
+                collections = zot.everything(zot.collections())
+                items = zot.everything(zot.items(itemType=' || '.join(CORPUS_ITEM_TYPES)))
+            else:
+                logger.info(f"Syncing Zotero mirror from library version {since} to {version}")
+                collections = zot.everything(zot.collections(since=since))
+                # Changed items are fetched regardless of type, so that items whose type no longer qualifies get dropped.
+                items = zot.everything(zot.items(since=since))
+                deleted = zot.deleted(since=since)
+                trashed = zot.everything(zot.trash(since=since))
+                deleted_items = set(deleted.get('items', [])) | {t['key'] for t in trashed}
+                self.conn.executemany("DELETE FROM collections WHERE key = ?", [(k,) for k in deleted.get('collections', [])])
+                self.conn.executemany("DELETE FROM items WHERE key = ?", [(k,) for k in deleted_items])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO collections (key, name, parent) VALUES (?, ?, ?)",
+                [(c['key'], c['data']['name'], c['data']['parentCollection'] or None) for c in collections]
+            )
+            for item in items:
+                data = item['data']
+                if data.get('itemType') not in CORPUS_ITEM_TYPES or data.get('deleted'):
+                    self.conn.execute("DELETE FROM items WHERE key = ?", (item['key'],))
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO items (key, title, abstract, date_added, collections) VALUES (?, ?, ?, ?, ?)",
+                    (item['key'], data['title'], data.get('abstractNote', ''), data['dateAdded'], json.dumps(data.get('collections', [])))
+                )
+            self._set_meta('library_id', library_id)
+            self._set_meta('library_version', version)
+        logger.info(f"Synced {len(items)} changed items and {len(collections)} changed collections into the Zotero mirror")
+
+    def load_collections(self) -> list[dict[str, Any]]:
+        rows = self.conn.execute("SELECT key, name, parent FROM collections").fetchall()
+        return [{'key': k, 'data': {'name': name, 'parentCollection': parent or False}} for k, name, parent in rows]
+
+    def load_items(self) -> list[dict[str, Any]]:
+        rows = self.conn.execute("SELECT key, title, abstract, date_added, collections FROM items").fetchall()
+        return [{
+            'key': k,
+            'data': {
+                'title': title,
+                'abstractNote': abstract,
+                'dateAdded': date_added,
+                'collections': json.loads(collections),
+            }
+        } for k, title, abstract, date_added, collections in rows]
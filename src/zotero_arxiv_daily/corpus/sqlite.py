@@ -0,0 +1,84 @@
+from .base import BaseCorpusSource, register_corpus_source, resolve_collection_paths, CORPUS_ITEM_TYPES
+from ..protocol import CorpusPaper
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from loguru import logger
+import sqlite3
+
+_ITEMS_QUERY = f"""
+SELECT i.itemID, i.dateAdded, title.value, abstract.value
+FROM items i
+JOIN itemTypes t ON t.itemTypeID = i.itemTypeID
+LEFT JOIN itemData td ON td.itemID = i.itemID AND td.fieldID = (SELECT fieldID FROM fields WHERE fieldName = 'title')
+LEFT JOIN itemDataValues title ON title.valueID = td.valueID
+JOIN itemData ad ON ad.itemID = i.itemID AND ad.fieldID = (SELECT fieldID FROM fields WHERE fieldName = 'abstractNote')
+JOIN itemDataValues abstract ON abstract.valueID = ad.valueID
+WHERE i.libraryID = :library_id
+  AND t.typeName IN ({', '.join(f"'{t}'" for t in CORPUS_ITEM_TYPES)})
+  AND i.itemID NOT IN (SELECT itemID FROM deletedItems)
+  AND abstract.value != ''
+"""
+
+_COLLECTIONS_QUERY = """
+SELECT c.collectionID, c.collectionName, c.parentCollectionID
+FROM collections c
+WHERE c.libraryID = :library_id
+"""
+
+_COLLECTION_ITEMS_QUERY = """
+SELECT ci.itemID, ci.collectionID
+FROM collectionItems ci
+JOIN collections c ON c.collectionID = ci.collectionID
+WHERE c.libraryID = :library_id
+"""
+
+
+def connect_readonly(path:str) -> sqlite3.Connection:
+    """Open a Zotero database without taking any lock.
+
+    Zotero desktop keeps an exclusive lock on zotero.sqlite while it runs, so the database is opened
+    as immutable. Changes written by Zotero in the middle of a read may therefore not be seen.
+    """
+    uri = Path(path).expanduser().resolve().as_uri() + "?mode=ro&immutable=1"
+    return sqlite3.connect(uri, uri=True)
+
+
+@register_corpus_source("sqlite")
+class SqliteCorpusSource(BaseCorpusSource):
+    def __init__(self, config):
+        super().__init__(config)
+        if self.config.zotero.get("sqlite_path") is None:
+            raise ValueError("sqlite_path must be specified for the sqlite corpus source.")
+        self.path = self.config.zotero.sqlite_path
+
+    def fetch_corpus(self) -> list[CorpusPaper]:
+        if not Path(self.path).expanduser().is_file():
+            raise FileNotFoundError(f"Zotero database not found: {self.path}")
+        conn = connect_readonly(self.path)
+        try:
+            library_id = conn.execute("SELECT libraryID FROM libraries WHERE type = 'user'").fetchone()[0]
+            params = {'library_id': library_id}
+            deleted_collections = set()
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deletedCollections'").fetchone():
+                deleted_collections = {r[0] for r in conn.execute("SELECT collectionID FROM deletedCollections")}
+            collections = {
+                col_id: (name, parent)
+                for col_id, name, parent in conn.execute(_COLLECTIONS_QUERY, params)
+                if col_id not in deleted_collections
+            }
+            item_collections = defaultdict(list)
+            for item_id, col_id in conn.execute(_COLLECTION_ITEMS_QUERY, params):
+                if col_id in collections:
+                    item_collections[item_id].append(col_id)
+            items = conn.execute(_ITEMS_QUERY, params).fetchall()
+        finally:
+            conn.close()
+        collection_paths = resolve_collection_paths(collections)
+        logger.info(f"Read {len(items)} zotero papers from {self.path}")
+        return [CorpusPaper(
+            title=title or '',
+            abstract=abstract,
+            added_date=datetime.strptime(date_added, '%Y-%m-%d %H:%M:%S'),
+            paths=[collection_paths[col] for col in item_collections[item_id]]
+        ) for item_id, date_added, title, abstract in items]
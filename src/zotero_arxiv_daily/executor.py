@@ -1,16 +1,36 @@
 from loguru import logger
-from pyzotero import zotero
 from omegaconf import DictConfig, ListConfig
-from .utils import glob_match
+from .utils import PathMatcher
 from .retriever import get_retriever_cls
-from .protocol import CorpusPaper
+from .protocol import CorpusPaper, Paper
+from .corpus import get_corpus_source_cls
 import random
-from datetime import datetime
 from .reranker import get_reranker_cls
 from .construct_email import render_email
 from .utils import send_email
 from openai import OpenAI
 from tqdm import tqdm
+from .retriever.base import BaseRetriever
+from .checkpoint import RunCheckpoint
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterator
+import queue
+
+# Papers handed from a source to the reranker at a time.
+RETRIEVAL_CHUNK_SIZE = 256
+
+
+@dataclass
+class SourceStats:
+    papers: int = 0
+    seconds: float = 0.0
+    error: str | None = None
+
+    def __str__(self) -> str:
+        status = f"failed ({self.error})" if self.error else f"{self.papers} papers"
+        return f"{status} in {self.seconds:.1f}s"
 
 
 def normalize_include_path_patterns(include_path: list[str] | ListConfig | None) -> list[str] | None:
@@ -33,82 +53,171 @@ class Executor:
     def __init__(self, config:DictConfig):
         self.config = config
         self.include_path_patterns = normalize_include_path_patterns(config.zotero.include_path)
+        self.corpus_source = get_corpus_source_cls(config.zotero.get("source", "api"))(config)
         self.retrievers = {
             source: get_retriever_cls(source)(config) for source in config.executor.source
         }
         self.reranker = get_reranker_cls(config.executor.reranker)(config)
+        self.failed_sources: list[str] = []
         self.openai_client = OpenAI(api_key=config.llm.api.key, base_url=config.llm.api.base_url)
     def fetch_zotero_corpus(self) -> list[CorpusPaper]:
-        logger.info("Fetching zotero corpus")
-        zot = zotero.Zotero(self.config.zotero.user_id, 'user', self.config.zotero.api_key)
-        collections = zot.everything(zot.collections())
-        collections = {c['key']:c for c in collections}
-        corpus = zot.everything(zot.items(itemType='conferencePaper || journalArticle || preprint'))
-        corpus = [c for c in corpus if c['data']['abstractNote'] != '']
-        def get_collection_path(col_key:str) -> str:
-            if p := collections[col_key]['data']['parentCollection']:
-                return get_collection_path(p) + '/' + collections[col_key]['data']['name']
-            else:
-                return collections[col_key]['data']['name']
-        for c in corpus:
-            paths = [get_collection_path(col) for col in c['data']['collections']]
-            c['paths'] = paths
-        logger.info(f"Fetched {len(corpus)} zotero papers")
-        return [CorpusPaper(
-            title=c['data']['title'],
-            abstract=c['data']['abstractNote'],
-            added_date=datetime.strptime(c['data']['dateAdded'], '%Y-%m-%dT%H:%M:%SZ'),
-            paths=c['paths']
-        ) for c in corpus]
+        logger.info(f"Fetching zotero corpus from {self.corpus_source.name}")
+        return self.corpus_source.fetch_corpus()
     
     def filter_corpus(self, corpus:list[CorpusPaper]) -> list[CorpusPaper]:
         if not self.include_path_patterns:
             return corpus
-        new_corpus = []
         logger.info(f"Selecting zotero papers matching include_path: {self.include_path_patterns}")
-        for c in corpus:
-            match_results = [
-                glob_match(path, pattern)
-                for path in c.paths
-                for pattern in self.include_path_patterns
-            ]
-            if any(match_results):
-                new_corpus.append(c)
+        # Inclusion is decided once per collection path, then papers are kept by set membership.
+        all_paths = {p for c in corpus for p in c.paths}
+        matcher = PathMatcher(self.include_path_patterns)
+        included_paths = matcher.select(all_paths)
+        new_corpus = [c for c in corpus if not included_paths.isdisjoint(c.paths)]
+        logger.info(f"{len(included_paths)} of {len(all_paths)} zotero collections match include_path")
+        for pattern, count in matcher.stats(included_paths).items():
+            if count == 0:
+                logger.warning(f"include_path pattern {pattern!r} matches no zotero collection")
+            else:
+                logger.debug(f"include_path pattern {pattern!r} matches {count} zotero collections")
         samples = random.sample(new_corpus, min(5, len(new_corpus)))
         samples = '\n'.join([c.title + ' - ' + '\n'.join(c.paths) for c in samples])
         logger.info(f"Selected {len(new_corpus)} zotero papers:\n{samples}\n...")
         return new_corpus
 
-    
-    def run(self):
-        corpus = self.fetch_zotero_corpus()
-        corpus = self.filter_corpus(corpus)
+    def retrieve_papers(self, checkpoint:RunCheckpoint | None = None) -> Iterator[list[Paper]]:
+        """Retrieve papers from all sources concurrently, and yield them in chunks as they come in.
+
+        A source that fails is logged and skipped, without holding up the others. Raises only when every
+        source failed, so that a broken run is not mistaken for a day without papers. With a checkpoint,
+        the papers of each source that succeeded are saved, and sources saved by an earlier attempt are
+        not retrieved again.
+        """
+        stats: dict[str, SourceStats] = {}
+        # (source, chunk of papers), or (source, None) once the source is done.
+        arrived: queue.Queue[tuple[str, list[Paper] | None]] = queue.Queue()
+
+        def retrieve(source:str, retriever:BaseRetriever):
+            start = perf_counter()
+            chunk, papers = [], []
+            try:
+                for paper in retriever.iter_papers():
+                    chunk.append(paper)
+                    papers.append(paper)
+                    if len(chunk) == RETRIEVAL_CHUNK_SIZE:
+                        arrived.put((source, chunk))
+                        stats[source].papers += len(chunk)
+                        chunk = []
+                if checkpoint:
+                    checkpoint.save_papers(f"candidates-{source}", papers)
+            except Exception as e:
+                stats[source].error = f"{type(e).__name__}: {e}"
+                logger.opt(exception=e).error(f"Failed to retrieve {source} papers")
+            finally:
+                # Papers retrieved before a failure are kept.
+                if chunk:
+                    arrived.put((source, chunk))
+                    stats[source].papers += len(chunk)
+                stats[source].seconds = perf_counter() - start
+                arrived.put((source, None))
+
+        retrievers = dict(self.retrievers)
+        saved: dict[str, list[Paper]] = {}
+        for source in list(retrievers):
+            papers = checkpoint.load_papers(f"candidates-{source}") if checkpoint else None
+            if papers is not None:
+                del retrievers[source]
+                saved[source] = papers
+                stats[source] = SourceStats(papers=len(papers))
+                logger.info(f"Loaded {len(papers)} {source} papers from the checkpoint")
+            else:
+                stats[source] = SourceStats()
+        with ThreadPoolExecutor(max_workers=max(len(retrievers), 1)) as pool:
+            for source, retriever in retrievers.items():
+                pool.submit(retrieve, source, retriever)
+            # The live sources are retrieved while the saved papers are reranked.
+            yield from saved.values()
+            pending = len(retrievers)
+            while pending:
+                source, chunk = arrived.get()
+                if chunk is not None:
+                    yield chunk
+                    continue
+                pending -= 1
+                if stats[source].error is None:
+                    logger.info(f"Retrieved {stats[source].papers} {source} papers in {stats[source].seconds:.1f}s")
+        logger.info(f"Total {sum(s.papers for s in stats.values())} papers retrieved from all sources: " +
+                    ", ".join(f"{source} {s}" for source, s in stats.items()))
+        self.failed_sources = [source for source, s in stats.items() if s.error is not None]
+        if stats and all(s.error is not None for s in stats.values()):
+            raise RuntimeError("Failed to retrieve papers from every source")
+
+    def get_checkpoint(self) -> RunCheckpoint | None:
+        if not self.config.executor.get("cache_dir"):
+            if self.config.executor.get("resume"):
+                logger.warning("executor.resume needs executor.cache_dir to keep checkpoints. Starting from scratch.")
+            return None
+        return RunCheckpoint(self.config)
+
+    def rank_papers(self, checkpoint:RunCheckpoint | None) -> list[Paper] | None:
+        """The top papers of the day by score, or None if there is no corpus to rank them against."""
+        corpus = checkpoint.load_corpus() if checkpoint else None
+        if corpus is None:
+            corpus = self.fetch_zotero_corpus()
+            corpus = self.filter_corpus(corpus)
+            if checkpoint:
+                checkpoint.save_corpus(corpus)
+        else:
+            logger.info(f"Loaded {len(corpus)} zotero papers from the checkpoint")
         if len(corpus) == 0:
             logger.error(f"No zotero papers found. Please check your zotero settings:\n{self.config.zotero}")
+            return None
+        logger.info(f"Retrieving papers from {', '.join(self.retrievers)} and reranking them as they arrive...")
+        try:
+            reranked_papers = self.reranker.rerank_stream(self.retrieve_papers(checkpoint), corpus)
+        finally:
+            self.reranker.close()
+        reranked_papers = reranked_papers[:self.config.executor.max_paper_num]
+        if checkpoint and self.failed_sources:
+            logger.warning(f"Ranking and summaries are not checkpointed, so that resuming retries {', '.join(self.failed_sources)}")
+        elif checkpoint:
+            checkpoint.save_papers("reranked", reranked_papers)
+        return reranked_papers
+
+    def run(self):
+        checkpoint = self.get_checkpoint()
+        if checkpoint and checkpoint.load("sent"):
+            logger.info("The email of this run was already sent")
             return
-        all_papers = []
-        for source, retriever in self.retrievers.items():
-            logger.info(f"Retrieving {source} papers...")
-            papers = retriever.retrieve_papers()
-            if len(papers) == 0:
-                logger.info(f"No {source} papers found")
-                continue
-            logger.info(f"Retrieved {len(papers)} {source} papers")
-            all_papers.extend(papers)
-        logger.info(f"Total {len(all_papers)} papers retrieved from all sources")
-        reranked_papers = []
-        if len(all_papers) > 0:
-            logger.info("Reranking papers...")
-            reranked_papers = self.reranker.rerank(all_papers, corpus)
-            reranked_papers = reranked_papers[:self.config.executor.max_paper_num]
-            logger.info("Generating TLDR and affiliations...")
-            for p in tqdm(reranked_papers):
-                p.generate_tldr(self.openai_client, self.config.llm)
-                p.generate_affiliations(self.openai_client, self.config.llm)
+        reranked_papers = None
+        if checkpoint:
+            reranked_papers = checkpoint.load_papers("enriched") or checkpoint.load_papers("reranked")
+        if reranked_papers is None:
+            reranked_papers = self.rank_papers(checkpoint)
+            if reranked_papers is None:
+                return
+        else:
+            logger.info(f"Loaded {len(reranked_papers)} reranked papers from the checkpoint")
+        if len(reranked_papers) > 0:
+            # Papers enriched by an earlier attempt of this run are skipped, except for the steps that failed.
+            pending = [p for p in reranked_papers if p.tldr is None or p.failures]
+            # Full text is only needed for the TLDR and affiliations, so it is fetched for the kept papers only.
+            for source, retriever in self.retrievers.items():
+                retriever.enrich_papers([p for p in pending if p.source == source])
+            logger.info(f"Generating TLDR and affiliations of {len(pending)} papers...")
+            for p in tqdm(pending):
+                steps = set(p.failures) if p.tldr is not None else {"tldr", "affiliations"}
+                if "tldr" in steps:
+                    p.generate_tldr(self.openai_client, self.config.llm)
+                if "affiliations" in steps:
+                    p.generate_affiliations(self.openai_client, self.config.llm)
+                if checkpoint and not self.failed_sources:
+                    checkpoint.save_papers("enriched", reranked_papers)
         elif not self.config.executor.send_empty:
             logger.info("No new papers found. No email will be sent.")
             return
         logger.info("Sending email...")
         email_content = render_email(reranked_papers)
         send_email(self.config, email_content)
+        if checkpoint:
+            checkpoint.save("sent", True)
         logger.info("Email sent successfully")
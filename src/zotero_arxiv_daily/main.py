@@ -32,4 +32,6 @@ def main(config:DictConfig):
     executor.run()
 
 if __name__ == '__main__':
+    # Hydra only takes config overrides, so the --resume flag is passed on as one.
+    sys.argv = ["executor.resume=true" if arg == "--resume" else arg for arg in sys.argv]
     main()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, TypeVar
 from datetime import datetime
 import re
@@ -6,8 +6,19 @@ import tiktoken
 from openai import OpenAI
 from loguru import logger
 import json
+from functools import cache
 RawPaperItem = TypeVar('RawPaperItem')
 
+# Token limits of the LLM prompts. Full text beyond FULL_TEXT_TOKEN_BUDGET never reaches the LLM.
+TLDR_PROMPT_TOKENS = 4000
+AFFILIATIONS_PROMPT_TOKENS = 2000
+FULL_TEXT_TOKEN_BUDGET = max(TLDR_PROMPT_TOKENS, AFFILIATIONS_PROMPT_TOKENS)
+
+@cache
+def get_prompt_tokenizer() -> tiktoken.Encoding:
+    # use gpt-4o tokenizer for estimation
+    return tiktoken.encoding_for_model("gpt-4o")
+
 @dataclass
 class Paper:
     source: str
@@ -20,6 +31,9 @@ class Paper:
     tldr: Optional[str] = None
     affiliations: Optional[list[str]] = None
     score: Optional[float] = None
+    interest: Optional[str] = None
+    # Generation steps ("tldr", "affiliations") that failed, to be retried when the run is resumed.
+    failures: list[str] = field(default_factory=list)
 
     def _generate_tldr_with_llm(self, openai_client:OpenAI,llm_params:dict) -> str:
         lang = llm_params.get('language', 'English')
@@ -37,10 +51,9 @@ class Paper:
             logger.warning(f"Neither full text nor abstract is provided for {self.url}")
             return "Failed to generate TLDR. Neither full text nor abstract is provided"
         
-        # use gpt-4o tokenizer for estimation
-        enc = tiktoken.encoding_for_model("gpt-4o")
+        enc = get_prompt_tokenizer()
         prompt_tokens = enc.encode(prompt)
-        prompt_tokens = prompt_tokens[:4000]  # truncate to 4000 tokens
+        prompt_tokens = prompt_tokens[:TLDR_PROMPT_TOKENS]
         prompt = enc.decode(prompt_tokens)
         
         response = openai_client.chat.completions.create(
@@ -60,20 +73,27 @@ class Paper:
         try:
             tldr = self._generate_tldr_with_llm(openai_client,llm_params)
             self.tldr = tldr
+            self._mark_failure("tldr", False)
             return tldr
         except Exception as e:
             logger.warning(f"Failed to generate tldr of {self.url}: {e}")
             tldr = self.abstract
             self.tldr = tldr
+            self._mark_failure("tldr", True)
             return tldr
 
+    def _mark_failure(self, step:str, failed:bool):
+        if failed and step not in self.failures:
+            self.failures.append(step)
+        elif not failed and step in self.failures:
+            self.failures.remove(step)
+
     def _generate_affiliations_with_llm(self, openai_client:OpenAI,llm_params:dict) -> Optional[list[str]]:
         if self.full_text is not None:
             prompt = f"Given the beginning of a paper, extract the affiliations of the authors in a python list format, which is sorted by the author order. If there is no affiliation found, return an empty list '[]':\n\n{self.full_text}"
-            # use gpt-4o tokenizer for estimation
-            enc = tiktoken.encoding_for_model("gpt-4o")
+            enc = get_prompt_tokenizer()
             prompt_tokens = enc.encode(prompt)
-            prompt_tokens = prompt_tokens[:2000]  # truncate to 2000 tokens
+            prompt_tokens = prompt_tokens[:AFFILIATIONS_PROMPT_TOKENS]
             prompt = enc.decode(prompt_tokens)
             affiliations = openai_client.chat.completions.create(
                 messages=[
@@ -98,10 +118,12 @@ class Paper:
         try:
             affiliations = self._generate_affiliations_with_llm(openai_client,llm_params)
             self.affiliations = affiliations
+            self._mark_failure("affiliations", False)
             return affiliations
         except Exception as e:
             logger.warning(f"Failed to generate affiliations of {self.url}: {e}")
             self.affiliations = None
+            self._mark_failure("affiliations", True)
             return None
 @dataclass
 class CorpusPaper:
@@ -0,0 +1,109 @@
+import math
+import os
+import numpy as np
+from loguru import logger
+
+IVF_NPROBE = 8
+KMEANS_ITERATIONS = 10
+
+
+def spherical_kmeans(embeddings:np.ndarray, n_clusters:int, iterations:int = KMEANS_ITERATIONS, seed:int = 0) -> np.ndarray:
+    """Cluster normalized embeddings by cosine similarity and return the normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(embeddings[rng.choice(len(embeddings), n_clusters, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assignments = np.argmax(embeddings @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, embeddings)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Keep the previous centroid for clusters that lost all their members.
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids
+
+
+class IVFIndex:
+    """An inverted-file index for approximate nearest-neighbour search over normalized embeddings.
+
+    The corpus is partitioned around ``sqrt(n)`` k-means centroids, and a query is only compared with the
+    papers of its ``nprobe`` closest partitions. Papers are tracked by id, so the index saved under ``path``
+    survives across runs: new papers are assigned to their closest centroid and removed ones are dropped.
+    The centroids are retrained once the corpus has doubled or halved since they were fitted. ``update``
+    also lays out the lists as row indices of the corpus it was given, which ``search`` then probes.
+    """
+    def __init__(self, path:str | None = None, nprobe:int = IVF_NPROBE):
+        self.path = path
+        self.nprobe = nprobe
+        self.centroids: np.ndarray | None = None
+        self.assignment: dict[str, int] = {}
+        self.trained_size = 0
+        # Corpus row indices of each list, for the corpus of the last update.
+        self.members: list[np.ndarray] = []
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                self.centroids = data['centroids']
+                self.assignment = dict(zip(data['ids'].tolist(), data['lists'].tolist()))
+                self.trained_size = int(data['trained_size'])
+
+    def save(self):
+        if self.path is None:
+            return
+        np.savez(
+            self.path,
+            centroids=self.centroids,
+            ids=np.array(list(self.assignment), dtype=str),
+            lists=np.array(list(self.assignment.values()), dtype=np.int64),
+            trained_size=self.trained_size,
+        )
+
+    def needs_training(self, size:int) -> bool:
+        return self.centroids is None or not (self.trained_size / 2 <= size <= self.trained_size * 2)
+
+    def update(self, embeddings:np.ndarray, ids:list[str]):
+        """Bring the index in line with the given corpus, retraining only when it has drifted in size."""
+        if self.needs_training(len(ids)):
+            n_lists = max(1, min(len(ids), round(math.sqrt(len(ids)))))
+            logger.info(f"Training ANN index with {n_lists} lists over {len(ids)} papers")
+            self.centroids = spherical_kmeans(embeddings, n_lists)
+            self.assignment = {}
+            self.trained_size = len(ids)
+        new_rows = [i for i, id in enumerate(ids) if id not in self.assignment]
+        if new_rows:
+            lists = np.argmax(embeddings[new_rows] @ self.centroids.T, axis=1)
+            self.assignment.update(zip((ids[i] for i in new_rows), lists.tolist()))
+        current = set(ids)
+        removed = [id for id in self.assignment if id not in current]
+        for id in removed:
+            del self.assignment[id]
+        logger.debug(f"ANN index: {len(new_rows)} papers added, {len(removed)} removed")
+        row_lists = np.array([self.assignment[id] for id in ids], dtype=np.int64)
+        order = np.argsort(row_lists, kind='stable')
+        bounds = np.searchsorted(row_lists[order], np.arange(len(self.centroids) + 1))
+        self.members = [order[bounds[l]:bounds[l + 1]] for l in range(len(self.centroids))]
+        self.save()
+
+    def search(self, queries:np.ndarray, embeddings:np.ndarray, k:int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the similarities and row indices of the (approximately) ``k`` most similar corpus rows of each query.
+
+        ``embeddings`` is the corpus of the last ``update``. Rows are padded with ``-inf`` and ``-1`` when the
+        probed lists hold fewer than ``k`` papers.
+        """
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.nprobe]
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for q, probe in enumerate(probes):
+            candidates = np.concatenate([self.members[l] for l in probe])
+            scores = embeddings[candidates] @ queries[q]
+            top = np.argsort(-scores)[:k]
+            sims[q, :len(top)] = scores[top]
+            rows[q, :len(top)] = candidates[top]
+        return sims, rows
+
+
+def exact_search(queries:np.ndarray, embeddings:np.ndarray, k:int) -> np.ndarray:
+    """Row indices of the ``k`` most similar corpus rows of each query, by brute force."""
+    return np.argsort(-(queries @ np.asarray(embeddings).T), axis=1)[:, :k]
+
+
+def recall_at_k(approximate:np.ndarray, exact:np.ndarray) -> float:
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approximate.tolist(), exact.tolist()))
+    return hits / exact.size if exact.size else 1.0
@@ -1,23 +1,94 @@
 from .base import BaseReranker, register_reranker
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from time import perf_counter, sleep
+import random
 import numpy as np
+import tiktoken
+
+RETRY_NUM = 6
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+
 @register_reranker("api")
 class ApiReranker(BaseReranker):
-    def get_similarity_score(self, s1: list[str], s2: list[str]) -> np.ndarray:
-        client = OpenAI(api_key=self.config.reranker.api.key, base_url=self.config.reranker.api.base_url)
+    _client = None
+
+    @property
+    def model_id(self) -> str:
+        return f"api:{self.config.reranker.api.base_url}:{self.config.reranker.api.model}"
+
+    @property
+    def client(self) -> OpenAI:
+        # One client for all batches, so that its connection pool is shared. Retries are handled in _embed_batch.
+        if self._client is None:
+            self._client = OpenAI(api_key=self.config.reranker.api.key, base_url=self.config.reranker.api.base_url, max_retries=0)
+        return self._client
+
+    def get_tokenizer(self) -> tiktoken.Encoding:
+        try:
+            return tiktoken.encoding_for_model(self.config.reranker.api.model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+
+    def pack_batches(self, texts:list[str]) -> list[list[str]]:
+        """Group texts into batches of at most batch_size texts and max_batch_tokens tokens, keeping their order.
+
+        A single text longer than max_batch_tokens is truncated to fit on its own.
+        """
         batch_size = self.config.reranker.api.get("batch_size") or 64
-        all_texts = s1 + s2
-        all_embeddings = []
-        for i in range(0, len(all_texts), batch_size):
-            batch = all_texts[i:i + batch_size]
-            response = client.embeddings.create(
-                input=batch,
-                model=self.config.reranker.api.model
-            )
-            all_embeddings.extend([r.embedding for r in response.data])
-        s1_embeddings = np.array(all_embeddings[:len(s1)])           # [n_s1, d]
-        s2_embeddings = np.array(all_embeddings[len(s1):])           # [n_s2, d]
-        s1_embeddings_normalized = s1_embeddings / np.linalg.norm(s1_embeddings, axis=1, keepdims=True)
-        s2_embeddings_normalized = s2_embeddings / np.linalg.norm(s2_embeddings, axis=1, keepdims=True)
-        sim = np.dot(s1_embeddings_normalized, s2_embeddings_normalized.T) # [n_s1, n_s2]
-        return sim
+        max_tokens = self.config.reranker.api.get("max_batch_tokens") or 8192
+        enc = self.get_tokenizer()
+        batches, batch, batch_tokens = [], [], 0
+        for text in texts:
+            tokens = enc.encode(text, disallowed_special=())
+            if len(tokens) > max_tokens:
+                logger.debug(f"Truncating a text of {len(tokens)} tokens to {max_tokens} tokens for embedding")
+                tokens = tokens[:max_tokens]
+                text = enc.decode(tokens)
+            if batch and (len(batch) >= batch_size or batch_tokens + len(tokens) > max_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += len(tokens)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, batch:list[str]) -> list[list[float]]:
+        for i in range(RETRY_NUM):
+            try:
+                response = self.client.embeddings.create(
+                    input=batch,
+                    model=self.config.reranker.api.model
+                )
+                return [r.embedding for r in sorted(response.data, key=lambda r: r.index)]
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if i == RETRY_NUM - 1:
+                    raise e
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** i) * random.uniform(0.5, 1.5)
+                retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                logger.warning(f"Embedding request failed: {type(e).__name__}. Retry in {delay:.1f} seconds.")
+                sleep(delay)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        batches = self.pack_batches(texts)
+        concurrency = self.config.reranker.api.get("concurrency") or 4
+        offsets = np.cumsum([0] + [len(b) for b in batches])
+        embeddings = None
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # Copy each batch into one float32 array as it arrives, instead of holding every response as Python lists.
+            for offset, batch in zip(offsets, pool.map(self._embed_batch, batches)):
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), len(batch[0])), dtype=np.float32)
+                embeddings[offset:offset + len(batch)] = batch
+        logger.debug(f"Embedded {len(texts)} texts in {len(batches)} batches in {perf_counter() - start:.2f}s")
+        return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
@@ -0,0 +1,82 @@
+"""Faster CPU inference backends for the local embedding model.
+
+``torch-int8`` applies dynamic int8 quantization to the linear layers of the torch model when it is loaded.
+``onnx`` and ``onnx-int8`` export the model to ONNX once (and quantize it to int8 for ``onnx-int8``), store
+the export under ``executor.cache_dir`` and run it with onnxruntime. They need the optional
+``sentence-transformers[onnx]`` dependencies.
+
+Every backend is checked against the fp32 model on a few probe texts before use. A backend whose
+similarity scores deviate by more than ``PARITY_TOLERANCE`` is rejected in favour of the fp32 model.
+"""
+import json
+import os
+import re
+import warnings
+from time import perf_counter
+from typing import Any
+import numpy as np
+from loguru import logger
+
+LOCAL_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+PARITY_TOLERANCE = 0.02
+ONNX_QUANTIZATION = 'avx2'
+PARITY_TEXTS = [
+    "We propose a parameter-efficient method for fine-tuning large language models.",
+    "A convolutional network for segmenting tumours in medical images.",
+    "Reinforcement learning agents that plan with a learned world model.",
+    "Single-cell RNA sequencing reveals the heterogeneity of immune cells.",
+    "A randomized controlled trial of cognitive behavioural therapy for insomnia.",
+    "Diffusion models generate high-fidelity images from text prompts.",
+    "Graph neural networks for predicting molecular properties.",
+    "Efficient attention mechanisms for long-context transformers.",
+]
+
+
+def similarity_deviation(reference:Any, candidate:Any, encode_kwargs:dict, texts:list[str] = PARITY_TEXTS) -> float:
+    """Largest absolute difference between the cosine similarity matrices of ``texts`` under two encoders."""
+    def similarities(encoder) -> np.ndarray:
+        embeddings = np.asarray(encoder.encode(texts, **encode_kwargs), dtype=np.float32)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings @ embeddings.T
+    return float(np.abs(similarities(reference) - similarities(candidate)).max())
+
+
+def quantize_torch_encoder(encoder:Any) -> Any:
+    import torch
+    with warnings.catch_warnings():
+        # Eager dynamic quantization is deprecated in recent torch releases in favour of torchao.
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.ao.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def onnx_export_dir(cache_dir:str, model:str) -> str:
+    return os.path.join(cache_dir, "onnx", re.sub(r'[^\w.-]', '_', model))
+
+
+def load_onnx_encoder(model:str, export_dir:str, quantized:bool, encode_kwargs:dict) -> Any:
+    """Load the ONNX export of ``model`` from ``export_dir``, exporting and checking it first if needed."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx" if quantized else "onnx/model.onnx"
+    parity_path = os.path.join(export_dir, f"{os.path.basename(file_name)}.parity.json")
+    if not os.path.exists(parity_path):
+        logger.info(f"Exporting {model} to {os.path.join(export_dir, file_name)}. This only happens once.")
+        start = perf_counter()
+        exported = SentenceTransformer(model, backend="onnx", trust_remote_code=True)
+        exported.save(export_dir)
+        if quantized:
+            export_dynamic_quantized_onnx_model(exported, ONNX_QUANTIZATION, export_dir)
+        logger.info(f"Exported {model} in {perf_counter() - start:.1f}s")
+        candidate = SentenceTransformer(export_dir, backend="onnx", trust_remote_code=True, model_kwargs={"file_name": file_name})
+        reference = SentenceTransformer(model, trust_remote_code=True)
+        deviation = similarity_deviation(reference, candidate, encode_kwargs)
+        with open(parity_path, 'w') as f:
+            json.dump({'deviation': deviation, 'tolerance': PARITY_TOLERANCE}, f)
+    else:
+        candidate = SentenceTransformer(export_dir, backend="onnx", trust_remote_code=True, model_kwargs={"file_name": file_name})
+    with open(parity_path) as f:
+        deviation = json.load(f)['deviation']
+    if deviation > PARITY_TOLERANCE:
+        raise ValueError(f"ONNX export deviates from fp32 by {deviation:.4f} (tolerance {PARITY_TOLERANCE})")
+    logger.info(f"ONNX export of {model} deviates from fp32 by {deviation:.4f}")
+    return candidate
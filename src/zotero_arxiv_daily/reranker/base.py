@@ -1,26 +1,106 @@
 from abc import ABC, abstractmethod
 from omegaconf import DictConfig
 from ..protocol import Paper, CorpusPaper
+from .embedding_cache import EmbeddingCache, text_hash
+from .scorer import get_scorer_cls
+from .prefilter import LexicalPrefilter
+from ..utils import peak_memory_mb
+from loguru import logger
+from collections import Counter
 import numpy as np
-from typing import Type
+import os
+from typing import Iterable, Type
+
+
+def normalize_embeddings(embeddings:np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if not embeddings.flags.writeable:
+        embeddings = embeddings.copy()
+    # Normalize in place: the embeddings are freshly encoded, so there is no need for a second copy.
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+
 class BaseReranker(ABC):
     def __init__(self, config:DictConfig):
         self.config = config
 
     def rerank(self, candidates:list[Paper], corpus:list[CorpusPaper]) -> list[Paper]:
+        return self.rerank_stream([candidates], corpus)
+
+    def rerank_stream(self, batches:Iterable[list[Paper]], corpus:list[CorpusPaper]) -> list[Paper]:
+        """Rerank candidates that arrive in batches, such as the papers of sources retrieved concurrently.
+
+        The corpus is embedded once the first candidates arrive, and, unless the lexical prefilter has to
+        see all candidates first, each batch is embedded as it arrives, while later batches are retrieved.
+        """
         corpus = sorted(corpus,key=lambda x: x.added_date,reverse=True)
         time_decay_weight = 1 / (1 + np.log10(np.arange(len(corpus)) + 1))
         time_decay_weight: np.ndarray = time_decay_weight / time_decay_weight.sum()
-        sim = self.get_similarity_score([c.abstract for c in candidates], [c.abstract for c in corpus])
-        assert sim.shape == (len(candidates), len(corpus))
-        scores = (sim * time_decay_weight).sum(axis=1) * 10 # [n_candidate]
+        corpus_texts = [c.abstract for c in corpus]
+        prefilter = LexicalPrefilter(self.config)
+        candidates: list[Paper] = []
+        candidate_embeddings: list[np.ndarray] = []
+        corpus_embeddings = None
+        for batch in batches:
+            if not batch:
+                continue
+            if corpus_embeddings is None:
+                corpus_embeddings = self.get_corpus_embeddings(corpus_texts)
+            candidates.extend(batch)
+            if not prefilter.enabled:
+                candidate_embeddings.append(self.get_embeddings([c.abstract for c in batch]))
+        if not candidates:
+            return []
+        if prefilter.enabled:
+            scores = prefilter.score([c.abstract for c in candidates], corpus_texts, time_decay_weight)
+            kept = np.arange(len(candidates)) if scores is None else prefilter.select(scores)
+            logger.info(f"Lexical prefilter kept {len(kept)} of {len(candidates)} candidates")
+            candidates = [candidates[i] for i in kept]
+            candidate_embeddings = [self.get_embeddings([c.abstract for c in candidates])]
+        scorer = get_scorer_cls(self.config.reranker.get("scoring") or "dense")(self.config, self.model_id)
+        scores = scorer.score(
+            np.concatenate(candidate_embeddings), corpus_embeddings, time_decay_weight, [text_hash(t) for t in corpus_texts]
+        ) * 10 # [n_candidate]
         for s,c in zip(scores,candidates):
             c.score = s
+        if scorer.matched is not None:
+            for m,c in zip(scorer.matched,candidates):
+                c.interest = corpus[scorer.representatives[m]].title
+            logger.info(f"Candidates per interest: {Counter(c.interest for c in candidates).most_common()}")
+        peak_memory = peak_memory_mb()
+        if peak_memory is not None:
+            logger.info(f"Reranked {len(candidates)} papers against {len(corpus)} corpus papers. Peak memory: {peak_memory:.0f} MB")
         candidates = sorted(candidates,key=lambda x: x.score,reverse=True)
         return candidates
-    
-    @abstractmethod
+
+    def get_embeddings(self, texts:list[str]) -> np.ndarray:
+        """L2-normalized embeddings of texts, so that dot products are cosine similarities."""
+        return normalize_embeddings(self.encode(texts))
+
+    def get_corpus_embeddings(self, texts:list[str]) -> np.ndarray:
+        """Like get_embeddings, but served from the on-disk embedding cache when executor.cache_dir is set."""
+        cache_dir = self.config.executor.get("cache_dir")
+        if not cache_dir:
+            return self.get_embeddings(texts)
+        cache = EmbeddingCache(os.path.join(cache_dir, "embeddings"), self.model_id)
+        return cache.get(texts, self.get_embeddings)
+
     def get_similarity_score(self, s1:list[str], s2:list[str]) -> np.ndarray:
+        return self.get_embeddings(s1) @ self.get_embeddings(s2).T
+
+    def close(self):
+        """Release resources held across calls, such as worker processes."""
+        pass
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """Identifies the embedding model and its settings, to tell apart cached embeddings."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode(self, texts:list[str]) -> np.ndarray:
         raise NotImplementedError
 
 registered_rerankers = {}
@@ -34,4 +114,4 @@ def register_reranker(name:str):
 def get_reranker_cls(name:str) -> Type[BaseReranker]:
     if name not in registered_rerankers:
         raise ValueError(f"Reranker {name} not found")
-    return registered_rerankers[name]
\ No newline at end of file
+    return registered_rerankers[name]
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Callable
+import numpy as np
+from loguru import logger
+
+
+def text_hash(text:str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Embeddings of corpus texts persisted across runs, keyed by content hash and model.
+
+    The embeddings are stored in a ``.npy`` file that is memory-mapped on load, next to a JSON index
+    holding the content hash of each row. The store always holds exactly the texts of the latest request
+    in request order, so an unchanged corpus is served straight from the memory map, while a changed one
+    only embeds the new texts and drops the rows of texts that are gone.
+    """
+    def __init__(self, cache_dir:str, model_id:str):
+        self.cache_dir = cache_dir
+        self.model_id = model_id
+        self.key = hashlib.sha256(model_id.encode('utf-8')).hexdigest()[:16]
+        self.index_path = os.path.join(cache_dir, f"{self.key}.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _load(self) -> tuple[list[str], np.ndarray | None]:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            data = np.load(os.path.join(self.cache_dir, index['data']), mmap_mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(self.index_path):
+                logger.warning(f"Ignoring unreadable embedding cache {self.index_path}: {e}")
+            return [], None
+        if index.get('model_id') != self.model_id or data.shape[0] != len(index['hashes']):
+            logger.warning(f"Ignoring inconsistent embedding cache {self.index_path}")
+            return [], None
+        return index['hashes'], data
+
+    def _save(self, hashes:list[str], data:np.ndarray) -> np.ndarray:
+        # Write the data under a fresh name and switch the index over atomically, so that an interrupted
+        # write never leaves an index pointing at the wrong rows.
+        old_data = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                old_data = json.load(f).get('data')
+        data_name = f"{self.key}-{uuid.uuid4().hex[:8]}.npy"
+        np.save(os.path.join(self.cache_dir, data_name), data)
+        tmp_index_path = self.index_path + '.tmp'
+        with open(tmp_index_path, 'w') as f:
+            json.dump({'model_id': self.model_id, 'data': data_name, 'hashes': hashes}, f)
+        os.replace(tmp_index_path, self.index_path)
+        if old_data is not None and old_data != data_name:
+            try:
+                os.remove(os.path.join(self.cache_dir, old_data))
+            except OSError:
+                pass
+        return np.load(os.path.join(self.cache_dir, data_name), mmap_mode='r')
+
+    def get(self, texts:list[str], encode:Callable[[list[str]], np.ndarray]) -> np.ndarray:
+        """Return the embeddings of ``texts``, calling ``encode`` only for texts missing from the cache."""
+        if len(texts) == 0:
+            return np.asarray(encode(texts), dtype=np.float32)
+        hashes = [text_hash(t) for t in texts]
+        stored_hashes, stored = self._load()
+        if stored is not None and stored_hashes == hashes:
+            logger.info(f"Loaded all {len(texts)} corpus embeddings from cache")
+            return stored
+        position = {h: i for i, h in enumerate(stored_hashes)}
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in position and h not in missing:
+                missing[h] = t
+        logger.info(f"Embedding {len(missing)} new corpus texts, {len(texts) - len(missing)} found in cache")
+        new_embeddings = np.asarray(encode(list(missing.values())), dtype=np.float32) if missing else None
+        dim = stored.shape[1] if stored is not None else new_embeddings.shape[1]
+        data = np.empty((len(hashes), dim), dtype=np.float32)
+        new_position = {h: i for i, h in enumerate(missing)}
+        cached_rows = [(i, position[h]) for i, h in enumerate(hashes) if h in position]
+        new_rows = [(i, new_position[h]) for i, h in enumerate(hashes) if h not in position]
+        if cached_rows:
+            dst, src = zip(*cached_rows)
+            data[list(dst)] = stored[list(src)]
+        if new_rows:
+            dst, src = zip(*new_rows)
+            data[list(dst)] = new_embeddings[list(src)]
+        return self._save(hashes, data)
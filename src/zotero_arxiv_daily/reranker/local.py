@@ -1,30 +1,125 @@
 from .base import BaseReranker, register_reranker
+from .worker import DEFAULT_TIMEOUT, EmbeddingWorkerClient
+from .multiprocess import EncoderPool
+from functools import partial
+from .backend import LOCAL_BACKENDS, PARITY_TOLERANCE, load_onnx_encoder, onnx_export_dir, quantize_torch_encoder, similarity_deviation
+from loguru import logger
+import json
 import logging
 import warnings
 import numpy as np
+
+
+def load_encoder(model:str, debug:bool = False, backend:str = 'torch', cache_dir:str | None = None, encode_kwargs:dict | None = None):
+    from sentence_transformers import SentenceTransformer
+    if not debug:
+        from transformers.utils import logging as transformers_logging
+        from huggingface_hub.utils import logging as hf_logging
+
+        transformers_logging.set_verbosity_error()
+        hf_logging.set_verbosity_error()
+        logging.getLogger("sentence_transformers").setLevel(logging.ERROR)
+        logging.getLogger("sentence_transformers.SentenceTransformer").setLevel(logging.ERROR)
+        logging.getLogger("transformers").setLevel(logging.ERROR)
+        logging.getLogger("huggingface_hub").setLevel(logging.ERROR)
+        logging.getLogger("huggingface_hub.utils._http").setLevel(logging.ERROR)
+        warnings.filterwarnings("ignore", category=FutureWarning)
+
+    if backend not in LOCAL_BACKENDS:
+        raise ValueError(f"Unknown local reranker backend {backend}. Choose from {LOCAL_BACKENDS}.")
+    encode_kwargs = encode_kwargs or {}
+    if backend in ('onnx', 'onnx-int8'):
+        if cache_dir is None:
+            logger.warning(f"The {backend} backend needs executor.cache_dir to store the exported model. Using torch instead.")
+        else:
+            try:
+                return load_onnx_encoder(model, onnx_export_dir(cache_dir, model), backend == 'onnx-int8', encode_kwargs)
+            except Exception as e:
+                logger.warning(f"Failed to use the {backend} backend, using torch instead: {type(e).__name__}: {e}")
+    encoder = SentenceTransformer(model, trust_remote_code=True)
+    if backend == 'torch-int8':
+        try:
+            quantized = quantize_torch_encoder(encoder)
+            deviation = similarity_deviation(encoder, quantized, encode_kwargs)
+        except Exception as e:
+            logger.warning(f"Failed to quantize {model}, using fp32 instead: {type(e).__name__}: {e}")
+            return encoder
+        if deviation > PARITY_TOLERANCE:
+            logger.warning(f"Quantized {model} deviates from fp32 by {deviation:.4f} (tolerance {PARITY_TOLERANCE}). Using fp32 instead.")
+            return encoder
+        logger.info(f"Quantized {model} to int8, deviating from fp32 by {deviation:.4f}")
+        return quantized
+    return encoder
+
+
 @register_reranker("local")
 class LocalReranker(BaseReranker):
-    def get_similarity_score(self, s1: list[str], s2: list[str]) -> np.ndarray:
-        from sentence_transformers import SentenceTransformer
-        if not self.config.executor.debug:
-            from transformers.utils import logging as transformers_logging
-            from huggingface_hub.utils import logging as hf_logging
-    
-            transformers_logging.set_verbosity_error()
-            hf_logging.set_verbosity_error()
-            logging.getLogger("sentence_transformers").setLevel(logging.ERROR)
-            logging.getLogger("sentence_transformers.SentenceTransformer").setLevel(logging.ERROR)
-            logging.getLogger("transformers").setLevel(logging.ERROR)
-            logging.getLogger("huggingface_hub").setLevel(logging.ERROR)
-            logging.getLogger("huggingface_hub.utils._http").setLevel(logging.ERROR)
-            warnings.filterwarnings("ignore", category=FutureWarning)
-
-        encoder = SentenceTransformer(self.config.reranker.local.model, trust_remote_code=True)
+    _encoder = None
+    _pool = None
+    _pool_failed = False
+
+    @property
+    def encode_kwargs(self) -> dict:
         if self.config.reranker.local.encode_kwargs:
-            encode_kwargs = self.config.reranker.local.encode_kwargs
-        else:
-            encode_kwargs = {}
-        s1_feature = encoder.encode(s1,**encode_kwargs,show_progress_bar=True)
-        s2_feature = encoder.encode(s2,**encode_kwargs,show_progress_bar=True)
-        sim = encoder.similarity(s1_feature, s2_feature)
-        return sim.numpy()
\ No newline at end of file
+            return dict(self.config.reranker.local.encode_kwargs)
+        return {}
+
+    @property
+    def backend(self) -> str:
+        return self.config.reranker.local.get("backend") or 'torch'
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{self.config.reranker.local.model}:{self.backend}:{json.dumps(self.encode_kwargs, sort_keys=True)}"
+
+    def get_encoder_loader(self) -> partial:
+        return partial(
+            load_encoder,
+            self.config.reranker.local.model,
+            debug=self.config.executor.debug,
+            backend=self.backend,
+            cache_dir=self.config.executor.get("cache_dir"),
+            encode_kwargs=self.encode_kwargs,
+        )
+
+    def get_encoder(self):
+        if self._encoder is None:
+            self._encoder = self.get_encoder_loader()()
+        return self._encoder
+
+    def get_pool(self) -> EncoderPool | None:
+        num_workers = self.config.reranker.local.get("num_workers") or 1
+        if num_workers <= 1 or self._pool_failed:
+            return None
+        if self._pool is None:
+            try:
+                self._pool = EncoderPool(num_workers, self.get_encoder_loader(), self.encode_kwargs)
+            except RuntimeError as e:
+                logger.warning(f"Failed to start {num_workers} encoder workers, encoding in-process: {e}")
+                self._pool_failed = True
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if socket_path := self.config.reranker.local.get("worker_socket"):
+            client = EmbeddingWorkerClient(socket_path, self.config.reranker.local.get("worker_timeout") or DEFAULT_TIMEOUT)
+            if client.is_available():
+                try:
+                    return client.encode(self.config.reranker.local.model, texts, self.encode_kwargs)
+                # Timeouts are OSErrors too, so a stuck worker is given up on as well.
+                except (OSError, RuntimeError) as e:
+                    logger.warning(f"Embedding worker at {socket_path} is unavailable, loading the model in-process: {e}")
+            else:
+                logger.info(f"No embedding worker at {socket_path}, loading the model in-process")
+        if pool := self.get_pool():
+            try:
+                return pool.encode(texts)
+            except RuntimeError as e:
+                logger.warning(f"Encoder workers failed, encoding in-process: {e}")
+                self.close()
+                self._pool_failed = True
+        return self.get_encoder().encode(texts,**self.encode_kwargs,show_progress_bar=True)
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+from time import perf_counter
+from typing import Any, Callable
+import numpy as np
+from loguru import logger
+
+CHUNK_SIZE = 128
+# Time for every worker to load the model, downloading it on the first run.
+LOAD_TIMEOUT = 600
+
+_encoder = None
+_encode_kwargs = {}
+_load_error = None
+
+
+def _init_worker(load_encoder:Callable[[], Any], encode_kwargs:dict, num_threads:int):
+    global _encoder, _encode_kwargs, _load_error
+    _encode_kwargs = encode_kwargs
+    # A failing initializer makes the pool replace the worker forever, so the error is kept for the tasks instead.
+    try:
+        import torch
+        # Split the cores between the workers instead of letting every worker spawn a thread per core.
+        torch.set_num_threads(num_threads)
+        _encoder = load_encoder()
+    except Exception as e:
+        _load_error = f"{type(e).__name__}: {e}"
+
+
+def _check_encoder(_=None) -> int:
+    if _load_error is not None:
+        raise RuntimeError(f"Failed to load the encoder: {_load_error}")
+    return os.getpid()
+
+
+def _encode_chunk(chunk:tuple[int, list[str]]) -> tuple[int, np.ndarray, float]:
+    _check_encoder()
+    i, texts = chunk
+    start = perf_counter()
+    embeddings = np.asarray(_encoder.encode(texts, **_encode_kwargs), dtype=np.float32)
+    return i, embeddings, perf_counter() - start
+
+
+def length_buckets(texts:list[str], chunk_size:int = CHUNK_SIZE) -> list[np.ndarray]:
+    """Split the indices of texts into chunks of similar length, so that each batch carries little padding."""
+    order = np.argsort([len(t) for t in texts], kind='stable')
+    return [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+
+class EncoderPool:
+    """A pool of CPU worker processes, each holding its own copy of the embedding model.
+
+    Texts are sorted into length buckets, the buckets are spread over the workers, and the embeddings
+    are put back in the original order. ``load_encoder`` must be picklable, as it runs in every worker.
+    Raises RuntimeError if the workers fail to load the encoder within ``load_timeout`` seconds.
+    """
+    def __init__(self, num_workers:int, load_encoder:Callable[[], Any], encode_kwargs:dict, load_timeout:float = LOAD_TIMEOUT):
+        self.num_workers = num_workers
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self.pool = multiprocessing.get_context('spawn').Pool(
+            num_workers, initializer=_init_worker, initargs=(load_encoder, encode_kwargs, num_threads)
+        )
+        # Probe the workers once, so that a model that cannot be loaded fails here instead of in every batch.
+        try:
+            self.pool.map_async(_check_encoder, range(num_workers), chunksize=1).get(load_timeout)
+        except multiprocessing.TimeoutError:
+            self.pool.terminate()
+            raise RuntimeError(f"The encoder workers did not load the model within {load_timeout}s")
+        except Exception:
+            self.pool.terminate()
+            raise
+
+    def encode(self, texts:list[str]) -> np.ndarray:
+        start = perf_counter()
+        buckets = length_buckets(texts)
+        bucketing_time = perf_counter() - start
+
+        start = perf_counter()
+        results = {}
+        busy_time = 0.0
+        for i, embeddings, elapsed in self.pool.imap_unordered(_encode_chunk, [(i, [texts[j] for j in b]) for i, b in enumerate(buckets)]):
+            results[i] = embeddings
+            busy_time += elapsed
+            logger.debug(f"Encoded a chunk of {len(embeddings)} texts in {elapsed:.2f}s ({len(embeddings) / elapsed:.1f} texts/s)")
+        encoding_time = perf_counter() - start
+
+        start = perf_counter()
+        if not results:
+            return np.empty((0, 0), dtype=np.float32)
+        output = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for i, b in enumerate(buckets):
+            output[b] = results[i]
+        reorder_time = perf_counter() - start
+
+        logger.info(
+            f"Encoded {len(texts)} texts with {self.num_workers} workers: "
+            f"bucketing {len(texts) / max(bucketing_time, 1e-9):.0f} texts/s, "
+            f"encoding {len(texts) / max(encoding_time, 1e-9):.1f} texts/s "
+            f"({busy_time / max(encoding_time * self.num_workers, 1e-9):.0%} worker utilization), "
+            f"reordering {len(texts) / max(reorder_time, 1e-9):.0f} texts/s"
+        )
+        return output
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
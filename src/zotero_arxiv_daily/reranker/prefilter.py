@@ -0,0 +1,88 @@
+"""A cheap lexical first stage that prunes candidates before they are embedded.
+
+Candidates are scored by the TF-IDF similarity of their abstract to a time-weighted lexical profile of the
+corpus, and only the ``top_n`` best, or those scoring at least ``min_score``, reach the embedding reranker.
+The fitted vectorizer and the corpus TF-IDF matrix are cached under ``executor.cache_dir`` as long as the
+corpus is unchanged.
+"""
+import os
+import pickle
+import numpy as np
+import scipy.sparse
+from loguru import logger
+from omegaconf import DictConfig
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .embedding_cache import text_hash
+from .scorer import corpus_fingerprint
+
+
+class LexicalPrefilter:
+    def __init__(self, config:DictConfig):
+        self.config = config
+        prefilter_config = config.reranker.get("prefilter") or {}
+        self.top_n: int | None = prefilter_config.get("top_n")
+        self.min_score: float | None = prefilter_config.get("min_score")
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_n is not None or self.min_score is not None
+
+    @property
+    def cache_dir(self) -> str | None:
+        cache_dir = self.config.executor.get("cache_dir")
+        if not cache_dir:
+            return None
+        path = os.path.join(cache_dir, "prefilter")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def fit(self, corpus_texts:list[str]) -> tuple[TfidfVectorizer, scipy.sparse.csr_matrix]:
+        """The vectorizer fitted on the corpus and the corpus TF-IDF matrix, loaded from the cache when possible."""
+        fingerprint = corpus_fingerprint([text_hash(t) for t in corpus_texts])
+        if self.cache_dir:
+            vectorizer_path = os.path.join(self.cache_dir, "vectorizer.pkl")
+            matrix_path = os.path.join(self.cache_dir, "corpus.npz")
+            fingerprint_path = os.path.join(self.cache_dir, "fingerprint")
+            if os.path.exists(fingerprint_path):
+                with open(fingerprint_path) as f:
+                    if f.read() == fingerprint:
+                        logger.debug("Loaded lexical prefilter from cache")
+                        with open(vectorizer_path, 'rb') as f:
+                            vectorizer = pickle.load(f)
+                        return vectorizer, scipy.sparse.load_npz(matrix_path)
+        vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True, dtype=np.float32)
+        matrix = vectorizer.fit_transform(corpus_texts).tocsr()
+        if self.cache_dir:
+            with open(vectorizer_path, 'wb') as f:
+                pickle.dump(vectorizer, f)
+            scipy.sparse.save_npz(matrix_path, matrix)
+            # Written last, so that an interrupted save is never mistaken for a valid cache.
+            with open(fingerprint_path, 'w') as f:
+                f.write(fingerprint)
+        return vectorizer, matrix
+
+    def score(self, candidate_texts:list[str], corpus_texts:list[str], weights:np.ndarray) -> np.ndarray | None:
+        """TF-IDF similarity of each candidate to the corpus profile, or None if the corpus has no indexable words."""
+        try:
+            vectorizer, matrix = self.fit(corpus_texts)
+        except ValueError as e:
+            # Raised by the vectorizer when the abstracts are empty or only made of stop words.
+            logger.warning(f"Cannot fit the lexical prefilter on the corpus, keeping all candidates: {e}")
+            return None
+        profile = matrix.T @ weights # [n_terms]
+        return np.asarray(vectorizer.transform(candidate_texts) @ profile).ravel()
+
+    def select(self, scores:np.ndarray) -> np.ndarray:
+        """Indices of the candidates that pass the prefilter, in their original order."""
+        keep = np.arange(len(scores))
+        if self.min_score is not None:
+            keep = keep[scores[keep] >= self.min_score]
+        if self.top_n is not None and len(keep) > self.top_n:
+            keep = np.sort(keep[np.argsort(-scores[keep], kind='stable')[:self.top_n]])
+        return keep
+
+
+def prefilter_recall(kept:np.ndarray, dense_scores:np.ndarray, k:int) -> float:
+    """Share of the top ``k`` candidates of dense-only ranking that survive the prefilter."""
+    top = np.argsort(-dense_scores, kind='stable')[:k]
+    return len(np.intersect1d(top, kept)) / len(top) if len(top) else 1.0
@@ -0,0 +1,212 @@
+from abc import ABC, abstractmethod
+from omegaconf import DictConfig
+from loguru import logger
+from typing import Type
+from .ann import IVFIndex, exact_search, recall_at_k
+from time import perf_counter
+import hashlib
+import numpy as np
+import os
+
+
+class BaseScorer(ABC):
+    """Turns normalized candidate and corpus embeddings into one relevance score per candidate.
+
+    ``weights`` holds the time-decay weight of each corpus paper and sums to 1. ``corpus_ids`` identifies
+    each corpus row by content, for scorers that keep state across runs under ``cache_dir``.
+
+    Scorers that group the corpus into interests set ``matched`` to the interest each candidate matched
+    and ``representatives`` to the corpus row that stands for each interest.
+    """
+    name: str
+    def __init__(self, config:DictConfig, model_id:str):
+        self.config = config
+        self.model_id = model_id
+        self.matched: np.ndarray | None = None
+        self.representatives: np.ndarray | None = None
+
+    @property
+    def cache_dir(self) -> str | None:
+        cache_dir = self.config.executor.get("cache_dir")
+        if not cache_dir:
+            return None
+        key = hashlib.sha256(self.model_id.encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(cache_dir, "scorer", self.name, key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @abstractmethod
+    def score(self, candidate_embeddings:np.ndarray, corpus_embeddings:np.ndarray, weights:np.ndarray, corpus_ids:list[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+DEFAULT_MEMORY_CAP_MB = 256
+
+
+def corpus_fingerprint(corpus_ids:list[str]) -> str:
+    return hashlib.sha256('\n'.join(corpus_ids).encode('utf-8')).hexdigest()
+
+
+registered_scorers = {}
+
+def register_scorer(name:str):
+    def decorator(cls):
+        registered_scorers[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+def get_scorer_cls(name:str) -> Type[BaseScorer]:
+    if name not in registered_scorers:
+        raise ValueError(f"Scorer {name} not found")
+    return registered_scorers[name]
+
+
+@register_scorer("dense")
+class DenseScorer(BaseScorer):
+    """Time-weighted mean of the similarities between each candidate and every corpus paper.
+
+    The corpus is streamed in blocks of rows, so that the similarity block and the corpus rows it is computed
+    from stay under ``reranker.memory_cap_mb``, and the weighted scores are accumulated in place instead of
+    building the full ``n_candidates x n_corpus`` similarity matrix.
+    """
+    def block_rows(self, n_candidates:int, dim:int) -> int:
+        memory_cap = (self.config.reranker.get("memory_cap_mb") or DEFAULT_MEMORY_CAP_MB) * 2**20
+        return max(1, int(memory_cap // ((n_candidates + dim) * np.dtype(np.float32).itemsize)))
+
+    def score(self, candidate_embeddings, corpus_embeddings, weights, corpus_ids):
+        n_candidates, dim = candidate_embeddings.shape
+        block = self.block_rows(n_candidates, dim)
+        scores = np.zeros(n_candidates, dtype=np.float64)
+        sim = None
+        for start in range(0, len(corpus_embeddings), block):
+            corpus_block = corpus_embeddings[start:start + block]
+            if sim is None or sim.shape[1] != len(corpus_block):
+                sim = np.empty((n_candidates, len(corpus_block)), dtype=np.float32)
+            np.matmul(candidate_embeddings, corpus_block.T, out=sim)
+            scores += sim @ weights[start:start + block]
+        logger.debug(
+            f"Scored {n_candidates} candidates against {len(corpus_embeddings)} papers "
+            f"in blocks of {block} rows ({block * (n_candidates + dim) * 4 / 2**20:.1f} MB)"
+        )
+        return scores
+
+
+@register_scorer("profile")
+class ProfileScorer(BaseScorer):
+    """Same scores as DenseScorer, computed without the similarity matrix.
+
+    With normalized embeddings, the weighted sum of cosine similarities is linear in the corpus embeddings,
+    so it equals the dot product with a single time-decayed profile vector ``weights @ corpus_embeddings``.
+    The profile is saved under ``cache_dir`` and reused as long as the corpus is unchanged.
+    """
+    def get_profile(self, corpus_embeddings:np.ndarray, weights:np.ndarray, corpus_ids:list[str]) -> np.ndarray:
+        fingerprint = corpus_fingerprint(corpus_ids)
+        path = os.path.join(self.cache_dir, "profile.npz") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with np.load(path) as cached:
+                if str(cached['fingerprint']) == fingerprint:
+                    logger.debug("Loaded corpus profile from cache")
+                    return cached['profile']
+        profile = weights @ corpus_embeddings
+        if path:
+            np.savez(path, profile=profile, fingerprint=np.array(fingerprint))
+        return profile
+
+    def score(self, candidate_embeddings, corpus_embeddings, weights, corpus_ids):
+        profile = self.get_profile(corpus_embeddings, weights, corpus_ids)
+        return candidate_embeddings @ profile
+
+
+@register_scorer("topk")
+class TopKScorer(BaseScorer):
+    """Pools each candidate's similarity to its k nearest corpus papers, found with a persistent IVF index.
+
+    Unlike the weighted mean over the whole corpus, a niche interest backed by a handful of papers is not
+    diluted by the rest of the library.
+    """
+    RECALL_SAMPLE_SIZE = 32
+
+    def score(self, candidate_embeddings, corpus_embeddings, weights, corpus_ids):
+        topk_config = self.config.reranker.get("topk") or {}
+        k = min(topk_config.get("k") or 10, len(corpus_ids))
+        pooling = topk_config.get("pooling") or "mean"
+        if pooling not in ("mean", "max"):
+            raise ValueError(f"Unknown top-k pooling {pooling}. Choose from 'mean' or 'max'.")
+        index = IVFIndex(os.path.join(self.cache_dir, "ivf.npz") if self.cache_dir else None)
+        index.update(corpus_embeddings, corpus_ids)
+        sims, rows = index.search(candidate_embeddings, corpus_embeddings, k)
+        # Candidates whose probed lists all lost their papers since training are searched exhaustively.
+        empty = np.flatnonzero(~np.isfinite(sims).any(axis=1))
+        if len(empty):
+            logger.debug(f"{len(empty)} candidates probed only empty ANN lists, searching them exactly")
+            rows[empty] = exact_search(candidate_embeddings[empty], corpus_embeddings, k)
+            sims[empty] = np.take_along_axis(candidate_embeddings[empty] @ corpus_embeddings.T, rows[empty], axis=1)
+        self.report_recall(candidate_embeddings, corpus_embeddings, rows, k)
+        sims = np.where(np.isfinite(sims), sims, np.nan)
+        return np.nanmax(sims, axis=1) if pooling == "max" else np.nanmean(sims, axis=1)
+
+    def report_recall(self, candidate_embeddings, corpus_embeddings, rows, k):
+        sample = np.random.default_rng(0).permutation(len(candidate_embeddings))[:self.RECALL_SAMPLE_SIZE]
+        exact = exact_search(candidate_embeddings[sample], corpus_embeddings, k)
+        recall = recall_at_k(rows[sample], exact)
+        logger.info(f"ANN recall@{k} against exact search on {len(sample)} sampled candidates: {recall:.3f}")
+        return recall
+
+
+@register_scorer("cluster")
+class ClusterScorer(BaseScorer):
+    """Scores candidates against k interest centroids instead of every corpus paper.
+
+    The corpus embeddings are clustered with mini-batch k-means, and each interest is summarized by the
+    time-weighted mean of its papers. A candidate takes the score of the interest it is closest to, so that
+    unrelated interests are not blended into one average. The interests are saved under ``cache_dir``: an
+    unchanged corpus reuses them, and a changed one refits k-means warm-started from the previous centroids.
+    """
+    def fit(self, corpus_embeddings:np.ndarray, weights:np.ndarray, corpus_ids:list[str]) -> tuple[np.ndarray, np.ndarray]:
+        from sklearn.cluster import MiniBatchKMeans
+        cluster_config = self.config.reranker.get("cluster") or {}
+        k = min(cluster_config.get("k") or 8, len(corpus_ids))
+        fingerprint = corpus_fingerprint(corpus_ids)
+        path = os.path.join(self.cache_dir, "clusters.npz") if self.cache_dir else None
+        init = None
+        if path and os.path.exists(path):
+            with np.load(path) as cached:
+                if len(cached['centroids']) == k:
+                    if str(cached['fingerprint']) == fingerprint:
+                        logger.debug("Loaded interest clusters from cache")
+                        return cached['interests'], cached['representatives']
+                    init = cached['centroids']
+
+        start = perf_counter()
+        kmeans = MiniBatchKMeans(
+            n_clusters=k, init='k-means++' if init is None else init, n_init=3 if init is None else 1,
+            batch_size=1024, random_state=0,
+        )
+        labels = kmeans.fit_predict(corpus_embeddings, sample_weight=weights)
+        interests, representatives = [], []
+        for l in range(k):
+            members = np.flatnonzero(labels == l)
+            if len(members) == 0:
+                continue
+            interest = weights[members] @ corpus_embeddings[members] / weights[members].sum()
+            interests.append(interest)
+            representatives.append(members[np.argmax(corpus_embeddings[members] @ interest)])
+        interests = np.array(interests, dtype=np.float32)
+        representatives = np.array(representatives, dtype=np.int64)
+        logger.info(
+            f"{'Refitted' if init is not None else 'Fitted'} {len(interests)} interest clusters "
+            f"over {len(corpus_ids)} papers in {perf_counter() - start:.2f}s"
+        )
+        if path:
+            np.savez(
+                path, centroids=kmeans.cluster_centers_, interests=interests,
+                representatives=representatives, fingerprint=np.array(fingerprint),
+            )
+        return interests, representatives
+
+    def score(self, candidate_embeddings, corpus_embeddings, weights, corpus_ids):
+        interests, self.representatives = self.fit(corpus_embeddings, weights, corpus_ids)
+        sim = candidate_embeddings @ interests.T # [n_candidate, n_interest]
+        self.matched = np.argmax(sim, axis=1)
+        return sim[np.arange(len(sim)), self.matched]
@@ -0,0 +1,150 @@
+"""A long-lived process that keeps local embedding models loaded between runs.
+
+Start it with ``python -m zotero_arxiv_daily.reranker.worker --socket /tmp/zotero-arxiv-daily.sock``
+and point ``reranker.local.worker_socket`` to the same path. ``LocalReranker`` then sends its encode
+requests to the worker over the Unix socket instead of loading the model itself.
+
+Each message is a JSON header prefixed by its length, optionally followed by a raw float32 payload.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from time import perf_counter
+from typing import Any, Callable
+import numpy as np
+from loguru import logger
+
+_LENGTH = struct.Struct('!Q')
+# Seconds to wait for an encode request, long enough for the worker to load the model on its first request.
+DEFAULT_TIMEOUT = 600
+
+
+def _recv_exactly(sock:socket.socket, size:int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def send_message(sock:socket.socket, header:dict[str, Any], payload:bytes = b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(data)) + data + _LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock:socket.socket) -> tuple[dict[str, Any], bytes]:
+    header = json.loads(_recv_exactly(sock, _recv_length(sock)))
+    payload = _recv_exactly(sock, _recv_length(sock))
+    return header, payload
+
+
+def _recv_length(sock:socket.socket) -> int:
+    return _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0]
+
+
+class EmbeddingWorker(socketserver.UnixStreamServer):
+    """Serves encode requests one at a time, loading each requested model once."""
+    def __init__(self, socket_path:str, load_encoder:Callable[[str], Any]):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.socket_path = socket_path
+        self.load_encoder = load_encoder
+        self.encoders = {}
+        self.lock = threading.Lock()
+        super().__init__(socket_path, EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def get_encoder(self, model:str):
+        if model not in self.encoders:
+            start = perf_counter()
+            self.encoders[model] = self.load_encoder(model)
+            logger.info(f"Loaded {model} in {perf_counter() - start:.2f}s")
+        return self.encoders[model]
+
+    def encode(self, model:str, texts:list[str], encode_kwargs:dict) -> np.ndarray:
+        with self.lock:
+            return np.asarray(self.get_encoder(model).encode(texts, **encode_kwargs), dtype=np.float32)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    server: EmbeddingWorker
+
+    def handle(self):
+        try:
+            request, _ = recv_message(self.request)
+            start = perf_counter()
+            embeddings = self.server.encode(request['model'], request['texts'], request.get('encode_kwargs') or {})
+            elapsed = perf_counter() - start
+            logger.info(f"Encoded {len(request['texts'])} texts with {request['model']} in {elapsed:.2f}s")
+            send_message(self.request, {'shape': list(embeddings.shape), 'encode_seconds': elapsed}, embeddings.tobytes())
+        except Exception as e:
+            logger.warning(f"Failed to serve encode request: {type(e).__name__}: {e}")
+            try:
+                send_message(self.request, {'error': f"{type(e).__name__}: {e}"})
+            except OSError:
+                pass
+
+
+class EmbeddingWorkerClient:
+    def __init__(self, socket_path:str, timeout:float = DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def is_available(self) -> bool:
+        return os.path.exists(self.socket_path)
+
+    def encode(self, model:str, texts:list[str], encode_kwargs:dict | None = None) -> np.ndarray:
+        start = perf_counter()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, {'model': model, 'texts': texts, 'encode_kwargs': encode_kwargs or {}})
+            header, payload = recv_message(sock)
+        if 'error' in header:
+            raise RuntimeError(f"Embedding worker failed: {header['error']}")
+        embeddings = np.frombuffer(payload, dtype=np.float32).reshape(header['shape'])
+        logger.debug(
+            f"Embedding worker encoded {len(texts)} texts in {perf_counter() - start:.2f}s "
+            f"({header['encode_seconds']:.2f}s encoding)"
+        )
+        return embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep local embedding models loaded and serve encode requests over a Unix socket.")
+    parser.add_argument("--socket", required=True, help="Path of the Unix socket to listen on.")
+    parser.add_argument("--model", action="append", default=[], help="Model to load at startup. Can be given several times.")
+    parser.add_argument("--backend", default="torch", help="Inference backend: torch, torch-int8, onnx or onnx-int8.")
+    parser.add_argument("--cache-dir", default=None, help="Directory for ONNX exports, as executor.cache_dir.")
+    parser.add_argument("--debug", action="store_true", help="Show the logs of transformers and sentence_transformers.")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stdout, level="DEBUG" if args.debug else "INFO")
+
+    from .local import load_encoder
+    worker = EmbeddingWorker(args.socket, lambda model: load_encoder(model, debug=args.debug, backend=args.backend, cache_dir=args.cache_dir))
+    for model in args.model:
+        worker.get_encoder(model)
+    logger.info(f"Embedding worker listening on {args.socket}")
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.server_close()
+
+
+if __name__ == '__main__':
+    main()
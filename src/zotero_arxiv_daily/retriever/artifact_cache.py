@@ -0,0 +1,129 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing, contextmanager
+from typing import Iterator
+from time import time
+from loguru import logger
+
+
+def file_digest(path:str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+class ArtifactCache:
+    """An on-disk cache of downloaded documents and the text extracted from them.
+
+    Entries are keyed by paper (e.g. arXiv id and version) and artifact kind (e.g. ``pdf`` or ``pdf.text``),
+    and point to blobs named by the SHA-256 of their content, so identical artifacts are stored once.
+    Blobs are checked against their digest on every read, and corrupt ones are dropped. Once the blobs
+    exceed ``max_bytes``, the least recently used entries are evicted.
+    """
+    def __init__(self, path:str, max_bytes:int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "key TEXT NOT NULL, kind TEXT NOT NULL, digest TEXT NOT NULL, size INTEGER NOT NULL, "
+                "accessed REAL NOT NULL, PRIMARY KEY (key, kind))"
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        # One connection per call, since the cache is used from several download threads.
+        return sqlite3.connect(os.path.join(self.path, "index.sqlite"), timeout=30)
+
+    def blob_path(self, digest:str) -> str:
+        return os.path.join(self.path, "blobs", digest[:2], digest)
+
+    def get_file(self, key:str, kind:str) -> str | None:
+        """Path of the cached artifact, or None if it is missing or corrupt. Do not modify the file."""
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute("SELECT digest FROM artifacts WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+            if row is None:
+                return None
+            digest = row[0]
+            path = self.blob_path(digest)
+            if not os.path.exists(path) or file_digest(path) != digest:
+                logger.warning(f"Dropping corrupt cached {kind} of {key}")
+                conn.execute("DELETE FROM artifacts WHERE digest = ?", (digest,))
+                if os.path.exists(path):
+                    os.remove(path)
+                return None
+            conn.execute("UPDATE artifacts SET accessed = ? WHERE key = ? AND kind = ?", (time(), key, kind))
+            return path
+
+    def get_text(self, key:str, kind:str) -> str | None:
+        path = self.get_file(key, kind)
+        if path is None:
+            return None
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def put_file(self, key:str, kind:str, path:str):
+        digest = file_digest(path)
+        with self.new_blob(digest) as temp:
+            if temp is not None:
+                shutil.copyfile(path, temp)
+        self.record(key, kind, digest)
+
+    def put_bytes(self, key:str, kind:str, data:bytes):
+        digest = hashlib.sha256(data).hexdigest()
+        with self.new_blob(digest) as temp:
+            if temp is not None:
+                with open(temp, 'wb') as f:
+                    f.write(data)
+        self.record(key, kind, digest)
+
+    @contextmanager
+    def new_blob(self, digest:str) -> Iterator[str | None]:
+        """A temporary path to write the blob to, moved in place afterwards. None if the blob already exists."""
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            yield None
+            return
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # Written under a temporary name first, so that a blob is never seen half-written.
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(blob))
+        os.close(fd)
+        try:
+            yield temp
+            os.replace(temp, blob)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def record(self, key:str, kind:str, digest:str):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (key, kind, digest, os.path.getsize(self.blob_path(digest)), time()),
+            )
+        self.evict()
+
+    def put_text(self, key:str, kind:str, text:str):
+        self.put_bytes(key, kind, text.encode('utf-8'))
+
+    def total_bytes(self) -> int:
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM artifacts)").fetchone()[0]
+
+    def evict(self):
+        """Drop the least recently used entries until the blobs fit in max_bytes."""
+        with closing(self.connect()) as conn, conn:
+            blobs = conn.execute(
+                "SELECT digest, size, MAX(accessed) AS last FROM artifacts GROUP BY digest ORDER BY last"
+            ).fetchall()
+            total = sum(size for _, size, _ in blobs)
+            for digest, size, _ in blobs:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM artifacts WHERE digest = ?", (digest,))
+                if os.path.exists(self.blob_path(digest)):
+                    os.remove(self.blob_path(digest))
+                total -= size
+                logger.debug(f"Evicted cached artifact {digest[:12]} ({size} bytes)")
@@ -1,112 +1,172 @@
 from .base import BaseRetriever, register_retriever
+from .download import Document, download_document, DEFAULT_MAX_MEMORY_MB
 import arxiv
 from arxiv import Result as ArxivResult
-from ..protocol import Paper
+from ..protocol import Paper, FULL_TEXT_TOKEN_BUDGET
 from ..utils import extract_markdown_from_pdf, extract_tex_code_from_tar
-from tempfile import TemporaryDirectory
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from concurrent.futures import ThreadPoolExecutor
 import feedparser
-from urllib.request import urlretrieve
-from tqdm import tqdm
 import os
+import re
+import unicodedata
 from loguru import logger
 
-PDF_EXTRACT_TIMEOUT = 180
+API_BATCH_SIZE = 100
+API_CONCURRENCY = 4
+FEED_SUMMARY_PREFIX = re.compile(r'^arXiv:\S+\s+Announce Type:\s*\S+\s*Abstract:\s*')
+# TeX accents as combining characters, and the letters TeX spells as commands.
+TEX_ACCENTS = {
+    "'": "\u0301", "`": "\u0300", "^": "\u0302", '"': "\u0308", "~": "\u0303", "=": "\u0304", ".": "\u0307",
+    "u": "\u0306", "v": "\u030c", "H": "\u030b", "c": "\u0327", "k": "\u0328", "r": "\u030a",
+}
+TEX_LETTERS = {
+    "ss": "ß", "aa": "å", "AA": "Å", "ae": "æ", "AE": "Æ", "oe": "œ", "OE": "Œ",
+    "o": "ø", "O": "Ø", "l": "ł", "L": "Ł", "i": "ı", "j": "ȷ",
+}
+# An accent on a letter, braced or not, such as \'e, \'{e} or \'{\i}. Accents named by a letter need a brace or space.
+TEX_ACCENT = re.compile(r"""\\(?:([`'^"~=.])\s*|([uvHckr])(?=[\s{]))\s*(?:\{\s*(\\?[A-Za-z])\s*\}|(\\?[A-Za-z]))""")
+TEX_LETTER = re.compile(r"\\(ss|aa|AA|ae|AE|oe|OE|o|O|l|L|i|j)(?![A-Za-z])\s*")
+
+
+def unescape_tex(text:str) -> str:
+    """Replace the TeX accents of a name from the arxiv feed, such as ``Andr\\'e``, by unicode characters."""
+    if "\\" not in text:
+        return text
+    def accent(match:re.Match) -> str:
+        letter = (match.group(3) or match.group(4)).lstrip("\\")
+        return letter + TEX_ACCENTS[match.group(1) or match.group(2)]
+    text = TEX_ACCENT.sub(accent, text)
+    text = TEX_LETTER.sub(lambda m: TEX_LETTERS[m.group(1)], text)
+    return unicodedata.normalize("NFC", text.replace("{", "").replace("}", ""))
+
+
+def result_from_feed_entry(entry:feedparser.FeedParserDict) -> ArxivResult | None:
+    """Build an arxiv result from an RSS feed entry, or return None if the entry lacks a required field."""
+    paper_id = entry.get("id", "").removeprefix("oai:arXiv.org:")
+    title = entry.get("title")
+    authors = entry.get("author")
+    abstract = FEED_SUMMARY_PREFIX.sub("", entry.get("summary", "")).strip()
+    if not (paper_id and title and authors and abstract):
+        return None
+    return ArxivResult(
+        entry_id=f"http://arxiv.org/abs/{paper_id}",
+        title=title,
+        authors=[ArxivResult.Author(unescape_tex(a.strip())) for a in authors.split(",") if a.strip()],
+        summary=abstract,
+        categories=[t.term for t in entry.get("tags", [])],
+        links=[ArxivResult.Link(f"http://arxiv.org/pdf/{paper_id}", title="pdf", rel="related", content_type="application/pdf")],
+    )
+
+
+def strip_version(paper_id:str) -> str:
+    return re.sub(r'v\d+$', '', paper_id)
+
+
+def search_arxiv_ids(paper_ids:list[str]) -> list[ArxivResult]:
+    """Look up papers on the arxiv API, in concurrent batches of API_BATCH_SIZE ids."""
+    def search(batch:list[str]) -> list[ArxivResult]:
+        client = arxiv.Client(page_size=API_BATCH_SIZE, num_retries=5, delay_seconds=3)
+        return list(client.results(arxiv.Search(id_list=batch)))
+    batches = [paper_ids[i:i + API_BATCH_SIZE] for i in range(0, len(paper_ids), API_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=API_CONCURRENCY) as pool:
+        return [r for batch in pool.map(search, batches) for r in batch]
+
+
 @register_retriever("arxiv")
 class ArxivRetriever(BaseRetriever):
+    full_text_sources = ("pdf", "tar")
+
     def __init__(self, config):
         super().__init__(config)
         if self.config.source.arxiv.category is None:
             raise ValueError("category must be specified for arxiv.")
     def _retrieve_raw_papers(self) -> list[ArxivResult]:
-        client = arxiv.Client(num_retries=10,delay_seconds=10)
         query = '+'.join(self.config.source.arxiv.category)
         include_cross_list = self.config.source.arxiv.get("include_cross_list", False)
         # Get the latest paper from arxiv rss feed
         feed = feedparser.parse(f"https://rss.arxiv.org/atom/{query}")
         if 'Feed error for query' in feed.feed.title:
             raise Exception(f"Invalid ARXIV_QUERY: {query}.")
-        raw_papers = []
         allowed_announce_types = {"new", "cross"} if include_cross_list else {"new"}
-        all_paper_ids = [
-            i.id.removeprefix("oai:arXiv.org:")
-            for i in feed.entries
+        entries = [
+            i for i in feed.entries
             if i.get("arxiv_announce_type", "new") in allowed_announce_types
         ]
         if self.config.executor.debug:
-            all_paper_ids = all_paper_ids[:10]
-
-        # Get full information of each paper from arxiv api
-        bar = tqdm(total=len(all_paper_ids))
-        for i in range(0,len(all_paper_ids),20):
-            search = arxiv.Search(id_list=all_paper_ids[i:i+20])
-            batch = list(client.results(search))
-            bar.update(len(batch))
-            raw_papers.extend(batch)
-        bar.close()
+            entries = entries[:10]
 
-        return raw_papers
+        # The feed carries everything we need. The arxiv api is only queried for incomplete entries.
+        raw_papers = [result_from_feed_entry(e) for e in entries]
+        paper_ids = [e.id.removeprefix("oai:arXiv.org:") for e in entries]
+        missing_ids = [i for i, r in zip(paper_ids, raw_papers) if r is None]
+        if missing_ids:
+            logger.info(f"Fetching {len(missing_ids)} incomplete feed entries from the arxiv api")
+            # Match by id without version, in case the api returns a newer version than the feed.
+            found = {strip_version(r.get_short_id()): r for r in search_arxiv_ids(missing_ids)}
+            raw_papers = [r if r is not None else found.get(strip_version(i)) for i, r in zip(paper_ids, raw_papers)]
+        return [r for r in raw_papers if r is not None]
 
     def convert_to_paper(self, raw_paper:ArxivResult) -> Paper:
-        title = raw_paper.title
-        authors = [a.name for a in raw_paper.authors]
-        abstract = raw_paper.summary
-        pdf_url = raw_paper.pdf_url
-        try:
-            with ThreadPoolExecutor(max_workers=1) as pool:
-                full_text = pool.submit(extract_text_from_pdf, raw_paper).result(timeout=PDF_EXTRACT_TIMEOUT)
-        except TimeoutError:
-            logger.warning(f"PDF extraction timed out for {raw_paper.title}")
-            full_text = None
-        if full_text is None:
-            full_text = extract_text_from_tar(raw_paper)
         return Paper(
             source=self.name,
-            title=title,
-            authors=authors,
-            abstract=abstract,
+            title=raw_paper.title,
+            authors=[a.name for a in raw_paper.authors],
+            abstract=raw_paper.summary,
             url=raw_paper.entry_id,
-            pdf_url=pdf_url,
-            full_text=full_text
+            pdf_url=raw_paper.pdf_url,
         )
 
-def extract_text_from_pdf(paper: ArxivResult) -> str | None:
-    with TemporaryDirectory() as temp_dir:
-        path = os.path.join(temp_dir, "paper.pdf")
-        if paper.pdf_url is None:
-            logger.warning(f"No PDF URL available for {paper.title}")
+    def download_full_text(self, paper:Paper, source:str, directory:str) -> Document | None:
+        match source:
+            case "pdf":
+                url, path = paper.pdf_url, os.path.join(directory, "paper.pdf")
+            case "tar":
+                url, path = get_source_url(paper), os.path.join(directory, "paper.tar.gz")
+        if url is None:
+            logger.warning(f"No {source} URL available for {paper.title}")
             return None
+        max_memory = (self.config.executor.get("download_memory_mb") or DEFAULT_MAX_MEMORY_MB) * 2**20
         try:
-            urlretrieve(paper.pdf_url, path)
+            return download_document(url, path, max_memory=max_memory)
         except Exception as e:
-            logger.warning(f"Failed to download pdf for {paper.title}: {type(e).__name__}: {e}")
+            logger.warning(f"Failed to download {source} for {paper.title}: {type(e).__name__}: {e}")
             return None
-        try:
-            full_text = extract_markdown_from_pdf(path)
-        except Exception as e:
-            logger.warning(f"Failed to extract full text of {paper.title} from pdf: {e}")
-            full_text = None
-        return full_text
-
-def extract_text_from_tar(paper: ArxivResult) -> str | None:
-    with TemporaryDirectory() as temp_dir:
-        path = os.path.join(temp_dir, "paper.tar.gz")
-        source_url = paper.source_url()
-        if source_url is None:
-            logger.warning(f"No source URL available for {paper.title}")
-            return None
-        try:
-            urlretrieve(source_url, path)
-        except Exception as e:
-            logger.warning(f"Failed to download source for {paper.title}: {type(e).__name__}: {e}")
+
+    def artifact_key(self, paper:Paper) -> str | None:
+        # The abs url ends with the versioned id, e.g. http://arxiv.org/abs/2508.13426v1
+        return f"arxiv:{paper.url.split('arxiv.org/abs/')[-1]}" if paper.url else None
+
+    def parse_full_text(self, paper:Paper, source:str, document:Document) -> str | None:
+        match source:
+            case "pdf":
+                # Runs in a sandbox of the full text pipeline, which enforces the time limit.
+                return extract_text_from_pdf(paper, document, self.retriever_config.get("max_pdf_pages"))
+            case "tar":
+                return extract_text_from_tar(paper, document)
+
+def get_source_url(paper: Paper) -> str | None:
+    if paper.pdf_url is None:
+        return None
+    return paper.pdf_url.replace("/pdf/", "/src/")
+
+def extract_text_from_pdf(paper: Paper, document: Document, max_pages: int | None = None) -> str | None:
+    try:
+        return extract_markdown_from_pdf(document, max_tokens=FULL_TEXT_TOKEN_BUDGET, max_pages=max_pages)
+    except MemoryError:
+        raise
+    except Exception as e:
+        logger.warning(f"Failed to extract full text of {paper.title} from pdf: {e}")
+        return None
+
+def extract_text_from_tar(paper: Paper, document: Document) -> str | None:
+    try:
+        file_contents = extract_tex_code_from_tar(document, paper.url)
+        if "all" not in file_contents:
+            logger.warning(f"Failed to extract full text of {paper.title} from tar: Main tex file not found.")
             return None
-        try:
-            file_contents = extract_tex_code_from_tar(path, paper.entry_id)
-            if "all" not in file_contents:
-                logger.warning(f"Failed to extract full text of {paper.title} from tar: Main tex file not found.")
-                return None
-            full_text = file_contents["all"]
-        except Exception as e:
-            logger.warning(f"Failed to extract full text of {paper.title} from tar: {e}")
-            full_text = None
-        return full_text
+        return file_contents["all"]
+    except MemoryError:
+        raise
+    except Exception as e:
+        logger.warning(f"Failed to extract full text of {paper.title} from tar: {e}")
+        return None
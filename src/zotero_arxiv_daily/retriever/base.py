@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
 from omegaconf import DictConfig
 from ..protocol import Paper, RawPaperItem
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from tqdm import tqdm
-from typing import Type
+from .pipeline import FullTextPipeline
+from .artifact_cache import ArtifactCache
+from .download import Document
+from typing import Iterator, Type
 from loguru import logger
+import os
 
 
 def _describe_raw_paper(raw_paper: RawPaperItem) -> str:
@@ -30,7 +32,15 @@ def _convert_to_paper_safe(retriever: "BaseRetriever", raw_paper: RawPaperItem)
 
 
 class BaseRetriever(ABC):
+    """Retrieves new papers in two stages.
+
+    ``retrieve_papers`` only builds papers from their metadata, which is all reranking needs. The expensive
+    full text is fetched afterwards by ``enrich_papers``, for the papers that make it into the email.
+    It tries the document types in ``full_text_sources`` in turn, downloading each with ``download_full_text``
+    and extracting its text with ``parse_full_text``.
+    """
     name: str
+    full_text_sources: tuple[str, ...] = ()
     def __init__(self, config:DictConfig):
         self.config = config
         self.retriever_config = getattr(config.source,self.name)
@@ -41,25 +51,57 @@ class BaseRetriever(ABC):
 
     @abstractmethod
     def convert_to_paper(self, raw_paper:RawPaperItem) -> Paper | None:
+        """Build a paper from its metadata, without its full text."""
         pass
 
+    def download_full_text(self, paper:Paper, source:str, directory:str) -> Document | None:
+        """Download the document of type ``source`` and return its content, or None if unavailable.
+
+        Documents too large to keep in memory may be written into ``directory`` instead, and their path returned.
+        """
+        return None
+
+    def parse_full_text(self, paper:Paper, source:str, document:Document) -> str | None:
+        """Extract the full text from a document downloaded by ``download_full_text``. Runs in a worker process."""
+        return None
+
+    def artifact_key(self, paper:Paper) -> str | None:
+        """Identifies the exact version of a paper, for caching its documents across runs. None disables caching."""
+        return None
+
+    def iter_papers(self) -> Iterator[Paper]:
+        """Yield the retrieved papers one by one, as they are converted."""
+        for raw_paper in self._retrieve_raw_papers():
+            paper = _convert_to_paper_safe(self, raw_paper)
+            if paper is not None:
+                yield paper
+
     def retrieve_papers(self) -> list[Paper]:
-        raw_papers = self._retrieve_raw_papers()
-        papers = []
-        logger.info("Processing papers...")
-        with ProcessPoolExecutor(max_workers=self.config.executor.max_workers) as exec_pool:
-            futures = {exec_pool.submit(_convert_to_paper_safe, self, rp): i for i, rp in enumerate(raw_papers)}
-            papers = [None] * len(raw_papers)
-            for future in tqdm(as_completed(futures), total=len(raw_papers), desc="Converting papers"):
-                try:
-                    papers[futures[future]] = future.result()
-                except Exception as exc:
-                    raw_paper = raw_papers[futures[future]]
-                    logger.warning(
-                        f"Skipping paper {_describe_raw_paper(raw_paper)} after worker failure: "
-                        f"{type(exc).__name__}: {exc}"
-                    )
-        return [p for p in papers if p is not None]
+        return list(self.iter_papers())
+
+    def get_artifact_cache(self) -> ArtifactCache | None:
+        cache_dir = self.config.executor.get("cache_dir")
+        if not cache_dir:
+            return None
+        max_mb = self.config.executor.get("artifact_cache_mb") or 2048
+        return ArtifactCache(os.path.join(cache_dir, "artifacts"), max_mb * 2**20)
+
+    def enrich_papers(self, papers:list[Paper]) -> list[Paper]:
+        """Fill in the full text of the given papers in place."""
+        if len(papers) == 0 or not self.full_text_sources:
+            return papers
+        logger.info(f"Fetching full text of {len(papers)} {self.name} papers...")
+        pipeline = FullTextPipeline(
+            self,
+            download_workers=self.config.executor.get("download_workers") or 16,
+            parse_workers=self.config.executor.max_workers,
+            sandbox=self.config.executor.get("sandbox"),
+            cache=self.get_artifact_cache(),
+            hedge_delay=self.config.executor.get("hedge_delay"),
+        )
+        for paper, full_text in zip(papers, pipeline.run(papers)):
+            paper.full_text = full_text
+        return papers
 
 registered_retrievers = {}
 
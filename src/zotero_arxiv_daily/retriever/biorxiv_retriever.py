@@ -1,10 +1,71 @@
+import random
 import requests
+from requests.adapters import HTTPAdapter
 from .base import BaseRetriever, register_retriever
 from ..protocol import Paper
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
 from typing import Any
 from time import sleep
 
+API_URL = "https://api.biorxiv.org/details/{server}/2d/{cursor}"
+API_CONCURRENCY = 4
+API_TIMEOUT = 30
+API_RETRIES = 8
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+
+def backoff_delay(attempt:int) -> float:
+    """Exponential backoff with full jitter, so that concurrent page requests do not retry in lockstep."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def make_session() -> requests.Session:
+    session = requests.Session()
+    # One connection per concurrent page request, kept alive across pages.
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=API_CONCURRENCY))
+    return session
+
+
+def get_json(session:requests.Session, url:str) -> dict[str, Any]:
+    for i in range(API_RETRIES):
+        try:
+            response = session.get(url, timeout=API_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            if i == API_RETRIES - 1:
+                raise e
+            delay = backoff_delay(i)
+            logger.warning(f"Failed to retrieve papers from {url}: {str(e)}. Retry in {delay:.1f} seconds.")
+            sleep(delay)
+
+
+class LatestPapers:
+    """Keep the papers of the given categories posted on the latest date, from pages in any order.
+
+    The latest date is taken over papers of all categories, so that a quiet day in the chosen categories
+    yields no papers instead of those of the day before.
+    """
+    def __init__(self, categories:list[str]):
+        self.categories = {c.lower() for c in categories}
+        self.latest_date = None
+        # Papers by their position in the listing, so that they come out in the order of the API.
+        self.papers: dict[int, dict[str, Any]] = {}
+
+    def add(self, cursor:int, collection:list[dict[str, Any]]):
+        for i, paper in enumerate(collection):
+            if self.latest_date is None or paper['date'] > self.latest_date:
+                self.latest_date = paper['date']
+                self.papers.clear()
+            if paper['date'] == self.latest_date and paper['category'] in self.categories:
+                self.papers[cursor + i] = paper
+
+    def result(self) -> list[dict[str, Any]]:
+        return [self.papers[i] for i in sorted(self.papers)]
+
+
 @register_retriever("biorxiv")
 class BiorxivRetriever(BaseRetriever):
     server = "biorxiv"
@@ -15,30 +76,23 @@ class BiorxivRetriever(BaseRetriever):
             raise ValueError(f"category must be specified for {self.name}")
 
     def _retrieve_raw_papers(self) -> list[dict[str, Any]]:
-        api_url = f"https://api.biorxiv.org/details/{self.server}/2d"
-        retry_num = 10
-        delay_time = 10
-        for i in range(retry_num):
-            try:
-                response = requests.get(api_url)
-                response.raise_for_status()
-                break
-            except Exception as e:
-                if i == retry_num - 1:
-                    raise e
-                else:
-                    logger.warning(f"Failed to retrieve papers: {str(e)}. Retry in {delay_time} seconds.")
-                    sleep(delay_time)
-        result = response.json()
-        collection = result['collection']
-        if len(collection) == 0:
-            logger.warning(f"No paper found. API Message: {result['messages']}")
-            return []
-        all_dates = set(c['date'] for c in collection)
-        latest_date = sorted(all_dates)[-1]
-        collection = [c for c in collection if c['date'] == latest_date]
-        categories = [c.lower() for c in self.retriever_config.category]
-        collection = [c for c in collection if c['category'] in categories]
+        latest = LatestPapers(self.retriever_config.category)
+        with make_session() as session:
+            result = get_json(session, API_URL.format(server=self.server, cursor=0))
+            collection = result['collection']
+            if len(collection) == 0:
+                logger.warning(f"No paper found. API Message: {result['messages']}")
+                return []
+            latest.add(0, collection)
+            # The first page tells how many papers there are, so the other pages can be requested at once.
+            total = int(result['messages'][0]['total'])
+            cursors = range(len(collection), total, len(collection))
+            logger.debug(f"Retrieving {total} {self.server} papers in {len(cursors) + 1} pages")
+            with ThreadPoolExecutor(API_CONCURRENCY) as pool:
+                pages = {pool.submit(get_json, session, API_URL.format(server=self.server, cursor=c)): c for c in cursors}
+                for future in as_completed(pages):
+                    latest.add(pages[future], future.result()['collection'])
+        collection = latest.result()
         if self.config.executor.debug:
             collection = collection[:10]
         return collection
@@ -49,7 +103,7 @@ class BiorxivRetriever(BaseRetriever):
         authors = [a.strip() for a in raw_paper['authors'].split(';')]
         abstract = raw_paper['abstract']
         pdf_url = f"https://www.{self.server}.org/content/{raw_paper['doi']}v{raw_paper['version']}.full.pdf"
-        full_text = None # biorxiv forbids scraping its pdf
+        # No fetch_full_text: biorxiv forbids scraping its pdf
         return Paper(
             source=self.name,
             title=title,
@@ -57,5 +111,4 @@ class BiorxivRetriever(BaseRetriever):
             abstract=abstract,
             url=pdf_url,
             pdf_url=pdf_url,
-            full_text=full_text
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,40 @@
+import io
+import os
+from urllib.request import urlopen
+
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+DOWNLOAD_TIMEOUT = 60
+DEFAULT_MAX_MEMORY_MB = 64
+
+Document = bytes | str
+"""A downloaded document: its content, or the path of the file it was spilled to."""
+
+
+def download_document(url:str, spill_path:str, max_memory:int = DEFAULT_MAX_MEMORY_MB * 2**20) -> Document:
+    """Download ``url`` into memory, without touching the disk.
+
+    Documents larger than ``max_memory`` bytes are spilled to ``spill_path`` once they outgrow it, and the
+    path is returned instead of the content.
+    """
+    with urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        length = response.headers.get("Content-Length")
+        if length is not None and int(length) <= max_memory:
+            # The size is known and fits: read it in one go, into a buffer of the right size.
+            return response.read()
+        buffer = io.BytesIO()
+        spill = None
+        try:
+            while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                if spill is None and buffer.tell() + len(chunk) > max_memory:
+                    spill = open(spill_path, 'wb')
+                    spill.write(buffer.getbuffer())
+                    buffer = None
+                (spill or buffer).write(chunk)
+        finally:
+            if spill is not None:
+                spill.close()
+    return spill_path if spill is not None else buffer.getvalue()
+
+
+def document_size(document:Document) -> int:
+    return len(document) if isinstance(document, bytes) else os.path.getsize(document)
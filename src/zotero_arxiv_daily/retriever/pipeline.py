@@ -0,0 +1,350 @@
+"""Staged full-text extraction: a thread pool downloads documents and a process pool parses them.
+
+Downloads are network-bound and parsing is CPU-bound, so they run in separate stages sized independently.
+Downloaded documents wait in a bounded queue, which holds back the downloaders when parsing falls behind.
+Documents are kept in memory and handed to the parse workers as bytes, unless they were too large and
+spilled to disk, so that most papers never touch the disk.
+The parse workers build their own retriever once from the config, instead of receiving it with every paper,
+and run in sandboxes that are killed when a document exceeds the limits in ``executor.sandbox``.
+
+A retriever lists its document types in ``full_text_sources``, in order of preference. When a document
+cannot be downloaded or parsed, the paper goes back to the download stage with the next type. With a
+``hedge_delay``, the next type is also tried when parsing a document takes longer than that many seconds,
+and the first of the two to succeed is kept, while the other is cancelled.
+
+With an ``ArtifactCache``, the downloaded documents and the extracted text of papers that have an
+``artifact_key`` are cached, so that papers seen in an earlier run are neither downloaded nor parsed again.
+"""
+import os
+import queue
+import shutil
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import TYPE_CHECKING, Type
+from loguru import logger
+from omegaconf import DictConfig
+from tqdm import tqdm
+from ..protocol import Paper
+from .sandbox import SandboxKilled, SandboxPool, SandboxReport
+from .artifact_cache import ArtifactCache
+from .download import Document, document_size
+
+if TYPE_CHECKING:
+    from .base import BaseRetriever
+
+POLL_INTERVAL = 0.1
+
+_retriever: "BaseRetriever | None" = None
+
+
+def _init_parse_worker(retriever_cls:Type["BaseRetriever"], config:DictConfig):
+    global _retriever
+    _retriever = retriever_cls(config)
+
+
+def _parse(paper:Paper, source:str, document:Document) -> str | None:
+    try:
+        return _retriever.parse_full_text(paper, source, document)
+    except MemoryError:
+        # Left to the sandbox, which reports the memory limit and replaces the worker.
+        raise
+    except Exception as exc:
+        logger.warning(f"Failed to parse {source} of {paper.title}: {type(exc).__name__}: {exc}")
+        return None
+
+
+@dataclass
+class PipelineStats:
+    papers: int = 0
+    wall_time: float = 0.0
+    download_time: float = 0.0
+    parse_time: float = 0.0
+    download_workers: int = 1
+    parse_workers: int = 1
+    queue_depths: list[int] = field(default_factory=list)
+    text_cache_hits: int = 0
+    file_cache_hits: int = 0
+    downloaded_bytes: int = 0
+    spilled_documents: int = 0
+    hedged: int = 0
+    # Sources that produced the text of hedged papers.
+    winners: Counter[str] = field(default_factory=Counter)
+    # Seconds from the start of a download to the parsed text, of each successful attempt, by source.
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    # Sandbox reports of each paper, by index, one per parsed document.
+    reports: dict[int, list[SandboxReport]] = field(default_factory=dict)
+
+    @property
+    def kills(self) -> int:
+        return sum(r.killed not in (None, "cancelled") for reports in self.reports.values() for r in reports)
+
+    @property
+    def download_utilization(self) -> float:
+        return self.download_time / max(self.wall_time * self.download_workers, 1e-9)
+
+    @property
+    def parse_utilization(self) -> float:
+        return self.parse_time / max(self.wall_time * self.parse_workers, 1e-9)
+
+    @property
+    def max_queue_depth(self) -> int:
+        return max(self.queue_depths, default=0)
+
+    @property
+    def mean_queue_depth(self) -> float:
+        return sum(self.queue_depths) / len(self.queue_depths) if self.queue_depths else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.papers} papers in {self.wall_time:.1f}s: "
+            f"download {self.download_utilization:.0%} of {self.download_workers} threads, "
+            f"parse {self.parse_utilization:.0%} of {self.parse_workers} processes, "
+            f"queue depth mean {self.mean_queue_depth:.1f} max {self.max_queue_depth}, "
+            f"{self.kills} parses killed, "
+            f"{self.text_cache_hits} texts and {self.file_cache_hits} documents from cache, "
+            f"{self.downloaded_bytes / 2**20:.1f} MB downloaded with {self.spilled_documents} documents spilled to disk, "
+            f"{self.hedged} papers hedged ({', '.join(f'{n} won by {s}' for s, n in self.winners.items()) or 'none won'}), "
+            f"median latency {', '.join(f'{s} {median(l):.1f}s' for s, l in self.latencies.items()) or 'n/a'}"
+        )
+
+
+@dataclass
+class _Attempt:
+    """One try at the full text of a paper from one of its sources."""
+    started: float
+    download: Future | None = None
+    parse: Future | None = None
+    hedged: bool = False
+
+
+class FullTextPipeline:
+    def __init__(self, retriever:"BaseRetriever", download_workers:int, parse_workers:int, queue_size:int | None = None,
+                 sandbox:dict | None = None, cache:ArtifactCache | None = None, hedge_delay:float | None = None):
+        self.retriever = retriever
+        self.sources = list(retriever.full_text_sources)
+        self.download_workers = download_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size or 2 * parse_workers
+        self.sandbox = {k: v for k, v in (sandbox or {}).items() if v is not None}
+        self.cache = cache
+        self.hedge_delay = hedge_delay
+        self.stats = PipelineStats()
+        self.lock = threading.Lock()
+
+    def fetch_document(self, paper:Paper, key:str | None, source:str, directory:str) -> tuple[Document | None, str | None]:
+        """The downloaded document, or its cached extracted text, for the download stage."""
+        if key:
+            document, text = self.read_cache(key, source, directory)
+            if document is not None or text is not None:
+                return document, text
+        try:
+            document = self.retriever.download_full_text(paper, source, directory)
+        except Exception as exc:
+            logger.warning(f"Failed to download {source} of {paper.title}: {type(exc).__name__}: {exc}")
+            return None, None
+        if document is None:
+            return None, None
+        with self.lock:
+            self.stats.downloaded_bytes += document_size(document)
+            self.stats.spilled_documents += isinstance(document, str)
+        if key:
+            self.write_cache(key, source, document)
+        return document, None
+
+    def read_cache(self, key:str, source:str, directory:str) -> tuple[Document | None, str | None]:
+        """The cached extracted text or document of a paper. A cache that fails is treated as a miss."""
+        try:
+            text = self.cache.get_text(key, f"{source}.text")
+            if text is not None:
+                with self.lock:
+                    self.stats.text_cache_hits += 1
+                return None, text
+            cached = self.cache.get_file(key, source)
+            if cached is None:
+                return None, None
+            path = os.path.join(directory, source)
+            try:
+                os.link(cached, path)
+            except OSError:
+                shutil.copyfile(cached, path)
+        except Exception as exc:
+            logger.warning(f"Failed to read cached {source} of {key}, downloading it instead: {type(exc).__name__}: {exc}")
+            return None, None
+        with self.lock:
+            self.stats.file_cache_hits += 1
+        return path, None
+
+    def write_cache(self, key:str, kind:str, artifact:Document):
+        """Cache a document, given as content or path, or an extracted text. A cache that fails is skipped."""
+        try:
+            if isinstance(artifact, bytes):
+                self.cache.put_bytes(key, kind, artifact)
+            elif kind.endswith(".text"):
+                self.cache.put_text(key, kind, artifact)
+            else:
+                self.cache.put_file(key, kind, artifact)
+        except Exception as exc:
+            logger.warning(f"Failed to cache {kind} of {key}: {type(exc).__name__}: {exc}")
+
+    def run(self, papers:list[Paper]) -> list[str | None]:
+        """Full text of each paper, or None where no document could be downloaded and parsed."""
+        self.stats = PipelineStats(papers=len(papers), download_workers=self.download_workers, parse_workers=self.parse_workers)
+        results: list[str | None] = [None] * len(papers)
+        if not papers or not self.sources:
+            return results
+        # (paper index, source index, downloaded document, cached text)
+        downloaded: queue.Queue[tuple[int, int, Document | None, str | None]] = queue.Queue(maxsize=self.queue_size)
+        keys = [self.retriever.artifact_key(p) if self.cache else None for p in papers]
+        # Attempts that were started and have not ended yet, by (paper index, source index).
+        attempts: dict[tuple[int, int], _Attempt] = {}
+        tried: list[set[int]] = [set() for _ in papers]
+        finished = [False] * len(papers)
+        hedged = [False] * len(papers)
+        # Set when the main loop fails, to release the download threads.
+        stop = threading.Event()
+        start = perf_counter()
+
+        with TemporaryDirectory() as temp_dir, \
+                ThreadPoolExecutor(self.download_workers) as downloads, \
+                SandboxPool(self.parse_workers, initializer=_init_parse_worker,
+                            initargs=(type(self.retriever), self.retriever.config), **self.sandbox) as parses, \
+                tqdm(total=len(papers), desc="Fetching full text") as bar:
+
+            def download(i:int, k:int):
+                # Every attempt puts exactly one result, even when fetching fails, or the main loop waits forever.
+                document, text = None, None
+                try:
+                    if finished[i] or stop.is_set():
+                        # Another attempt succeeded while this one waited for a download thread.
+                        return
+                    directory = os.path.join(temp_dir, f"{i}-{k}")
+                    os.makedirs(directory)
+                    download_start = perf_counter()
+                    document, text = self.fetch_document(papers[i], keys[i], self.sources[k], directory)
+                    with self.lock:
+                        self.stats.download_time += perf_counter() - download_start
+                except Exception as exc:
+                    logger.warning(f"Failed to fetch {self.sources[k]} of {papers[i].title}: {type(exc).__name__}: {exc}")
+                finally:
+                    # Blocks while the parse stage is behind, until the run stops.
+                    while not stop.is_set():
+                        try:
+                            downloaded.put((i, k, document, text), timeout=POLL_INTERVAL)
+                            break
+                        except queue.Full:
+                            pass
+
+            def start_attempt(i:int, k:int):
+                tried[i].add(k)
+                attempts[i, k] = _Attempt(started=perf_counter())
+                attempts[i, k].download = downloads.submit(download, i, k)
+
+            def end_attempt(i:int, k:int, text:str | None):
+                """Called once for every attempt, when it succeeded, failed or was cancelled."""
+                shutil.rmtree(os.path.join(temp_dir, f"{i}-{k}"), ignore_errors=True)
+                attempt = attempts.pop((i, k))
+                if finished[i]:
+                    return
+                if text is not None:
+                    latency = perf_counter() - attempt.started
+                    self.stats.latencies.setdefault(self.sources[k], []).append(latency)
+                    if hedged[i]:
+                        self.stats.winners[self.sources[k]] += 1
+                        logger.debug(f"Hedged full text of {papers[i].title} came from {self.sources[k]} after {latency:.1f}s")
+                    finish(i, text)
+                    return
+                untried = [k for k in range(len(self.sources)) if k not in tried[i]]
+                if untried:
+                    start_attempt(i, untried[0])
+                elif not any(j == i for j, _ in attempts):
+                    finish(i, None)
+
+            remaining = len(papers)
+            def finish(i:int, text:str | None):
+                nonlocal remaining
+                finished[i] = True
+                results[i] = text
+                remaining -= 1
+                bar.update(1)
+                # The attempts still running for the paper lost the race.
+                for j, k in [a for a in attempts if a[0] == i]:
+                    attempt = attempts[j, k]
+                    if attempt.parse is not None:
+                        parses.cancel(attempt.parse)
+                    elif attempt.download.cancel():
+                        end_attempt(j, k, None)
+                    # Otherwise the document is dropped when it comes out of the download stage.
+
+            def hedge():
+                now = perf_counter()
+                for (i, k), attempt in list(attempts.items()):
+                    if finished[i] or attempt.hedged or attempt.parse is None:
+                        continue
+                    # Timed from when a worker took the document, so that waiting for one does not count.
+                    parse_started = parses.started(attempt.parse)
+                    if parse_started is None or now - parse_started < self.hedge_delay:
+                        continue
+                    attempt.hedged = True
+                    untried = [k for k in range(len(self.sources)) if k not in tried[i]]
+                    if untried:
+                        logger.debug(f"Parsing {self.sources[k]} of {papers[i].title} is slow, also trying {self.sources[untried[0]]}")
+                        hedged[i] = True
+                        self.stats.hedged += 1
+                        start_attempt(i, untried[0])
+
+            try:
+                for i in range(len(papers)):
+                    start_attempt(i, 0)
+                in_flight: dict[Future, tuple[int, int]] = {}
+                while remaining or attempts:
+                    self.stats.queue_depths.append(downloaded.qsize())
+                    while len(in_flight) < self.parse_workers:
+                        try:
+                            i, k, document, text = downloaded.get(timeout=0 if in_flight else POLL_INTERVAL)
+                        except queue.Empty:
+                            break
+                        if finished[i] or text is not None or document is None:
+                            end_attempt(i, k, text)
+                        else:
+                            future = parses.submit(_parse, papers[i], self.sources[k], document)
+                            in_flight[future] = (i, k)
+                            attempts[i, k].parse = future
+                    if self.hedge_delay is not None:
+                        hedge()
+                    if not in_flight:
+                        continue
+                    done, _ = wait(in_flight, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i, k = in_flight.pop(future)
+                        try:
+                            text, report = future.result()
+                            logger.debug(f"Parsed {self.sources[k]} of {papers[i].title}: {report}")
+                        except SandboxKilled as exc:
+                            text, report = None, exc.report
+                            if report.killed != "cancelled":
+                                logger.warning(f"Parsing {self.sources[k]} of {papers[i].title} was {report}")
+                        except CancelledError:
+                            text, report = None, None
+                        except Exception as exc:
+                            text, report = None, None
+                            logger.warning(f"Failed to parse {self.sources[k]} of {papers[i].title} after worker failure: {type(exc).__name__}: {exc}")
+                        if report is not None:
+                            self.stats.parse_time += report.wall_time
+                            self.stats.reports.setdefault(i, []).append(report)
+                        if text is not None and keys[i]:
+                            self.write_cache(keys[i], f"{self.sources[k]}.text", text)
+                        end_attempt(i, k, text)
+            except BaseException:
+                # Releases the download threads blocked on the full queue, so that leaving the pools does not hang.
+                stop.set()
+                downloads.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        self.stats.wall_time = perf_counter() - start
+        logger.info(f"Full text pipeline: {self.stats}")
+        return results
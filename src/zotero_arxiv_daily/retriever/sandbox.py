@@ -0,0 +1,306 @@
+"""Child processes that run untrusted document parsing under hard limits.
+
+Each task runs in a dedicated child process with a wall-clock timeout, a memory ceiling and a CPU-time
+limit. A task that runs past its timeout is killed with its process, instead of being abandoned in a thread
+that keeps running, and a task that is no longer needed can be cancelled the same way. A worker is also
+replaced after ``max_tasks`` tasks, to contain leaks in the parsers.
+Every task gets a ``SandboxReport`` of its resource use and of the reason it was killed, if it was.
+"""
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from time import perf_counter
+from typing import Any, Callable
+from loguru import logger
+from ..utils import peak_memory_mb
+
+try:
+    import resource
+except ImportError: # Not available on Windows, where the limits are not enforced.
+    resource = None
+
+DEFAULT_TIMEOUT = 180
+DEFAULT_MEMORY_LIMIT_MB = 2048
+DEFAULT_CPU_LIMIT = 120
+DEFAULT_MAX_TASKS = 20
+
+
+@dataclass
+class SandboxReport:
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    # Peak of the task on Linux, where it can be reset between tasks. Elsewhere, peak of the worker so far.
+    peak_memory_mb: float = 0.0
+    killed: str | None = None
+
+    def __str__(self) -> str:
+        report = f"{self.wall_time:.1f}s wall, {self.cpu_time:.1f}s CPU, {self.peak_memory_mb:.0f} MB peak"
+        return f"killed ({self.killed}) after {report}" if self.killed else report
+
+
+class SandboxKilled(Exception):
+    def __init__(self, report:SandboxReport):
+        super().__init__(f"Sandbox {report}")
+        self.report = report
+
+
+def _cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _reset_peak_memory() -> bool:
+    """Reset the peak resident set size of this process, where Linux allows it. False if it stays lifetime-wide."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_memory_mb() -> float:
+    """Peak resident set size since the last reset, or, without one, over the lifetime of the worker."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return peak_memory_mb() or 0.0
+
+
+def _address_space() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _sandbox_main(conn:Connection, initializer:Callable | None, initargs:tuple, memory_limit_mb:int, cpu_limit:float):
+    if initializer is not None:
+        initializer(*initargs)
+    if resource is not None:
+        # The ceiling applies to memory allocated from here on, on top of what the interpreter already maps.
+        try:
+            limit = _address_space() + memory_limit_mb * 2**20
+            resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+        except (OSError, ValueError) as exc:
+            logger.debug(f"Memory limit not enforced in sandbox: {exc}")
+    conn.send(None)
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        cpu_start = _cpu_time() if resource is not None else 0.0
+        # So that the peak of one task is not carried over to the next ones of the worker.
+        _reset_peak_memory()
+        if resource is not None:
+            # RLIMIT_CPU counts the whole process lifetime, so the limit is moved forward for every task.
+            soft = int(cpu_start + cpu_limit) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+        try:
+            result, error = fn(*args), None
+        except MemoryError:
+            result, error = None, "memory limit"
+        except Exception as exc:
+            result, error = None, f"{type(exc).__name__}: {exc}"
+        usage = (_cpu_time() - cpu_start, _peak_memory_mb()) if resource is not None else (0.0, 0.0)
+        conn.send((result, error, usage))
+
+
+class SandboxWorker:
+    """One child process that runs tasks sent to it, one at a time, and is restarted when needed."""
+    def __init__(self, initializer:Callable | None = None, initargs:tuple = (), timeout:float = DEFAULT_TIMEOUT,
+                 memory_limit_mb:int = DEFAULT_MEMORY_LIMIT_MB, cpu_limit:float = DEFAULT_CPU_LIMIT, max_tasks:int = DEFAULT_MAX_TASKS):
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit = cpu_limit
+        self.max_tasks = max_tasks
+        self.process = None
+        self.conn = None
+        self.tasks = 0
+        self.cancelled = False
+
+    def start(self):
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_sandbox_main, daemon=True,
+            args=(child_conn, self.initializer, self.initargs, self.memory_limit_mb, self.cpu_limit),
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        # Wait until the child is initialized, so that its start-up does not count against the first task.
+        try:
+            if self.conn.poll(self.timeout):
+                self.conn.recv()
+        except (EOFError, OSError):
+            pass # The child died, which the task sent to it will report.
+
+    def prepare(self):
+        """Start the child process, or replace it when it is used up or dead."""
+        if self.process is None or self.tasks >= self.max_tasks or not self.process.is_alive():
+            self.stop()
+            self.start()
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.process = None
+
+    def cancel(self):
+        """Kill the child from another thread, so that the task it runs ends as cancelled."""
+        self.cancelled = True
+        process = self.process
+        if process is not None:
+            process.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+
+    def run(self, fn:Callable, *args:Any) -> tuple[Any, SandboxReport]:
+        """Run ``fn(*args)`` in the child process. Raises SandboxKilled if the child had to be killed or died."""
+        self.prepare()
+        self.tasks += 1
+        start = perf_counter()
+        report = SandboxReport()
+        if self.cancelled:
+            # The child may have been killed while starting, and may not be reaped yet, so the next task
+            # would find it alive. It is replaced now.
+            self.stop()
+            report.killed = "cancelled"
+            raise SandboxKilled(report)
+        try:
+            self.conn.send((fn, args))
+            ready = self.conn.poll(self.timeout)
+        except (BrokenPipeError, EOFError, OSError):
+            ready = True
+        if not ready:
+            self.kill()
+            report.wall_time = perf_counter() - start
+            report.killed = "timeout"
+            raise SandboxKilled(report)
+        try:
+            result, error, (report.cpu_time, report.peak_memory_mb) = self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join()
+            exitcode = self.process.exitcode
+            self.conn.close()
+            self.process = None
+            report.wall_time = perf_counter() - start
+            report.killed = "cancelled" if self.cancelled else describe_exit(exitcode)
+            raise SandboxKilled(report)
+        report.wall_time = perf_counter() - start
+        if error is not None:
+            if error == "memory limit":
+                report.killed = error
+                # The heap of a process that ran out of memory is best not reused.
+                self.stop()
+                raise SandboxKilled(report)
+            raise RuntimeError(error)
+        return result, report
+
+
+def describe_exit(exitcode:int | None) -> str:
+    if exitcode is not None and exitcode < 0:
+        sig = signal.Signals(-exitcode)
+        if hasattr(signal, "SIGXCPU") and sig == signal.SIGXCPU:
+            return "cpu limit"
+        return sig.name
+    return f"exit code {exitcode}"
+
+
+@dataclass
+class _Task:
+    worker: SandboxWorker | None = None
+    started: float | None = None
+    cancelled: bool = False
+
+
+class SandboxPool:
+    """A fixed number of sandbox workers behind a futures interface, like a ProcessPoolExecutor.
+
+    The futures resolve to ``(result, SandboxReport)`` or raise ``SandboxKilled``. Unlike the futures of a
+    ProcessPoolExecutor, running tasks can be cancelled, by killing their worker.
+    """
+    def __init__(self, num_workers:int, **worker_kwargs):
+        self.workers = queue.Queue()
+        for _ in range(num_workers):
+            self.workers.put(SandboxWorker(**worker_kwargs))
+        self.num_workers = num_workers
+        self.executor = ThreadPoolExecutor(num_workers)
+        self.tasks: dict[Future, _Task] = {}
+        self.lock = threading.Lock()
+
+    def _run(self, fn:Callable, args:tuple, task:_Task) -> tuple[Any, SandboxReport]:
+        worker = self.workers.get()
+        with self.lock:
+            worker.cancelled = task.cancelled
+            task.worker = worker
+        try:
+            worker.prepare()
+            task.started = perf_counter()
+            return worker.run(fn, *args)
+        finally:
+            with self.lock:
+                task.worker = None
+            self.workers.put(worker)
+
+    def submit(self, fn:Callable, *args:Any) -> Future:
+        task = _Task()
+        with self.lock:
+            future = self.executor.submit(self._run, fn, args, task)
+            self.tasks[future] = task
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future:Future):
+        with self.lock:
+            self.tasks.pop(future, None)
+
+    def started(self, future:Future) -> float | None:
+        """When the task was handed to a ready worker, or None if it is still waiting or has ended."""
+        with self.lock:
+            task = self.tasks.get(future)
+            return task.started if task is not None else None
+
+    def cancel(self, future:Future) -> bool:
+        """Cancel a task. A running task is killed, and its future raises SandboxKilled. False if it already ended."""
+        if future.cancel():
+            return True
+        with self.lock:
+            task = self.tasks.get(future)
+            if task is None:
+                return False
+            task.cancelled = True
+            if task.worker is not None:
+                task.worker.cancel()
+        return True
+
+    def shutdown(self):
+        self.executor.shutdown()
+        while not self.workers.empty():
+            self.workers.get().stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
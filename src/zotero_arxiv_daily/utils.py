@@ -1,97 +1,240 @@
+import io
 import tarfile
+import os
 import re
 import glob
+import sys
 import smtplib
 from email.header import Header
 from email.mime.text import MIMEText
 from email.utils import parseaddr, formataddr
 from loguru import logger
 import datetime
+from typing import Iterable
 from omegaconf import DictConfig
+from .protocol import get_prompt_tokenizer
 import pymupdf
 import pymupdf.layout
 pymupdf.TOOLS.mupdf_display_errors(False)
 pymupdf.layout.activate()
 
 import pymupdf4llm  # noqa: E402
+from pymupdf4llm.helpers.document_layout import PageLayout, parse_document, update_header_tags  # noqa: E402
 
-def extract_tex_code_from_tar(file_path:str, paper_id:str) -> dict[str,str]:
+TEX_COMMENT_RE = re.compile(
+    r'(?<!\\)%[^\n]*|\\begin\{comment\}.*?\\end\{comment\}|\\iffalse(?![a-zA-Z]).*?\\fi(?![a-zA-Z])', re.DOTALL
+)
+TEX_NEWLINES_RE = re.compile(r'\n+')
+TEX_LINE_BREAK_RE = re.compile(r'\\\\')
+TEX_SPACES_RE = re.compile(r'[ \t\r\f]{3,}')
+TEX_INCLUDE_RE = re.compile(r'\\(input|include|subfile)\{(.+?)\}')
+TEX_BEGIN_DOCUMENT_RE = re.compile(r'\\begin\{document\}')
+TEX_DOCUMENT_BODY_RE = re.compile(r'\\begin\{document\}(.*?)(?:\\end\{document\}|$)', re.DOTALL)
+
+
+def clean_tex(content:str) -> str:
+    """Strip comments, in a single pass, and redundant whitespace from LaTeX source."""
+    content = TEX_COMMENT_RE.sub('', content)
+    content = TEX_NEWLINES_RE.sub('\n', content)
+    content = TEX_LINE_BREAK_RE.sub('', content)
+    return TEX_SPACES_RE.sub(' ', content)
+
+
+def read_tex_members(file_path:str | bytes) -> dict[str, bytes] | None:
+    """Read the .tex and .bbl members of a source tarball in one sequential pass, skipping all other members.
+
+    ``file_path`` is the path of the tarball, or its content.
+    """
+    members = {}
+    source = dict(fileobj=io.BytesIO(file_path)) if isinstance(file_path, bytes) else dict(name=file_path)
     try:
-        tar = tarfile.open(file_path)
+        with tarfile.open(mode='r|*', **source) as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(('.tex', '.bbl')):
+                    members[os.path.normpath(member.name)] = tar.extractfile(member).read()
     except tarfile.ReadError:
+        return None
+    return members
+
+
+class TexFlattener:
+    """Inline the files included by a LaTeX document, transitively.
+
+    ``\\input``, ``\\include`` and ``\\subfile`` are resolved relative to the directory of the main file.
+    Files are decoded and cleaned only when they are first needed, and an inclusion cycle is cut where it
+    closes. Missing files are replaced by nothing.
+    """
+    def __init__(self, members:dict[str, bytes], paper_id:str):
+        self.members = members
+        self.paper_id = paper_id
+        self.contents: dict[str, str] = {}
+
+    def load(self, name:str) -> str:
+        if name not in self.contents:
+            self.contents[name] = clean_tex(self.members[name].decode('utf-8', errors='ignore'))
+        return self.contents[name]
+
+    def resolve(self, target:str, base_dir:str) -> str | None:
+        path = os.path.normpath(os.path.join(base_dir, target.strip()))
+        for candidate in (path, f"{path}.tex"):
+            if candidate in self.members:
+                return candidate
+        return None
+
+    def flatten(self, name:str, stack:tuple[str, ...] = ()) -> str:
+        base_dir = os.path.dirname(stack[0] if stack else name)
+        stack = stack + (name,)
+        def include(match:re.Match) -> str:
+            command, target = match.groups()
+            path = self.resolve(target, base_dir)
+            if path is None:
+                logger.debug(f"Included file {target} of {self.paper_id} not found")
+                return ''
+            if path in stack:
+                logger.debug(f"Skipping cyclic inclusion of {path} in {self.paper_id}")
+                return ''
+            included = self.flatten(path, stack)
+            if command == 'subfile':
+                body = TEX_DOCUMENT_BODY_RE.search(included)
+                included = body.group(1) if body else included
+            return included
+        return TEX_INCLUDE_RE.sub(include, self.load(name))
+
+    def find_main(self) -> str | None:
+        tex_files = [f for f in self.members if f.endswith('.tex')]
+        bbl_files = [f for f in self.members if f.endswith('.bbl')]
+        match len(bbl_files):
+            case 0 if len(tex_files) == 1:
+                return tex_files[0]
+            case 0:
+                logger.debug(f"Cannot find main tex file of {self.paper_id} from bbl: There are multiple tex files while no bbl file.")
+            case 1:
+                main_tex = bbl_files[0].removesuffix('.bbl') + '.tex'
+                if main_tex in self.members:
+                    return main_tex
+                logger.debug(f"Cannot find main tex file of {self.paper_id} from bbl: The bbl file does not match any tex file.")
+            case _:
+                logger.debug(f"Cannot find main tex file of {self.paper_id} from bbl: There are multiple bbl files.")
+        logger.debug(f"Trying to choose tex file containing the document block as main tex file of {self.paper_id}")
+        for t in tex_files:
+            if b'\\begin{document}' not in self.members[t] or any(w in t for w in ['example', 'sample']):
+                continue
+            # Checked again without comments, so that a commented-out document block does not count.
+            if TEX_BEGIN_DOCUMENT_RE.search(self.load(t)):
+                logger.debug(f"Choose {t} as main tex file of {self.paper_id}")
+                return t
+        return None
+
+
+def extract_tex_code_from_tar(file_path:str | bytes, paper_id:str) -> dict[str,str] | None:
+    """The cleaned source of the main tex file with its inclusions inlined under ``"all"``, and of each file it loaded.
+
+    ``file_path`` is the path of the tarball, or its content. Returns None if the file is not a tarball with
+    tex files, and ``"all"`` is None if no main file is found.
+    """
+    members = read_tex_members(file_path)
+    if members is None:
         logger.debug(f"Failed to find main tex file of {paper_id}: Not a tar file.")
         return None
- 
-    tex_files = [f for f in tar.getnames() if f.endswith('.tex')]
-    if len(tex_files) == 0:
+    if not any(f.endswith('.tex') for f in members):
         logger.debug(f"Failed to find main tex file of {paper_id}: No tex file.")
-        tar.close()
         return None
-    
-    bbl_file = [f for f in tar.getnames() if f.endswith('.bbl')]
-    match len(bbl_file) :
-        case 0:
-            if len(tex_files) > 1:
-                logger.debug(f"Cannot find main tex file of {paper_id} from bbl: There are multiple tex files while no bbl file.")
-                main_tex = None
-            else:
-                main_tex = tex_files[0]
-        case 1:
-            main_name = bbl_file[0].replace('.bbl','')
-            main_tex = f"{main_name}.tex"
-            if main_tex not in tex_files:
-                logger.debug(f"Cannot find main tex file of {paper_id} from bbl: The bbl file does not match any tex file.")
-                main_tex = None
-        case _:
-            logger.debug(f"Cannot find main tex file of {paper_id} from bbl: There are multiple bbl files.")
-            main_tex = None
-
+    flattener = TexFlattener(members, paper_id)
+    main_tex = flattener.find_main()
     if main_tex is None:
-        logger.debug(f"Trying to choose tex file containing the document block as main tex file of {paper_id}")
-    #read all tex files
-    file_contents = {}
-    for t in tex_files:
-        f = tar.extractfile(t)
-        content = f.read().decode('utf-8',errors='ignore')
-        #remove comments
-        content = re.sub(r'%.*\n', '\n', content)
-        content = re.sub(r'\\begin{comment}.*?\\end{comment}', '', content, flags=re.DOTALL)
-        content = re.sub(r'\\iffalse.*?\\fi', '', content, flags=re.DOTALL)
-        #remove redundant \n
-        content = re.sub(r'\n+', '\n', content)
-        content = re.sub(r'\\\\', '', content)
-        #remove consecutive spaces
-        content = re.sub(r'[ \t\r\f]{3,}', ' ', content)
-        if main_tex is None and re.search(r'\\begin\{document\}', content) and not any(w in t for w in ['example', 'sample']):
-            main_tex = t
-            logger.debug(f"Choose {t} as main tex file of {paper_id}")
-        file_contents[t] = content
-    
-    if main_tex is not None:
-        main_source:str = file_contents[main_tex]
-        #find and replace all included sub-files
-        include_files = re.findall(r'\\input\{(.+?)\}', main_source) + re.findall(r'\\include\{(.+?)\}', main_source)
-        for f in include_files:
-            if not f.endswith('.tex'):
-                file_name = f + '.tex'
-            else:
-                file_name = f
-            main_source = main_source.replace(f'\\input{{{f}}}', file_contents.get(file_name, ''))
-        file_contents["all"] = main_source
-    else:
         logger.debug(f"Failed to find main tex file of {paper_id}: No tex file containing the document block.")
-        file_contents["all"] = None
-        
-    tar.close()
-    return file_contents
+        return {**flattener.contents, "all": None}
+    flattened = flattener.flatten(main_tex)
+    return {**flattener.contents, "all": flattened}
+
+PDF_MARKDOWN_KWARGS = dict(use_ocr=False,header=False,footer=False,ignore_code=True)
+# The same conversion in its two steps, as pymupdf4llm.to_markdown runs them with PDF_MARKDOWN_KWARGS.
+PDF_PARSE_KWARGS = dict(use_ocr=False,force_text=True)
+PDF_RENDER_KWARGS = dict(header=False,footer=False,ignore_code=True)
+# Extra tokens converted past max_tokens, so that tokens merging across the cut cannot change the first max_tokens.
+PDF_TOKEN_MARGIN = 64
+
+def pdf_heading_sizes(layouts:list[PageLayout]) -> set[int]:
+    """Font sizes of the headings found by the layout analysis, which pymupdf4llm ranks into heading levels."""
+    return {box.max_fontsize for page in layouts for box in page.boxes if box.boxclass in ("title", "section-header")}
+
+def pdf_font_sizes(page:pymupdf.Page) -> set[int]:
+    """Font sizes of all the text of a page, rounded as for headings. A cheap scan, without layout analysis."""
+    return {round(span["size"]) for block in page.get_text("dict")["blocks"] for line in block.get("lines", ()) for span in line["spans"]}
+
+def extract_markdown_from_pdf(file_path:str | bytes, max_tokens:int | None = None, max_pages:int | None = None) -> str:
+    """Convert a PDF to markdown, one page at a time.
+
+    Conversion stops after ``max_pages`` pages, or as soon as the text holds ``max_tokens`` tokens, so that
+    long appendices are not converted only to be cut from the prompt. Up to ``max_tokens``, the text is
+    identical to the conversion of the whole document. ``file_path`` is the path of the PDF, or its content.
 
-def extract_markdown_from_pdf(file_path:str) -> str:
-    return pymupdf4llm.to_markdown(file_path,use_ocr=False,header=False,footer=False,ignore_code=True)
+    Heading levels rank the font sizes of all the headings of the document. They are ranked over the converted
+    pages, which gives the same levels as long as the other pages hold no text in a new size larger than the
+    smallest heading. Otherwise, those pages are converted too.
+    """
+    source = dict(stream=file_path, filetype="pdf") if isinstance(file_path, bytes) else dict(filename=file_path)
+    with pymupdf.open(**source) as doc:
+        pages = range(min(len(doc), max_pages) if max_pages else len(doc))
+        if max_tokens is None or len(pages) == 0:
+            return pymupdf4llm.to_markdown(doc,pages=list(pages),**PDF_MARKDOWN_KWARGS)
+        enc = get_prompt_tokenizer()
+        layouts, num_tokens = [], 0
+        for i in pages:
+            parsed = parse_document(doc,pages=[i],**PDF_PARSE_KWARGS)
+            layouts.extend(parsed.pages)
+            num_tokens += len(enc.encode(parsed.to_markdown(**PDF_RENDER_KWARGS), disallowed_special=()))
+            if num_tokens >= max_tokens + PDF_TOKEN_MARGIN:
+                break
+        rest = pages[len(layouts):]
+        heading_sizes = pdf_heading_sizes(layouts)
+        if heading_sizes and any(size > min(heading_sizes) and size not in heading_sizes for i in rest for size in pdf_font_sizes(doc[i])):
+            logger.debug(f"Converting all of {doc.name or 'pdf stream'}, whose later pages may change its heading levels")
+            for i in rest:
+                layouts.extend(parse_document(doc,pages=[i],**PDF_PARSE_KWARGS).pages)
+            heading_sizes = pdf_heading_sizes(layouts)
+        elif rest:
+            logger.debug(f"Stopped converting {doc.name or 'pdf stream'} after {len(layouts)} of {len(doc)} pages")
+        parsed.pages = layouts
+        if heading_sizes:
+            update_header_tags(layouts, heading_sizes)
+        return parsed.to_markdown(**PDF_RENDER_KWARGS)
+
+def peak_memory_mb() -> float | None:
+    """Peak resident set size of this process so far, or None where the platform does not report it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
 
 def glob_match(path:str, pattern:str) -> bool:
     re_pattern = glob.translate(pattern,recursive=True)
     return re.match(re_pattern, path) is not None
 
+class PathMatcher:
+    """Match paths against a list of glob patterns compiled once into a single regex."""
+    def __init__(self, patterns:list[str]):
+        self.patterns = list(patterns)
+        self._compiled = [re.compile(glob.translate(p, recursive=True)) for p in self.patterns]
+        self._regex = re.compile('|'.join(f'(?:{r.pattern})' for r in self._compiled))
+
+    def match(self, path:str) -> bool:
+        return self._regex.match(path) is not None
+
+    def select(self, paths:Iterable[str]) -> set[str]:
+        return {p for p in set(paths) if self.match(p)}
+
+    def stats(self, paths:Iterable[str]) -> dict[str, int]:
+        """Number of distinct paths matched by each pattern."""
+        paths = set(paths)
+        return {
+            pattern: sum(1 for p in paths if regex.match(p))
+            for pattern, regex in zip(self.patterns, self._compiled)
+        }
+
 def send_email(config:DictConfig, html:str):
     sender = config.email.sender
     receiver = config.email.receiver
@@ -1,6 +1,11 @@
+from time import sleep
+
 import pytest
 import hydra
 
+from zotero_arxiv_daily.executor import Executor
+from zotero_arxiv_daily.protocol import Paper
+
 @pytest.fixture(scope="package")
 def config():
     with hydra.initialize(config_path='../config',version_base=None):
@@ -17,3 +22,50 @@ def config():
     config.reranker.api.model = "text-embedding-3-large"
     return config
 
+
+
+class WordTokenizer:
+    """Whitespace tokenizer, so that token budgets can be tested without downloading tiktoken encodings."""
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class FakeRetriever:
+    """Yields ``count`` papers after ``delay`` seconds, then raises ``error`` if given."""
+    def __init__(self, name, count=3, delay=0.0, error=None, released=None):
+        self.name = name
+        self.count = count
+        self.delay = delay
+        self.error = error
+        self.released = released
+        self.retrievals = 0
+        self.enriched = []
+
+    def iter_papers(self):
+        self.retrievals += 1
+        if self.released is not None:
+            self.released.wait(10)
+        sleep(self.delay)
+        for i in range(self.count):
+            yield Paper(source=self.name, title=f"{self.name} {i}", authors=["A"], abstract=f"{self.name} abstract {i}", url=f"{self.name}/{i}")
+        if self.error:
+            raise self.error
+
+    def enrich_papers(self, papers):
+        self.enriched.extend(p.title for p in papers)
+
+
+def make_executor(*retrievers, config=None):
+    """An executor over the given retrievers, without the clients a real one connects."""
+    executor = Executor.__new__(Executor)
+    executor.config = config
+    executor.include_path_patterns = None
+    executor.corpus_source = None
+    executor.retrievers = {r.name: r for r in retrievers}
+    executor.reranker = None
+    executor.openai_client = None
+    executor.failed_sources = []
+    return executor
@@ -0,0 +1,97 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from omegaconf import open_dict
+
+from zotero_arxiv_daily.corpus import get_corpus_source_cls
+from zotero_arxiv_daily.corpus.sqlite import SqliteCorpusSource
+
+# The subset of the Zotero desktop schema read by SqliteCorpusSource.
+SCHEMA = """
+CREATE TABLE libraries (libraryID INTEGER PRIMARY KEY, type TEXT NOT NULL);
+CREATE TABLE itemTypes (itemTypeID INTEGER PRIMARY KEY, typeName TEXT);
+CREATE TABLE fields (fieldID INTEGER PRIMARY KEY, fieldName TEXT);
+CREATE TABLE items (itemID INTEGER PRIMARY KEY, itemTypeID INT NOT NULL, dateAdded TIMESTAMP NOT NULL, libraryID INT NOT NULL, key TEXT NOT NULL);
+CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value UNIQUE);
+CREATE TABLE itemData (itemID INT, fieldID INT, valueID INT, PRIMARY KEY (itemID, fieldID));
+CREATE TABLE collections (collectionID INTEGER PRIMARY KEY, collectionName TEXT NOT NULL, parentCollectionID INT DEFAULT NULL, libraryID INT NOT NULL, key TEXT NOT NULL);
+CREATE TABLE collectionItems (collectionID INT NOT NULL, itemID INT NOT NULL, orderIndex INT NOT NULL DEFAULT 0, PRIMARY KEY (collectionID, itemID));
+CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY, dateDeleted DEFAULT CURRENT_TIMESTAMP NOT NULL);
+CREATE TABLE deletedCollections (collectionID INTEGER PRIMARY KEY, dateDeleted DEFAULT CURRENT_TIMESTAMP NOT NULL);
+"""
+
+
+@pytest.fixture
+def zotero_db(tmp_path):
+    path = tmp_path / "zotero.sqlite"
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO libraries VALUES (?, ?)", [(1, "user"), (2, "group")])
+    conn.executemany("INSERT INTO itemTypes VALUES (?, ?)", [(1, "journalArticle"), (2, "preprint"), (3, "note"), (4, "book")])
+    conn.executemany("INSERT INTO fields VALUES (?, ?)", [(1, "title"), (2, "abstractNote")])
+    conn.executemany("INSERT INTO collections VALUES (?, ?, ?, ?, ?)", [
+        (1, "2026", None, 1, "C1"),
+        (2, "survey", 1, 1, "C2"),
+        (3, "trash", None, 1, "C3"),
+        (4, "group", None, 2, "C4"),
+    ])
+    conn.execute("INSERT INTO deletedCollections (collectionID) VALUES (3)")
+    items = [
+        # itemID, type, dateAdded, library, title, abstract, collections
+        (1, 1, "2026-01-02 03:04:05", 1, "Journal Paper", "Abstract 1", [2]),
+        (2, 2, "2026-01-03 00:00:00", 1, "Preprint", "Abstract 2", [1, 3]),
+        (3, 1, "2026-01-04 00:00:00", 1, "No Abstract", "", []),
+        (4, 4, "2026-01-05 00:00:00", 1, "A Book", "Abstract 4", []),
+        (5, 1, "2026-01-06 00:00:00", 1, "Trashed", "Abstract 5", [1]),
+        (6, 1, "2026-01-07 00:00:00", 2, "Group Paper", "Abstract 6", [4]),
+    ]
+    value_ids = {}
+    for item_id, type_id, date_added, library_id, title, abstract, collections in items:
+        conn.execute("INSERT INTO items VALUES (?, ?, ?, ?, ?)", (item_id, type_id, date_added, library_id, f"K{item_id}"))
+        for field_id, value in ((1, title), (2, abstract)):
+            if value not in value_ids:
+                value_ids[value] = len(value_ids) + 1
+                conn.execute("INSERT INTO itemDataValues VALUES (?, ?)", (value_ids[value], value))
+            conn.execute("INSERT INTO itemData VALUES (?, ?, ?)", (item_id, field_id, value_ids[value]))
+        conn.executemany("INSERT INTO collectionItems (collectionID, itemID) VALUES (?, ?)", [(c, item_id) for c in collections])
+    conn.execute("INSERT INTO deletedItems (itemID) VALUES (5)")
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_sqlite_corpus_source(config, zotero_db):
+    with open_dict(config.zotero):
+        config.zotero.sqlite_path = zotero_db
+    source = get_corpus_source_cls("sqlite")(config)
+    assert isinstance(source, SqliteCorpusSource)
+
+    corpus = sorted(source.fetch_corpus(), key=lambda c: c.title)
+
+    assert [c.title for c in corpus] == ["Journal Paper", "Preprint"]
+    assert corpus[0].abstract == "Abstract 1"
+    assert corpus[0].added_date == datetime(2026, 1, 2, 3, 4, 5)
+    assert corpus[0].paths == ["2026/survey"]
+    assert corpus[1].paths == ["2026"]
+
+
+def test_sqlite_corpus_source_reads_locked_database(config, zotero_db):
+    with open_dict(config.zotero):
+        config.zotero.sqlite_path = zotero_db
+    # Zotero desktop holds an exclusive lock on its database while running.
+    lock = sqlite3.connect(zotero_db)
+    lock.execute("PRAGMA locking_mode = EXCLUSIVE")
+    lock.execute("BEGIN EXCLUSIVE")
+    try:
+        corpus = SqliteCorpusSource(config).fetch_corpus()
+    finally:
+        lock.close()
+    assert len(corpus) == 2
+
+
+def test_sqlite_corpus_source_requires_path(config):
+    with open_dict(config.zotero):
+        config.zotero.sqlite_path = None
+    with pytest.raises(ValueError, match="sqlite_path"):
+        SqliteCorpusSource(config)
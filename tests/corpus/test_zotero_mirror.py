@@ -0,0 +1,106 @@
+from zotero_arxiv_daily.corpus.mirror import ZoteroMirror
+
+
+def _item(key, title, collections=(), item_type="journalArticle", version=1):
+    return {
+        "key": key,
+        "version": version,
+        "data": {
+            "itemType": item_type,
+            "title": title,
+            "abstractNote": f"Abstract of {title}",
+            "dateAdded": "2026-01-01T00:00:00Z",
+            "collections": list(collections),
+        },
+    }
+
+
+def _collection(key, name, parent=False, version=1):
+    return {"key": key, "version": version, "data": {"name": name, "parentCollection": parent}}
+
+
+class FakeZotero:
+    """Minimal in-memory stand-in for the pyzotero client, honouring the `since` parameter."""
+
+    def __init__(self):
+        self.version = 1
+        self.items_store = {}
+        self.collections_store = {}
+        self.deleted_store = {"items": {}, "collections": {}}
+        self.calls = []
+
+    def last_modified_version(self):
+        return self.version
+
+    def everything(self, result):
+        return result
+
+    def items(self, since=0, itemType=None):
+        self.calls.append(("items", since))
+        return [i for i in self.items_store.values() if i["version"] > since]
+
+    def collections(self, since=0):
+        self.calls.append(("collections", since))
+        return [c for c in self.collections_store.values() if c["version"] > since]
+
+    def trash(self, since=0):
+        return []
+
+    def deleted(self, since=0):
+        return {k: [key for key, v in d.items() if v > since] for k, d in self.deleted_store.items()}
+
+
+def test_mirror_full_then_incremental_sync(tmp_path):
+    zot = FakeZotero()
+    zot.collections_store = {"C1": _collection("C1", "root"), "C2": _collection("C2", "child", "C1")}
+    zot.items_store = {
+        "A": _item("A", "Paper A", ["C2"]),
+        "B": _item("B", "Paper B", ["C1"]),
+    }
+    mirror = ZoteroMirror(str(tmp_path / "mirror.sqlite"))
+    mirror.sync(zot, "42")
+    assert zot.calls == [("collections", 0), ("items", 0)]
+    assert {i["key"] for i in mirror.load_items()} == {"A", "B"}
+    assert mirror.library_version == 1
+
+    zot.version = 2
+    zot.calls = []
+    zot.items_store["A"] = _item("A", "Paper A v2", ["C2"], version=2)
+    zot.items_store["N"] = _item("N", "A note", item_type="note", version=2)
+    del zot.items_store["B"]
+    zot.deleted_store["items"]["B"] = 2
+    mirror.sync(zot, "42")
+    assert zot.calls == [("collections", 1), ("items", 1)]
+    items = {i["key"]: i["data"] for i in mirror.load_items()}
+    assert list(items) == ["A"]
+    assert items["A"]["title"] == "Paper A v2"
+    assert items["A"]["collections"] == ["C2"]
+    collections = {c["key"]: c["data"] for c in mirror.load_collections()}
+    assert collections["C2"]["parentCollection"] == "C1"
+    assert collections["C1"]["parentCollection"] is False
+    mirror.close()
+
+
+def test_mirror_skips_sync_when_up_to_date(tmp_path):
+    zot = FakeZotero()
+    zot.items_store = {"A": _item("A", "Paper A")}
+    mirror = ZoteroMirror(str(tmp_path / "mirror.sqlite"))
+    mirror.sync(zot, "42")
+    zot.calls = []
+    mirror.sync(zot, "42")
+    assert zot.calls == []
+    mirror.close()
+
+
+def test_mirror_rebuilds_for_another_library(tmp_path):
+    zot = FakeZotero()
+    zot.items_store = {"A": _item("A", "Paper A")}
+    mirror = ZoteroMirror(str(tmp_path / "mirror.sqlite"))
+    mirror.sync(zot, "42")
+
+    other = FakeZotero()
+    other.items_store = {"X": _item("X", "Paper X")}
+    mirror.sync(other, "43")
+    assert other.calls == [("collections", 0), ("items", 0)]
+    assert [i["key"] for i in mirror.load_items()] == ["X"]
+    mirror.close()
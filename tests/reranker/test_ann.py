@@ -0,0 +1,80 @@
+import warnings
+
+import numpy as np
+
+from zotero_arxiv_daily.reranker.ann import IVFIndex, exact_search, recall_at_k
+from zotero_arxiv_daily.reranker.base import normalize_embeddings
+from zotero_arxiv_daily.reranker.scorer import get_scorer_cls
+
+
+def clustered_embeddings(n, n_topics=20, dim=32, seed=0):
+    topics = np.random.default_rng(42).normal(size=(n_topics, dim))
+    rng = np.random.default_rng(seed)
+    return normalize_embeddings(topics[rng.integers(n_topics, size=n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+def test_ivf_index_recall_and_incremental_update(tmp_path):
+    corpus = clustered_embeddings(2000)
+    queries = clustered_embeddings(50, seed=1)
+    ids = [f"id{i}" for i in range(len(corpus))]
+    path = str(tmp_path / "ivf.npz")
+
+    index = IVFIndex(path)
+    index.update(corpus, ids)
+    _, rows = index.search(queries, corpus, 10)
+    assert recall_at_k(rows, exact_search(queries, corpus, 10)) > 0.9
+
+    # Reloaded from disk, the index keeps its centroids and only assigns the new papers.
+    reloaded = IVFIndex(path)
+    np.testing.assert_array_equal(reloaded.centroids, index.centroids)
+    extra = clustered_embeddings(100, seed=2)
+    corpus = np.concatenate([extra, corpus[100:]])
+    ids = [f"new{i}" for i in range(100)] + ids[100:]
+    reloaded.update(corpus, ids)
+    assert reloaded.trained_size == 2000
+    assert set(reloaded.assignment) == set(ids)
+    _, rows = reloaded.search(queries, corpus, 10)
+    assert recall_at_k(rows, exact_search(queries, corpus, 10)) > 0.9
+
+
+def test_ivf_index_retrains_when_corpus_doubles():
+    index = IVFIndex()
+    index.update(clustered_embeddings(100), [f"id{i}" for i in range(100)])
+    assert len(index.centroids) == 10
+    index.update(clustered_embeddings(400), [f"id{i}" for i in range(400)])
+    assert index.trained_size == 400
+    assert len(index.centroids) == 20
+
+
+def test_topk_scorer_pools_nearest_neighbours(config):
+    corpus = clustered_embeddings(300)
+    candidates = clustered_embeddings(20, seed=1)
+    ids = [f"id{i}" for i in range(len(corpus))]
+    weights = np.full(len(corpus), 1 / len(corpus))
+    exact = np.sort(candidates @ corpus.T, axis=1)[:, ::-1]
+    config.reranker.topk.pooling = "max"
+    try:
+        max_scores = get_scorer_cls("topk")(config, "model").score(candidates, corpus, weights, ids)
+    finally:
+        config.reranker.topk.pooling = "mean"
+    mean_scores = get_scorer_cls("topk")(config, "model").score(candidates, corpus, weights, ids)
+    np.testing.assert_allclose(max_scores, exact[:, 0], rtol=1e-5)
+    np.testing.assert_allclose(mean_scores, exact[:, :10].mean(axis=1), rtol=1e-2)
+
+
+def test_topk_scorer_searches_exactly_when_probed_lists_are_empty(config, monkeypatch):
+    corpus = clustered_embeddings(300)
+    candidates = clustered_embeddings(5, seed=1)
+    ids = [f"id{i}" for i in range(len(corpus))]
+    weights = np.full(len(corpus), 1 / len(corpus))
+    original_update = IVFIndex.update
+    def update_then_empty_lists(self, embeddings, ids):
+        # As if every paper of the probed lists had been removed from the library since training.
+        original_update(self, embeddings, ids)
+        self.members = [np.empty(0, dtype=np.int64) for _ in self.members]
+    monkeypatch.setattr(IVFIndex, "update", update_then_empty_lists)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        scores = get_scorer_cls("topk")(config, "model").score(candidates, corpus, weights, ids)
+    exact = np.sort(candidates @ corpus.T, axis=1)[:, ::-1]
+    np.testing.assert_allclose(scores, exact[:, :10].mean(axis=1), rtol=1e-5)
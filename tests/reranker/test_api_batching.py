@@ -0,0 +1,79 @@
+import threading
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import pytest
+from openai import RateLimitError
+
+from conftest import WordTokenizer
+import zotero_arxiv_daily.reranker.api as api_module
+from zotero_arxiv_daily.reranker.api import ApiReranker
+
+
+class SlowEmbeddings:
+    """Stands in for client.embeddings, taking a fixed time per request."""
+    def __init__(self, delay=0.05, rate_limited=0):
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def create(self, input, model):
+        with self.lock:
+            self.requests.append(list(input))
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                response = httpx.Response(429, request=httpx.Request("POST", "http://test"))
+                raise RateLimitError("rate limited", response=response, body=None)
+        sleep(self.delay)
+        data = [SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)]
+        return SimpleNamespace(data=data)
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    monkeypatch.setattr(ApiReranker, "get_tokenizer", lambda self: WordTokenizer())
+
+
+def make_reranker(config, monkeypatch, embeddings, concurrency):
+    monkeypatch.setitem(config.reranker.api, "concurrency", concurrency)
+    reranker = ApiReranker(config)
+    reranker._client = SimpleNamespace(embeddings=embeddings)
+    return reranker
+
+
+def test_pack_batches_respects_item_and_token_limits(config, monkeypatch):
+    monkeypatch.setitem(config.reranker.api, "batch_size", 3)
+    monkeypatch.setitem(config.reranker.api, "max_batch_tokens", 10)
+    reranker = ApiReranker(config)
+    texts = ["one", "two", "three", "four", "five words are in here", "x " * 50]
+    batches = reranker.pack_batches(texts)
+    enc = reranker.get_tokenizer()
+    assert [t for b in batches[:-1] for t in b] == texts[:-1]
+    assert all(len(b) <= 3 for b in batches)
+    assert all(sum(len(enc.encode(t)) for t in b) <= 10 for b in batches)
+    assert len(enc.encode(batches[-1][0])) == 10
+
+
+def test_concurrent_encoding_keeps_order_and_is_faster(config, monkeypatch):
+    texts = [f"abstract number {i} " + "word " * (i % 7) for i in range(64)]
+    monkeypatch.setitem(config.reranker.api, "batch_size", 4)
+    start = perf_counter()
+    sequential = make_reranker(config, monkeypatch, SlowEmbeddings(), 1).encode(texts)
+    sequential_time = perf_counter() - start
+    start = perf_counter()
+    concurrent = make_reranker(config, monkeypatch, SlowEmbeddings(), 8).encode(texts)
+    concurrent_time = perf_counter() - start
+    np.testing.assert_array_equal(concurrent, sequential)
+    np.testing.assert_array_equal(concurrent[:, 0], [len(t) for t in texts])
+    assert concurrent_time * 3 < sequential_time
+
+
+def test_rate_limited_requests_are_retried(config, monkeypatch):
+    monkeypatch.setattr(api_module, "RETRY_BASE_DELAY", 0.01)
+    embeddings = SlowEmbeddings(delay=0, rate_limited=2)
+    result = make_reranker(config, monkeypatch, embeddings, 1).encode(["a", "bb"])
+    assert len(embeddings.requests) == 3
+    np.testing.assert_array_equal(result[:, 0], [1, 2])
@@ -5,4 +5,16 @@ from zotero_arxiv_daily.reranker.api import ApiReranker
 def test_api_reranker(config):
     reranker = ApiReranker(config)
     score = reranker.get_similarity_score(["hello","world"], ["ping"])
-    assert score.shape == (2,1)
\ No newline at end of file
+    assert score.shape == (2,1)
+
+@pytest.mark.ci
+def test_api_reranker_concurrent_batches(config):
+    config.reranker.api.batch_size = 2
+    config.reranker.api.concurrency = 4
+    try:
+        reranker = ApiReranker(config)
+        embeddings = reranker.encode([f"text {i}" for i in range(9)])
+    finally:
+        config.reranker.api.batch_size = None
+        config.reranker.api.concurrency = None
+    assert embeddings.shape == (9, 3)
@@ -0,0 +1,78 @@
+import numpy as np
+from datetime import datetime
+
+from zotero_arxiv_daily.protocol import Paper, CorpusPaper
+from zotero_arxiv_daily.reranker.base import BaseReranker
+from zotero_arxiv_daily.reranker.embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_embedding_cache_only_embeds_new_texts(tmp_path):
+    encode = CountingEncoder()
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+
+    first = cache.get(["a", "bb", "aaa"], encode)
+    np.testing.assert_array_equal(first, encode(["a", "bb", "aaa"]))
+    assert encode.calls[0] == ["a", "bb", "aaa"]
+
+    encode.calls = []
+    second = EmbeddingCache(str(tmp_path), "model-a").get(["a", "bb", "aaa"], encode)
+    assert encode.calls == []
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(second, first)
+
+    third = EmbeddingCache(str(tmp_path), "model-a").get(["cccc", "aaa", "a"], encode)
+    assert encode.calls == [["cccc"]]
+    np.testing.assert_array_equal(third, CountingEncoder()(["cccc", "aaa", "a"]))
+    # Rows of removed texts are dropped and stale data files are cleaned up.
+    assert third.shape[0] == 3
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+
+def test_embedding_cache_is_keyed_by_model(tmp_path):
+    encode = CountingEncoder()
+    EmbeddingCache(str(tmp_path), "model-a").get(["a"], encode)
+    EmbeddingCache(str(tmp_path), "model-b").get(["a"], encode)
+    assert encode.calls == [["a"], ["a"]]
+
+
+class DummyReranker(BaseReranker):
+    model_id = "dummy"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        rng = [np.random.default_rng(sum(map(ord, t))) for t in texts]
+        return np.array([r.normal(size=8) for r in rng])
+
+
+def test_rerank_reuses_cached_corpus_embeddings(config, tmp_path):
+    corpus = [
+        CorpusPaper(title=f"c{i}", abstract=f"corpus abstract {i}", added_date=datetime(2026, 1, i + 1), paths=[])
+        for i in range(5)
+    ]
+    candidates = [
+        Paper(source="arxiv", title=f"p{i}", authors=[], abstract=f"candidate abstract {i}", url="")
+        for i in range(3)
+    ]
+    config.executor.cache_dir = str(tmp_path)
+    try:
+        reranker = DummyReranker(config)
+        first = [p.score for p in reranker.rerank(candidates, corpus)]
+        reranker.encoded = []
+        second = [p.score for p in reranker.rerank(candidates, corpus)]
+    finally:
+        config.executor.cache_dir = None
+    assert reranker.encoded == [c.abstract for c in candidates]
+    np.testing.assert_allclose(second, first)
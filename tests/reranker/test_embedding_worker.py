@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+import pytest
+
+from zotero_arxiv_daily.reranker.local import LocalReranker
+from zotero_arxiv_daily.reranker.worker import EmbeddingWorker, EmbeddingWorkerClient
+
+
+class FakeEncoder:
+    def encode(self, texts, **kwargs):
+        scale = kwargs.get("scale", 1.0)
+        return np.array([[len(t) * scale, 1.0] for t in texts])
+
+
+@pytest.fixture
+def worker(tmp_path):
+    loaded = []
+    def load_encoder(model):
+        loaded.append(model)
+        return FakeEncoder()
+    server = EmbeddingWorker(str(tmp_path / "worker.sock"), load_encoder)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, loaded
+    server.shutdown()
+    server.server_close()
+
+
+def test_worker_loads_model_once(worker):
+    server, loaded = worker
+    client = EmbeddingWorkerClient(server.socket_path)
+    first = client.encode("model", ["a", "bbb"], {"scale": 2.0})
+    second = client.encode("model", ["cc"])
+    np.testing.assert_array_equal(first, [[2.0, 1.0], [6.0, 1.0]])
+    np.testing.assert_array_equal(second, [[2.0, 1.0]])
+    assert loaded == ["model"]
+
+
+def test_worker_reports_errors(worker):
+    server, _ = worker
+    client = EmbeddingWorkerClient(server.socket_path)
+    with pytest.raises(RuntimeError, match="Embedding worker failed"):
+        client.encode("model", ["a"], {"scale": None})
+
+
+def test_local_reranker_uses_worker_and_falls_back(config, worker, monkeypatch):
+    server, loaded = worker
+    monkeypatch.setattr(LocalReranker, "get_encoder", lambda self: FakeEncoder())
+    config.reranker.local.worker_socket = server.socket_path
+    try:
+        reranker = LocalReranker(config)
+        assert reranker.get_similarity_score(["hello", "world"], ["ping"]).shape == (2, 1)
+        assert loaded == [config.reranker.local.model]
+        config.reranker.local.worker_socket = server.socket_path + ".missing"
+        assert reranker.get_similarity_score(["hello", "world"], ["ping"]).shape == (2, 1)
+    finally:
+        config.reranker.local.worker_socket = None
+
+
+def test_local_reranker_falls_back_when_the_worker_times_out(config, worker, monkeypatch):
+    server, _ = worker
+    stuck = threading.Event()
+    monkeypatch.setattr(server, "encode", lambda *args: stuck.wait(5))
+    monkeypatch.setattr(LocalReranker, "get_encoder", lambda self: FakeEncoder())
+    monkeypatch.setitem(config.reranker.local, "worker_socket", server.socket_path)
+    monkeypatch.setitem(config.reranker.local, "worker_timeout", 0.2)
+    try:
+        embeddings = LocalReranker(config).encode(["a", "bbb"])
+    finally:
+        stuck.set()
+    np.testing.assert_array_equal(embeddings, [[1.0, 1.0], [3.0, 1.0]])
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+from zotero_arxiv_daily.reranker.local import LocalReranker
+from zotero_arxiv_daily.reranker.multiprocess import EncoderPool, length_buckets
+
+
+class LengthEncoder:
+    def encode(self, texts, **kwargs):
+        return np.array([[len(t), kwargs.get("offset", 0), os.getpid()] for t in texts], dtype=np.float32)
+
+
+def load_length_encoder():
+    return LengthEncoder()
+
+
+def test_length_buckets_group_texts_of_similar_length():
+    texts = ["x" * n for n in [5, 1, 9, 3, 7, 2]]
+    buckets = length_buckets(texts, chunk_size=2)
+    assert [[len(texts[i]) for i in b] for b in buckets] == [[1, 2], [3, 5], [7, 9]]
+
+
+def test_encoder_pool_keeps_original_order():
+    texts = [f"{'word ' * (i % 13)}{i}" for i in range(300)]
+    pool = EncoderPool(2, load_length_encoder, {"offset": 7})
+    try:
+        embeddings = pool.encode(texts)
+    finally:
+        pool.close()
+    np.testing.assert_array_equal(embeddings[:, 0], [len(t) for t in texts])
+    assert (embeddings[:, 1] == 7).all()
+    assert os.getpid() not in embeddings[:, 2]
+
+
+def load_failing_encoder():
+    raise OSError("model not found")
+
+
+def test_encoder_pool_fails_fast_when_the_encoder_cannot_load():
+    with pytest.raises(RuntimeError, match="model not found"):
+        EncoderPool(2, load_failing_encoder, {}, load_timeout=60)
+
+
+def test_local_reranker_encodes_in_process_when_workers_fail(config, monkeypatch):
+    monkeypatch.setattr(LocalReranker, "get_encoder_loader", lambda self: load_failing_encoder)
+    monkeypatch.setattr(LocalReranker, "get_encoder", lambda self: LengthEncoder())
+    monkeypatch.setitem(config.reranker.local, "num_workers", 2)
+    monkeypatch.setitem(config.reranker.local, "worker_socket", None)
+    reranker = LocalReranker(config)
+    embeddings = reranker.encode(["a", "bcd"])
+    assert embeddings[:, 0].tolist() == [1, 3]
+    assert (embeddings[:, 2] == os.getpid()).all()
+    assert reranker.get_pool() is None
@@ -0,0 +1,60 @@
+from time import perf_counter
+
+import numpy as np
+import pytest
+import torch
+
+from zotero_arxiv_daily.reranker.backend import (
+    LOCAL_BACKENDS, PARITY_TEXTS, PARITY_TOLERANCE, quantize_torch_encoder, similarity_deviation,
+)
+from zotero_arxiv_daily.reranker.local import load_encoder
+
+
+class BagOfCharsEncoder(torch.nn.Module):
+    """A tiny torch encoder with linear layers, standing in for a SentenceTransformer."""
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.layers = torch.nn.Sequential(torch.nn.Linear(128, 256), torch.nn.ReLU(), torch.nn.Linear(256, 64))
+
+    @torch.no_grad()
+    def encode(self, texts, **kwargs):
+        features = torch.zeros(len(texts), 128)
+        for i, t in enumerate(texts):
+            for ch in t:
+                features[i, ord(ch) % 128] += 1
+        return self.layers(features).numpy()
+
+
+def test_similarity_deviation_of_identical_encoders_is_zero():
+    encoder = BagOfCharsEncoder()
+    assert similarity_deviation(encoder, encoder, {}) == 0
+
+
+def test_torch_int8_quantization_stays_within_tolerance():
+    encoder = BagOfCharsEncoder()
+    quantized = quantize_torch_encoder(encoder)
+    assert isinstance(quantized.layers[0], torch.ao.nn.quantized.dynamic.Linear)
+    assert 0 < similarity_deviation(encoder, quantized, {}) < PARITY_TOLERANCE
+
+
+def test_load_encoder_rejects_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown local reranker backend"):
+        load_encoder("model", backend="tensorrt")
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("backend", LOCAL_BACKENDS)
+def test_local_backend_throughput(config, backend, tmp_path):
+    model = config.reranker.local.model
+    encode_kwargs = dict(config.reranker.local.encode_kwargs or {})
+    reference = load_encoder(model)
+    encoder = load_encoder(model, backend=backend, cache_dir=str(tmp_path), encode_kwargs=encode_kwargs)
+    texts = PARITY_TEXTS * 32
+    encoder.encode(texts[:8], **encode_kwargs)
+    start = perf_counter()
+    embeddings = encoder.encode(texts, **encode_kwargs)
+    elapsed = perf_counter() - start
+    print(f"{backend}: {len(texts) / elapsed:.1f} texts/s")
+    assert np.asarray(embeddings).shape[0] == len(texts)
+    assert similarity_deviation(reference, encoder, encode_kwargs) <= PARITY_TOLERANCE
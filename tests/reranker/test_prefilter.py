@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from zotero_arxiv_daily.reranker.local import LocalReranker
+from zotero_arxiv_daily.reranker.prefilter import LexicalPrefilter, prefilter_recall
+
+FIXTURE = json.loads((Path(__file__).parent / "prefilter_fixture.json").read_text())
+
+
+@pytest.fixture
+def fixture_set():
+    corpus, candidates = FIXTURE["corpus"], FIXTURE["candidates"]
+    weights = 1 / (1 + np.log10(np.arange(len(corpus)) + 1))
+    return candidates, corpus, weights / weights.sum()
+
+
+def test_lexical_prefilter_ranks_related_candidates_first(config, fixture_set, monkeypatch):
+    candidates, corpus, weights = fixture_set
+    monkeypatch.setitem(config.reranker.prefilter, "top_n", 10)
+    prefilter = LexicalPrefilter(config)
+    scores = prefilter.score(candidates, corpus, weights)
+    kept = prefilter.select(scores)
+    # The first ten candidates of the fixture are about the same topics as the corpus.
+    assert len(set(kept.tolist()) & set(range(10))) >= 8
+    assert kept.tolist() == sorted(kept.tolist())
+
+
+def test_lexical_prefilter_score_floor(config, fixture_set, monkeypatch):
+    candidates, corpus, weights = fixture_set
+    assert not LexicalPrefilter(config).enabled
+    monkeypatch.setitem(config.reranker.prefilter, "min_score", 0.05)
+    prefilter = LexicalPrefilter(config)
+    scores = prefilter.score(candidates, corpus, weights)
+    kept = prefilter.select(scores)
+    assert kept.tolist() == np.flatnonzero(scores >= 0.05).tolist()
+
+
+def test_lexical_prefilter_keeps_all_candidates_without_corpus_vocabulary(config, fixture_set, monkeypatch):
+    candidates, _, _ = fixture_set
+    monkeypatch.setitem(config.reranker.prefilter, "min_score", 0.05)
+    prefilter = LexicalPrefilter(config)
+    assert prefilter.score(candidates, ["", "the and of"], np.array([0.5, 0.5])) is None
+
+
+def test_lexical_prefilter_caches_the_corpus_matrix(config, fixture_set, tmp_path, monkeypatch):
+    candidates, corpus, weights = fixture_set
+    monkeypatch.setitem(config.executor, "cache_dir", str(tmp_path))
+    first = LexicalPrefilter(config).score(candidates, corpus, weights)
+    assert (tmp_path / "prefilter" / "corpus.npz").exists()
+    cached = LexicalPrefilter(config).score(candidates, corpus, weights)
+    changed = LexicalPrefilter(config).score(candidates, corpus[:4], weights[:4] / weights[:4].sum())
+    np.testing.assert_array_equal(cached, first)
+    assert not np.allclose(changed, first)
+
+
+def test_prefilter_recall():
+    dense = np.array([0.9, 0.1, 0.8, 0.2, 0.7])
+    assert prefilter_recall(np.array([0, 2, 4]), dense, 3) == 1.0
+    assert prefilter_recall(np.array([0, 1]), dense, 2) == 0.5
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("top_n", [5, 10, 15])
+def test_prefilter_recall_against_dense_ranking(config, fixture_set, top_n, monkeypatch):
+    candidates, corpus, weights = fixture_set
+    reranker = LocalReranker(config)
+    dense = (reranker.get_similarity_score(candidates, corpus) * weights).sum(axis=1)
+    monkeypatch.setitem(config.reranker.prefilter, "top_n", top_n)
+    prefilter = LexicalPrefilter(config)
+    kept = prefilter.select(prefilter.score(candidates, corpus, weights))
+    recall = prefilter_recall(kept, dense, 5)
+    print(f"top_n={top_n}: recall@5 of dense-only ranking {recall:.2f}")
+    assert recall >= 0.6
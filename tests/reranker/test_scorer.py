@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from zotero_arxiv_daily.reranker.base import normalize_embeddings
+from zotero_arxiv_daily.reranker.scorer import get_scorer_cls
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    candidates = normalize_embeddings(rng.normal(size=(50, 32)))
+    corpus = normalize_embeddings(rng.normal(size=(300, 32)))
+    weights = 1 / (1 + np.log10(np.arange(len(corpus)) + 1))
+    weights = weights / weights.sum()
+    corpus_ids = [f"id{i}" for i in range(len(corpus))]
+    return candidates, corpus, weights, corpus_ids
+
+
+def test_profile_scorer_matches_dense_scorer(config, embeddings):
+    dense = get_scorer_cls("dense")(config, "model").score(*embeddings)
+    profile = get_scorer_cls("profile")(config, "model").score(*embeddings)
+    assert profile.shape == dense.shape == (50,)
+    np.testing.assert_allclose(profile, dense, rtol=1e-5, atol=1e-7)
+    assert np.argsort(-profile).tolist() == np.argsort(-dense).tolist()
+
+
+def test_profile_scorer_reuses_cached_profile(config, embeddings, tmp_path, monkeypatch):
+    candidates, corpus, weights, corpus_ids = embeddings
+    monkeypatch.setitem(config.executor, "cache_dir", str(tmp_path))
+    scorer = get_scorer_cls("profile")(config, "model")
+    first = scorer.score(candidates, corpus, weights, corpus_ids)
+    # A cached profile is used as long as the corpus ids match, without reading the embeddings.
+    cached = scorer.score(candidates, np.zeros_like(corpus), weights, corpus_ids)
+    changed = scorer.score(candidates, corpus[1:], weights[1:] / weights[1:].sum(), corpus_ids[1:])
+    np.testing.assert_array_equal(cached, first)
+    assert not np.allclose(changed, first)
+
+
+def test_dense_scorer_streams_corpus_in_blocks(config, embeddings, monkeypatch):
+    candidates, corpus, weights, corpus_ids = embeddings
+    full = (candidates @ corpus.T * weights).sum(axis=1)
+    monkeypatch.setitem(config.reranker, "memory_cap_mb", 0.01)
+    scorer = get_scorer_cls("dense")(config, "model")
+    assert scorer.block_rows(len(candidates), corpus.shape[1]) < len(corpus)
+    blocked = scorer.score(candidates, corpus, weights, corpus_ids)
+    np.testing.assert_allclose(blocked, full, rtol=1e-5, atol=1e-7)
+
+
+def test_cluster_scorer_matches_interests_and_caches_them(config, tmp_path, monkeypatch):
+    topics = normalize_embeddings(np.random.default_rng(42).normal(size=(4, 32)))
+    rng = np.random.default_rng(0)
+    labels = rng.integers(4, size=400)
+    corpus = normalize_embeddings(topics[labels] + 0.1 * rng.normal(size=(400, 32)))
+    weights = np.full(len(corpus), 1 / len(corpus))
+    corpus_ids = [f"id{i}" for i in range(len(corpus))]
+    candidates = normalize_embeddings(topics + 0.1 * rng.normal(size=(4, 32)))
+
+    monkeypatch.setitem(config.executor, "cache_dir", str(tmp_path))
+    monkeypatch.setitem(config.reranker.cluster, "k", 4)
+    scorer = get_scorer_cls("cluster")(config, "model")
+    scores = scorer.score(candidates, corpus, weights, corpus_ids)
+    # Each candidate is matched to the interest made of papers from its own topic.
+    assert labels[scorer.representatives[scorer.matched]].tolist() == [0, 1, 2, 3]
+    assert scores.min() > 0.5
+
+    cached = get_scorer_cls("cluster")(config, "model")
+    np.testing.assert_array_equal(cached.score(candidates, np.zeros_like(corpus), weights, corpus_ids), scores)
+
+    refitted = get_scorer_cls("cluster")(config, "model")
+    refitted_scores = refitted.score(candidates, corpus[10:], weights[10:] / weights[10:].sum(), corpus_ids[10:])
+    assert labels[10:][refitted.representatives[refitted.matched]].tolist() == [0, 1, 2, 3]
+    np.testing.assert_allclose(refitted_scores, scores, atol=0.01)
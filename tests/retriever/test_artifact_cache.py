@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+
+from omegaconf import open_dict
+
+from zotero_arxiv_daily.protocol import Paper
+from zotero_arxiv_daily.retriever.artifact_cache import ArtifactCache
+from zotero_arxiv_daily.retriever.base import BaseRetriever, register_retriever
+from zotero_arxiv_daily.retriever.pipeline import FullTextPipeline
+
+
+def write(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def test_artifact_cache_round_trip_and_dedup(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), max_bytes=2**20)
+    source = write(tmp_path / "paper.pdf", b"%PDF same bytes")
+    cache.put_file("arxiv:1v1", "pdf", source)
+    cache.put_file("arxiv:2v1", "pdf", source)
+    cache.put_text("arxiv:1v1", "pdf.text", "extracted")
+
+    with open(cache.get_file("arxiv:2v1", "pdf"), "rb") as f:
+        assert f.read() == b"%PDF same bytes"
+    assert cache.get_text("arxiv:1v1", "pdf.text") == "extracted"
+    assert cache.get_file("arxiv:1v2", "pdf") is None
+    assert cache.get_file("arxiv:1v1", "pdf") == cache.get_file("arxiv:2v1", "pdf")
+    assert cache.total_bytes() == len(b"%PDF same bytes") + len(b"extracted")
+
+
+def test_artifact_cache_drops_corrupt_blobs(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), max_bytes=2**20)
+    cache.put_file("arxiv:1v1", "pdf", write(tmp_path / "paper.pdf", b"%PDF original"))
+    write(cache.get_file("arxiv:1v1", "pdf"), b"%PDF truncat")
+    assert cache.get_file("arxiv:1v1", "pdf") is None
+    assert cache.total_bytes() == 0
+
+
+def test_artifact_cache_evicts_least_recently_used(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), max_bytes=250)
+    for i in range(3):
+        cache.put_file(f"arxiv:{i}v1", "pdf", write(tmp_path / f"{i}.pdf", bytes([i]) * 100))
+        if i == 1:
+            cache.get_file("arxiv:0v1", "pdf")
+    assert cache.get_file("arxiv:0v1", "pdf") is not None
+    assert cache.get_file("arxiv:1v1", "pdf") is None
+    assert cache.get_file("arxiv:2v1", "pdf") is not None
+    assert cache.total_bytes() <= 250
+
+
+@register_retriever("cached_test")
+class CachedTestRetriever(BaseRetriever):
+    full_text_sources = ("pdf",)
+    downloads = []
+
+    def _retrieve_raw_papers(self):
+        return []
+
+    def convert_to_paper(self, raw_paper):
+        return None
+
+    def artifact_key(self, paper):
+        return f"test:{paper.title}"
+
+    def download_full_text(self, paper, source, directory):
+        self.downloads.append(paper.title)
+        return write(os.path.join(directory, "paper.pdf"), paper.title.encode())
+
+    def parse_full_text(self, paper, source, path):
+        with open(path) as f:
+            return f"parsed {f.read()}"
+
+
+def test_pipeline_rerun_is_served_from_cache(config, tmp_path):
+    with open_dict(config.source):
+        config.source.cached_test = {}
+    retriever = CachedTestRetriever(config)
+    papers = [Paper(source="cached_test", title=f"paper {i}", authors=[], abstract="", url="") for i in range(6)]
+    cache = ArtifactCache(str(tmp_path / "artifacts"), max_bytes=2**20)
+
+    first = FullTextPipeline(retriever, download_workers=2, parse_workers=1, cache=cache)
+    assert first.run(papers) == [f"parsed paper {i}" for i in range(6)]
+    assert len(retriever.downloads) == 6
+
+    rerun = FullTextPipeline(retriever, download_workers=2, parse_workers=1, cache=cache)
+    assert rerun.run(papers) == [f"parsed paper {i}" for i in range(6)]
+    assert len(retriever.downloads) == 6
+    assert rerun.stats.text_cache_hits == 6
+    assert rerun.stats.parse_time == 0
+
+
+class FailingCache(ArtifactCache):
+    def get_text(self, key, kind):
+        raise sqlite3.OperationalError("database is locked")
+
+    def put_file(self, key, kind, path):
+        raise OSError(28, "No space left on device")
+
+    put_text = put_bytes = put_file
+
+
+def test_pipeline_survives_a_failing_cache(config, tmp_path):
+    with open_dict(config.source):
+        config.source.cached_test = {}
+    retriever = CachedTestRetriever(config)
+    papers = [Paper(source="cached_test", title=f"paper {i}", authors=[], abstract="", url="") for i in range(4)]
+    pipeline = FullTextPipeline(retriever, download_workers=2, parse_workers=1, cache=FailingCache(str(tmp_path / "artifacts"), max_bytes=2**20))
+    results = []
+    thread = threading.Thread(target=lambda: results.append(pipeline.run(papers)), daemon=True)
+    thread.start()
+    thread.join(120)
+    assert not thread.is_alive()
+    assert results == [[f"parsed paper {i}" for i in range(4)]]
@@ -1,8 +1,15 @@
-from zotero_arxiv_daily.retriever.arxiv_retriever import ArxivRetriever
+from zotero_arxiv_daily.retriever import arxiv_retriever
+from zotero_arxiv_daily.retriever.arxiv_retriever import ArxivRetriever, result_from_feed_entry
+from arxiv import Result as ArxivResult
 from zotero_arxiv_daily.retriever.base import BaseRetriever, register_retriever
+from zotero_arxiv_daily.retriever.pipeline import FullTextPipeline
+from zotero_arxiv_daily.retriever.sandbox import SandboxPool
 from zotero_arxiv_daily.protocol import Paper
 import feedparser
 import io
+import os
+import threading
+import time
 from omegaconf import open_dict
 from urllib.error import HTTPError
 
@@ -51,7 +58,7 @@ class FailingTestRetriever(BaseRetriever):
         )
 
 
-def test_retrieve_papers_skips_non_pickleable_worker_errors(config):
+def test_retrieve_papers_skips_papers_that_fail_to_convert(config):
     with open_dict(config.source):
         config.source.failing_test = {}
     config.executor.max_workers = 2
@@ -61,3 +68,157 @@ def test_retrieve_papers_skips_non_pickleable_worker_errors(config):
     papers = retriever.retrieve_papers()
 
     assert [paper.title for paper in papers] == ["good paper"]
+
+
+@register_retriever("full_text_test")
+class FullTextTestRetriever(BaseRetriever):
+    full_text_sources = ("pdf", "tar")
+
+    def _retrieve_raw_papers(self) -> list[dict[str, str]]:
+        return [{"title": "first"}, {"title": "second"}, {"title": "no pdf"}, {"title": "broken"}]
+
+    def convert_to_paper(self, raw_paper: dict[str, str]) -> Paper | None:
+        return Paper(source=self.name, title=raw_paper["title"], authors=[], abstract="", url="https://example.com")
+
+    def download_full_text(self, paper: Paper, source: str, directory: str) -> str | None:
+        if paper.title == "no pdf" and source == "pdf":
+            return None
+        path = os.path.join(directory, source)
+        with open(path, "w") as f:
+            f.write(f"{source} of {paper.title}")
+        return path
+
+    def parse_full_text(self, paper: Paper, source: str, path: str) -> str | None:
+        if paper.title == "broken":
+            raise HTTPError(url=paper.url, code=404, msg="not found", hdrs=None, fp=io.BufferedReader(io.BytesIO(b"")))
+        with open(path) as f:
+            return f"parsed {f.read()}"
+
+
+def test_full_text_is_only_fetched_when_enriching(config):
+    with open_dict(config.source):
+        config.source.full_text_test = {}
+    config.executor.max_workers = 2
+
+    retriever = FullTextTestRetriever(config)
+    papers = retriever.retrieve_papers()
+    assert [p.full_text for p in papers] == [None, None, None, None]
+
+    retriever.enrich_papers(papers[1:])
+    assert [p.full_text for p in papers] == [None, "parsed pdf of second", "parsed tar of no pdf", None]
+
+
+def test_full_text_pipeline_reports_stage_metrics(config):
+    with open_dict(config.source):
+        config.source.full_text_test = {}
+    retriever = FullTextTestRetriever(config)
+    papers = [Paper(source="full_text_test", title=f"paper {i}", authors=[], abstract="", url="") for i in range(20)]
+
+    pipeline = FullTextPipeline(retriever, download_workers=4, parse_workers=2, queue_size=3)
+    texts = pipeline.run(papers)
+
+    assert texts == [f"parsed pdf of paper {i}" for i in range(20)]
+    assert pipeline.stats.papers == 20
+    assert 0 < pipeline.stats.download_utilization <= 1
+    assert 0 < pipeline.stats.parse_utilization <= 1
+    assert pipeline.stats.max_queue_depth <= 3
+
+
+def test_full_text_pipeline_stops_downloads_when_parsing_fails(config, monkeypatch):
+    with open_dict(config.source):
+        config.source.full_text_test = {}
+    def broken_submit(self, fn, *args):
+        raise RuntimeError("parse pool is broken")
+    monkeypatch.setattr(SandboxPool, "submit", broken_submit)
+    retriever = FullTextTestRetriever(config)
+    papers = [Paper(source="full_text_test", title=f"paper {i}", authors=[], abstract="", url="") for i in range(20)]
+    pipeline = FullTextPipeline(retriever, download_workers=4, parse_workers=1, queue_size=1)
+    errors = []
+    def run():
+        try:
+            pipeline.run(papers)
+        except RuntimeError as exc:
+            errors.append(exc)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ["parse pool is broken"]
+
+
+@register_retriever("hedge_test")
+class HedgeTestRetriever(FullTextTestRetriever):
+    def parse_full_text(self, paper: Paper, source: str, path: str) -> str | None:
+        if paper.title.startswith("slow") and source == "pdf":
+            time.sleep(60)
+        if paper.title.startswith("failing") and source == "pdf":
+            time.sleep(1.5)
+            return None
+        return super().parse_full_text(paper, source, path)
+
+
+def test_slow_pdfs_are_hedged_with_the_source(config):
+    with open_dict(config.source):
+        config.source.hedge_test = {}
+    retriever = HedgeTestRetriever(config)
+    titles = ["fast", "slow", "failing", "fast again"]
+    papers = [Paper(source="hedge_test", title=t, authors=[], abstract="", url="") for t in titles]
+
+    pipeline = FullTextPipeline(retriever, download_workers=4, parse_workers=4, hedge_delay=1)
+    start = time.perf_counter()
+    texts = pipeline.run(papers)
+
+    assert time.perf_counter() - start < 30
+    assert texts == ["parsed pdf of fast", "parsed tar of slow", "parsed tar of failing", "parsed pdf of fast again"]
+    assert pipeline.stats.hedged == 2
+    assert pipeline.stats.winners == {"tar": 2}
+    assert len(pipeline.stats.latencies["pdf"]) == 2 and len(pipeline.stats.latencies["tar"]) == 2
+    # The slow pdf lost and was cancelled, which is not counted as a kill.
+    assert sorted(str(r.killed) for r in pipeline.stats.reports[1]) == ["None", "cancelled"]
+    assert pipeline.stats.kills == 0
+
+
+def test_papers_are_built_from_feed_entries(config, monkeypatch):
+    parsed_result = feedparser.parse("tests/retriever/arxiv_rss_example.xml")
+    monkeypatch.setattr(feedparser, "parse", lambda url: parsed_result)
+    searched = []
+    def mock_search_arxiv_ids(paper_ids):
+        searched.append(paper_ids)
+        return [ArxivResult(entry_id=f"http://arxiv.org/abs/{i[:-2]}v2", title="From api", summary="Api abstract") for i in paper_ids]
+    monkeypatch.setattr(arxiv_retriever, "search_arxiv_ids", mock_search_arxiv_ids)
+    config.source.arxiv.include_cross_list = True
+    try:
+        retriever = ArxivRetriever(config)
+        papers = [retriever.convert_to_paper(r) for r in retriever._retrieve_raw_papers()]
+        assert len(papers) == len(parsed_result.entries)
+        paper = papers[0]
+        assert paper.title == parsed_result.entries[0].title
+        assert paper.authors == ["Chunhua Liu", "Kabir Manandhar Shrestha", "Sukai Huang"]
+        assert paper.abstract.startswith("As large language models (LLMs)")
+        assert paper.url == "http://arxiv.org/abs/2508.13426v1"
+        assert paper.pdf_url == "http://arxiv.org/pdf/2508.13426v1"
+
+        # Only the last entry of the example feed lacks authors and abstract, so only it is looked up on the arxiv api.
+        assert searched == [["2508.13435v1"]]
+        assert [p.title for p in papers[:4]] == [e.title for e in parsed_result.entries[:4]]
+        assert papers[4].title == "From api"
+
+        # Incomplete entries are looked up together.
+        searched.clear()
+        parsed_result.entries[1]["summary"] = ""
+        papers = [retriever.convert_to_paper(r) for r in retriever._retrieve_raw_papers()]
+        assert searched == [["2508.13428v1", "2508.13435v1"]]
+        assert [p.title for p in papers] == [parsed_result.entries[0].title, "From api"] + [e.title for e in parsed_result.entries[2:4]] + ["From api"]
+    finally:
+        config.source.arxiv.include_cross_list = False
+
+
+def test_tex_accents_in_feed_authors_are_unescaped():
+    entry = feedparser.FeedParserDict(
+        id="oai:arXiv.org:2508.00001v1",
+        title="A paper",
+        author=r"Paulo Andr\'e, J\"{o}rg M\"uller, \c{C}a\u{g}r{\i} Y{\i}lmaz, S{\o}ren Gau\ss, Plain Name",
+        summary="Abstract",
+    )
+    authors = [a.name for a in result_from_feed_entry(entry).authors]
+    assert authors == ["Paulo André", "Jörg Müller", "Çağrı Yılmaz", "Søren Gauß", "Plain Name"]
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+import requests
+
+from zotero_arxiv_daily.retriever import biorxiv_retriever
+from zotero_arxiv_daily.retriever.biorxiv_retriever import BiorxivRetriever, backoff_delay
+from zotero_arxiv_daily.retriever.medrxiv_retriever import MedrxivRetriever
+
+TOTAL = 250
+PAGE_SIZE = 100
+
+
+def make_listing():
+    # Two days of papers, the latest on the last pages, in three categories.
+    categories = ["neuroscience", "genomics", "zoology"]
+    return [{
+        "doi": f"10.1101/{i:06d}",
+        "version": "1",
+        "title": f"Paper {i}",
+        "authors": "Doe, J.; Roe, R.",
+        "abstract": f"Abstract {i}",
+        "date": "2025-01-01" if i < 130 else "2025-01-02",
+        "category": categories[i % 3],
+    } for i in range(TOTAL)]
+
+
+class FakeResponse:
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status != 200:
+            raise requests.HTTPError(f"{self.status} error")
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, listing, failures=0):
+        self.listing = listing
+        self.failures = failures
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        with self.lock:
+            self.requested.append(url)
+            if self.failures:
+                self.failures -= 1
+                return FakeResponse(None, status=503)
+        cursor = int(url.rsplit("/", 1)[-1])
+        page = self.listing[cursor:cursor + PAGE_SIZE]
+        messages = [{"status": "ok", "cursor": cursor, "count": len(page), "total": str(len(self.listing))}]
+        return FakeResponse({"messages": messages, "collection": page})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+@pytest.fixture
+def biorxiv_config(config):
+    config.source.biorxiv.category = ["Neuroscience", "genomics"]
+    config.source.medrxiv.category = ["zoology"]
+    try:
+        yield config
+    finally:
+        config.source.biorxiv.category = None
+        config.source.medrxiv.category = None
+
+
+def test_all_pages_are_retrieved_and_filtered(biorxiv_config, monkeypatch):
+    session = FakeSession(make_listing())
+    monkeypatch.setattr(biorxiv_retriever, "make_session", lambda: session)
+    papers = BiorxivRetriever(biorxiv_config)._retrieve_raw_papers()
+
+    assert sorted(url.rsplit("/", 1)[-1] for url in session.requested) == ["0", "100", "200"]
+    expected = [p for p in make_listing() if p["date"] == "2025-01-02" and p["category"] in ("neuroscience", "genomics")]
+    assert papers == expected
+    assert session.requested[0] == "https://api.biorxiv.org/details/biorxiv/2d/0"
+
+
+def test_medrxiv_uses_its_own_server(biorxiv_config, monkeypatch):
+    session = FakeSession(make_listing())
+    monkeypatch.setattr(biorxiv_retriever, "make_session", lambda: session)
+    papers = MedrxivRetriever(biorxiv_config)._retrieve_raw_papers()
+    assert all("/details/medrxiv/" in url for url in session.requested)
+    assert {p["category"] for p in papers} == {"zoology"}
+
+
+def test_failed_pages_are_retried_with_jittered_backoff(biorxiv_config, monkeypatch):
+    session = FakeSession(make_listing(), failures=3)
+    delays = []
+    monkeypatch.setattr(biorxiv_retriever, "make_session", lambda: session)
+    monkeypatch.setattr(biorxiv_retriever, "sleep", delays.append)
+    papers = BiorxivRetriever(biorxiv_config)._retrieve_raw_papers()
+
+    assert len(session.requested) == 3 + 3
+    assert len(delays) == 3
+    assert papers[-1]["title"] == "Paper 249"
+    assert all(0 <= backoff_delay(i) <= 2 ** i for i in range(5) for _ in range(20))
+
+
+def test_empty_listing_returns_no_papers(biorxiv_config, monkeypatch):
+    monkeypatch.setattr(biorxiv_retriever, "make_session", lambda: FakeSession([]))
+    assert BiorxivRetriever(biorxiv_config)._retrieve_raw_papers() == []
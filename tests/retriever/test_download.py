@@ -0,0 +1,82 @@
+import os
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from urllib.request import urlretrieve
+
+import pytest
+
+from zotero_arxiv_daily.retriever.download import document_size, download_document
+
+
+class ChunkedHandler(SimpleHTTPRequestHandler):
+    """Serves files without a Content-Length when asked for ``?chunked``, like a streamed response."""
+    def log_message(self, format, *args):
+        pass
+
+    def send_header(self, keyword, value):
+        if keyword == "Content-Length" and self.path.endswith("?chunked"):
+            return
+        super().send_header(keyword, value)
+
+    def translate_path(self, path):
+        return super().translate_path(path.split("?")[0])
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("www")
+    (root / "small.pdf").write_bytes(b"%PDF" + os.urandom(1000))
+    (root / "large.pdf").write_bytes(b"%PDF" + os.urandom(300_000))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(ChunkedHandler, directory=str(root)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", root
+    httpd.shutdown()
+
+
+@pytest.mark.parametrize("query", ["", "?chunked"])
+def test_small_documents_stay_in_memory(server, tmp_path, query):
+    url, root = server
+    spill = tmp_path / "paper.pdf"
+    document = download_document(f"{url}/small.pdf{query}", str(spill), max_memory=2**16)
+    assert document == (root / "small.pdf").read_bytes()
+    assert not spill.exists()
+
+
+@pytest.mark.parametrize("query", ["", "?chunked"])
+def test_large_documents_spill_to_disk(server, tmp_path, query):
+    url, root = server
+    spill = tmp_path / "paper.pdf"
+    document = download_document(f"{url}/large.pdf{query}", str(spill), max_memory=2**16)
+    assert document == str(spill)
+    assert spill.read_bytes() == (root / "large.pdf").read_bytes()
+    assert document_size(document) == 300_004
+
+
+@pytest.mark.benchmark
+def test_in_memory_download_saves_file_io(server):
+    url, _ = server
+    runs = 200
+
+    start = perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(runs):
+            path = os.path.join(directory, f"{i}.pdf")
+            urlretrieve(f"{url}/large.pdf", path)
+            with open(path, "rb") as f:
+                f.read()
+            os.remove(path)
+    file_time = perf_counter() - start
+
+    start = perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(runs):
+            download_document(f"{url}/large.pdf", os.path.join(directory, f"{i}.pdf"))
+    memory_time = perf_counter() - start
+
+    written = runs * 300_004 / 2**20
+    print(f"Temporary files: {file_time:.2f}s and {written:.0f} MB written, in memory: {memory_time:.2f}s and 0 MB written")
+    assert memory_time < file_time * 1.5
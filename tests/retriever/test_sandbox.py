@@ -0,0 +1,149 @@
+import os
+import resource
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from omegaconf import open_dict
+
+from zotero_arxiv_daily.protocol import Paper
+from zotero_arxiv_daily.retriever import sandbox
+from zotero_arxiv_daily.retriever.base import BaseRetriever, register_retriever
+from zotero_arxiv_daily.retriever.pipeline import _init_parse_worker, _parse
+from zotero_arxiv_daily.retriever.sandbox import SandboxKilled, SandboxPool, SandboxWorker
+
+
+def add(a, b):
+    return a + b
+
+
+def sleep_forever():
+    time.sleep(60)
+
+
+def allocate(mb):
+    return len(bytearray(mb * 2**20))
+
+
+def spin():
+    while True:
+        pass
+
+
+def test_sandbox_runs_tasks_and_reports_resource_use():
+    worker = SandboxWorker(timeout=30)
+    try:
+        result, report = worker.run(add, 1, 2)
+    finally:
+        worker.stop()
+    assert result == 3
+    assert report.killed is None
+    assert report.wall_time > 0
+    assert report.peak_memory_mb > 0
+
+
+def test_sandbox_kills_tasks_past_the_timeout_and_recovers():
+    worker = SandboxWorker(timeout=5)
+    try:
+        worker.run(add, 0, 0)
+        worker.timeout = 0.5
+        start = time.perf_counter()
+        with pytest.raises(SandboxKilled) as exc_info:
+            worker.run(sleep_forever)
+        assert time.perf_counter() - start < 5
+        assert exc_info.value.report.killed == "timeout"
+        worker.timeout = 30
+        assert worker.run(add, 2, 2)[0] == 4
+    finally:
+        worker.stop()
+
+
+def test_sandbox_enforces_memory_and_cpu_limits():
+    worker = SandboxWorker(timeout=30, memory_limit_mb=256, cpu_limit=1)
+    try:
+        with pytest.raises(SandboxKilled) as exc_info:
+            worker.run(allocate, 1024)
+        assert exc_info.value.report.killed == "memory limit"
+        assert worker.run(allocate, 16)[0] == 16 * 2**20
+
+        with pytest.raises(SandboxKilled) as exc_info:
+            worker.run(spin)
+        assert exc_info.value.report.killed == "cpu limit"
+        assert exc_info.value.report.wall_time < 10
+    finally:
+        worker.stop()
+
+
+def test_sandbox_pool_recycles_workers():
+    with SandboxPool(1, timeout=30, max_tasks=2) as pool:
+        pids = [pool.submit(os.getpid).result()[0] for _ in range(4)]
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+    assert os.getpid() not in pids
+
+
+def test_sandbox_pool_cancels_running_tasks():
+    with SandboxPool(1, timeout=30) as pool:
+        running = pool.submit(sleep_forever)
+        queued = pool.submit(add, 1, 1)
+        time.sleep(1)
+        start = time.perf_counter()
+        assert pool.cancel(queued) and pool.cancel(running)
+        with pytest.raises(SandboxKilled) as exc_info:
+            running.result()
+        assert time.perf_counter() - start < 5
+        assert exc_info.value.report.killed == "cancelled"
+        assert queued.cancelled()
+        assert pool.submit(add, 2, 2).result()[0] == 4
+        done = pool.submit(add, 3, 3)
+        done.result()
+        assert not pool.cancel(done)
+
+
+@register_retriever("allocating_test")
+class AllocatingTestRetriever(BaseRetriever):
+    full_text_sources = ("pdf",)
+
+    def _retrieve_raw_papers(self):
+        return []
+
+    def convert_to_paper(self, raw_paper):
+        return None
+
+    def parse_full_text(self, paper, source, document):
+        return str(allocate(int(paper.title)))
+
+
+def test_memory_errors_in_parsers_reach_the_sandbox(config):
+    with open_dict(config.source):
+        config.source.allocating_test = {}
+    worker = SandboxWorker(initializer=_init_parse_worker, initargs=(AllocatingTestRetriever, config), timeout=60, memory_limit_mb=256)
+    paper = lambda mb: Paper(source="allocating_test", title=str(mb), authors=[], abstract="", url="")
+    try:
+        with pytest.raises(SandboxKilled) as exc_info:
+            worker.run(_parse, paper(1024), "pdf", b"")
+        assert exc_info.value.report.killed == "memory limit"
+        assert worker.run(_parse, paper(16), "pdf", b"")[0] == str(16 * 2**20)
+    finally:
+        worker.stop()
+
+
+def test_peak_memory_is_measured_per_task():
+    worker = SandboxWorker(timeout=30)
+    try:
+        _, large = worker.run(allocate, 256)
+        _, small = worker.run(allocate, 1)
+    finally:
+        worker.stop()
+    assert large.peak_memory_mb > 256
+    assert small.peak_memory_mb < large.peak_memory_mb - 128
+
+
+def test_peak_memory_without_proc_is_reported_in_megabytes(monkeypatch):
+    def no_proc(path, *args, **kwargs):
+        raise OSError(path)
+    monkeypatch.setattr(sandbox, "open", no_proc, raising=False)
+    monkeypatch.setattr(resource, "getrusage", lambda who: SimpleNamespace(ru_maxrss=300 * 2**20))
+    monkeypatch.setattr(sys, "platform", "darwin")
+    # ru_maxrss is in bytes on macOS.
+    assert sandbox._peak_memory_mb() == 300
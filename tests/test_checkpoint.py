@@ -0,0 +1,148 @@
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from conftest import FakeRetriever, make_executor
+from zotero_arxiv_daily import executor as executor_module
+from zotero_arxiv_daily.checkpoint import RunCheckpoint, config_hash
+from zotero_arxiv_daily.protocol import CorpusPaper, Paper
+
+
+class FakeCorpusSource:
+    name = "fake"
+
+    def __init__(self):
+        self.fetches = 0
+
+    def fetch_corpus(self):
+        self.fetches += 1
+        return [CorpusPaper(title=f"c{i}", abstract=f"corpus {i}", added_date=datetime(2026, 1, i + 1), paths=[]) for i in range(3)]
+
+
+class FakeReranker:
+    def __init__(self):
+        self.reranks = 0
+
+    def rerank_stream(self, batches, corpus):
+        self.reranks += 1
+        # Sources arrive in any order, so the papers are ranked by title.
+        papers = sorted((p for batch in batches for p in batch), key=lambda p: p.title)
+        for i, p in enumerate(papers):
+            p.score = float(len(papers) - i)
+        return papers
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def run_config(config, tmp_path):
+    config.executor.cache_dir = str(tmp_path)
+    try:
+        yield config
+    finally:
+        config.executor.cache_dir = None
+        config.executor.resume = False
+
+
+def make_run_executor(config, retrievers):
+    executor = make_executor(*retrievers, config=config)
+    executor.corpus_source = FakeCorpusSource()
+    executor.reranker = FakeReranker()
+    return executor
+
+
+def test_resumed_run_only_redoes_failed_work(run_config, monkeypatch):
+    llm_down = {"tldr": {"first 1"}, "affiliations": set()}
+    def fake_tldr(self, client, params):
+        if self.title in llm_down["tldr"]:
+            raise TimeoutError("llm")
+        return f"tldr of {self.title}"
+    monkeypatch.setattr(Paper, "_generate_tldr_with_llm", fake_tldr)
+    monkeypatch.setattr(Paper, "_generate_affiliations_with_llm", lambda self, client, params: ["Somewhere"])
+    monkeypatch.setattr(executor_module, "render_email", lambda papers: [(p.title, p.tldr) for p in papers])
+    sent = []
+    def fake_send(config, content):
+        if not sent:
+            sent.append(None)
+            raise ConnectionError("smtp down")
+        sent.append(content)
+    monkeypatch.setattr(executor_module, "send_email", fake_send)
+
+    first = make_run_executor(run_config, [FakeRetriever("first"), FakeRetriever("second")])
+    with pytest.raises(ConnectionError):
+        first.run()
+
+    run_config.executor.resume = True
+    llm_down["tldr"] = set()
+    resumed = make_run_executor(run_config, [FakeRetriever("first"), FakeRetriever("second")])
+    resumed.run()
+
+    assert resumed.corpus_source.fetches == 0 and resumed.reranker.reranks == 0
+    assert all(r.retrievals == 0 for r in resumed.retrievers.values())
+    # Only the paper whose TLDR failed is enriched again.
+    assert resumed.retrievers["first"].enriched == ["first 1"]
+    assert sent[1] == [(p, f"tldr of {p}") for p in ["first 0", "first 1", "first 2", "second 0", "second 1", "second 2"]]
+
+    # Once sent, resuming again does nothing.
+    make_run_executor(run_config, [FakeRetriever("first")]).run()
+    assert len(sent) == 2
+
+
+def test_resume_retries_only_the_failed_source(run_config, monkeypatch):
+    monkeypatch.setattr(executor_module, "send_email", lambda config, content: (_ for _ in ()).throw(ConnectionError("smtp down")))
+    monkeypatch.setattr(executor_module, "render_email", lambda papers: "")
+    monkeypatch.setattr(Paper, "_generate_tldr_with_llm", lambda self, client, params: "tldr")
+    monkeypatch.setattr(Paper, "_generate_affiliations_with_llm", lambda self, client, params: [])
+    with pytest.raises(ConnectionError):
+        make_run_executor(run_config, [FakeRetriever("healthy"), FakeRetriever("flaky", 0, error=ConnectionError("down"))]).run()
+
+    run_config.executor.resume = True
+    resumed = make_run_executor(run_config, [FakeRetriever("healthy"), FakeRetriever("flaky")])
+    with pytest.raises(ConnectionError):
+        resumed.run()
+    assert resumed.corpus_source.fetches == 0
+    assert resumed.retrievers["healthy"].retrievals == 0
+    assert resumed.retrievers["flaky"].retrievals == 1
+    assert resumed.reranker.reranks == 1
+
+
+def test_run_directory_is_keyed_by_date_and_config(run_config):
+    checkpoint = RunCheckpoint(run_config, date="2026-01-02")
+    assert os.path.basename(checkpoint.path) == f"2026-01-02-{config_hash(run_config)}"
+    checkpoint.save_papers("reranked", [Paper(source="s", title="t", authors=[], abstract="", url="", full_text="long", score=1.5)])
+    assert checkpoint.load_papers("reranked")[0].full_text is None
+
+    run_config.executor.resume = True
+    assert config_hash(run_config) == os.path.basename(checkpoint.path).split("-", 3)[-1]
+    assert RunCheckpoint(run_config, date="2026-01-02").stages() == ["reranked"]
+    run_config.executor.resume = False
+    # Without resume, the run starts over.
+    assert RunCheckpoint(run_config, date="2026-01-02").stages() == []
+    run_config.executor.max_paper_num += 1
+    try:
+        assert config_hash(run_config) not in checkpoint.path
+    finally:
+        run_config.executor.max_paper_num -= 1
+
+
+def test_live_sources_start_before_saved_papers_are_yielded(run_config):
+    checkpoint = RunCheckpoint(run_config, date="2026-01-03")
+    checkpoint.save_papers("candidates-saved", list(FakeRetriever("saved").iter_papers()))
+    started = threading.Event()
+
+    class StartedRetriever(FakeRetriever):
+        def iter_papers(self):
+            started.set()
+            yield from super().iter_papers()
+
+    executor = make_run_executor(run_config, [FakeRetriever("saved"), StartedRetriever("live")])
+    chunks = executor.retrieve_papers(checkpoint)
+    assert [p.title for p in next(chunks)] == ["saved 0", "saved 1", "saved 2"]
+    # The live source is retrieved while the saved papers are consumed.
+    assert started.wait(10)
+    assert [p.title for p in next(chunks)] == ["live 0", "live 1", "live 2"]
+    assert list(chunks) == []
+    assert executor.retrievers["saved"].retrievals == 0
@@ -0,0 +1,70 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from conftest import FakeRetriever, make_executor
+from zotero_arxiv_daily.protocol import CorpusPaper, Paper
+from zotero_arxiv_daily.reranker.base import BaseReranker
+
+
+def test_sources_are_retrieved_concurrently_and_streamed():
+    slow_released = threading.Event()
+    executor = make_executor(FakeRetriever("fast", 300), FakeRetriever("slow", 5, released=slow_released))
+    chunks = executor.retrieve_papers()
+    # The fast source is consumed while the slow one has not even started.
+    first = next(chunks)
+    assert first[0].source == "fast" and len(first) == 256
+    assert len(next(chunks)) == 44
+    slow_released.set()
+    rest = list(chunks)
+    assert [p.title for p in rest[0]] == [f"slow {i}" for i in range(5)]
+
+
+def test_a_failing_source_does_not_stop_the_others():
+    executor = make_executor(
+        FakeRetriever("broken", 3, error=ConnectionError("reset")),
+        FakeRetriever("healthy", 4, delay=0.2),
+    )
+    papers = [p for chunk in executor.retrieve_papers() for p in chunk]
+    assert sorted(p.title for p in papers if p.source == "healthy") == [f"healthy {i}" for i in range(4)]
+    assert len([p for p in papers if p.source == "broken"]) == 3
+
+
+def test_failing_every_source_is_an_error():
+    executor = make_executor(FakeRetriever("a", 0, error=ValueError("a")), FakeRetriever("b", 0, error=ValueError("b")))
+    with pytest.raises(RuntimeError, match="every source"):
+        list(executor.retrieve_papers())
+
+
+class CountingReranker(BaseReranker):
+    """Embeds texts by character counts, recording the size of every encoded batch."""
+    def __init__(self, config):
+        super().__init__(config)
+        self.batches = []
+
+    @property
+    def model_id(self):
+        return "counting"
+
+    def encode(self, texts):
+        self.batches.append(len(texts))
+        return np.array([[t.count(c) + 1 for c in "aeiou0123456789"] for t in texts], dtype=np.float32)
+
+
+def test_streamed_reranking_matches_reranking_all_at_once(config):
+    corpus = [CorpusPaper(title=f"c{i}", abstract=f"corpus abstract {i}", added_date=datetime(2026, 1, i + 1), paths=[]) for i in range(20)]
+    make = lambda: [Paper(source="s", title=f"p{i}", authors=[], abstract=f"paper {i} about {'a' * i}", url="") for i in range(30)]
+    papers = make()
+    whole = CountingReranker(config).rerank(papers, corpus)
+
+    streamed_reranker = CountingReranker(config)
+    papers = make()
+    streamed = streamed_reranker.rerank_stream(iter([papers[:10], [], papers[10:]]), corpus)
+
+    assert [p.title for p in streamed] == [p.title for p in whole]
+    assert np.allclose([p.score for p in streamed], [p.score for p in whole])
+    # The corpus, then each batch of candidates as it arrived.
+    assert streamed_reranker.batches == [20, 10, 20]
+    assert CountingReranker(config).rerank_stream(iter([[], []]), corpus) == []
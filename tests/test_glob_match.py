@@ -1,4 +1,4 @@
-from zotero_arxiv_daily.utils import glob_match
+from zotero_arxiv_daily.utils import glob_match, PathMatcher
 
 
 class TestGlobMatch:
@@ -131,3 +131,27 @@ class TestGlobMatch:
         assert glob_match("dir/file.txt", "**/*.txt")
         assert glob_match("dir/subdir/file.txt", "**/*.txt")
         assert glob_match("dir/subdir/subsubdir/file.txt", "**/*.txt")
+
+
+class TestPathMatcher:
+    """Test cases for the PathMatcher class."""
+
+    patterns = ["2026/survey/**", "2026/reading-group/*", "*.txt"]
+
+    def test_agrees_with_glob_match(self):
+        """The combined matcher accepts a path iff one of the patterns does."""
+        matcher = PathMatcher(self.patterns)
+        paths = [
+            "2026/survey", "2026/survey/topic-a", "2026/survey/a/b",
+            "2026/reading-group/week-1", "2026/reading-group/week-1/extra",
+            "notes.txt", "dir/notes.txt", "2025/other", "",
+        ]
+        for path in paths:
+            assert matcher.match(path) == any(glob_match(path, p) for p in self.patterns), path
+
+    def test_select_and_stats(self):
+        """Selection works on distinct paths and statistics count matches per pattern."""
+        matcher = PathMatcher(self.patterns)
+        paths = ["2026/survey/a", "2026/survey/b", "2026/survey/a", "2025/other"]
+        assert matcher.select(paths) == {"2026/survey/a", "2026/survey/b"}
+        assert matcher.stats(paths) == {"2026/survey/**": 2, "2026/reading-group/*": 0, "*.txt": 0}
@@ -0,0 +1,87 @@
+import random
+from time import perf_counter
+
+import pymupdf
+import pytest
+
+from conftest import WordTokenizer
+from zotero_arxiv_daily import utils
+from zotero_arxiv_daily.utils import extract_markdown_from_pdf
+
+WORDS = "model data learning network training results method performance analysis approach".split()
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    monkeypatch.setattr(utils, "get_prompt_tokenizer", lambda: WordTokenizer())
+
+
+@pytest.fixture(scope="module")
+def long_pdf(tmp_path_factory):
+    # A title, sections and subsections in decreasing font sizes, as in a real paper.
+    rng = random.Random(0)
+    doc = pymupdf.open()
+    for p in range(24):
+        page = doc.new_page()
+        y = 72
+        if p == 0:
+            page.insert_text((72, y), "A Paper Title", fontsize=22)
+            y += 40
+        page.insert_text((72, y), f"Section {p + 1}. Heading", fontsize=14)
+        y += 26
+        for s in range(2):
+            page.insert_text((72, y), f"Subsection {p + 1}.{s + 1}", fontsize=12)
+            y += 20
+            for line in range(16):
+                page.insert_text((72, y), " ".join(rng.choice(WORDS) for _ in range(12)), fontsize=10)
+                y += 14
+            y += 8
+    path = str(tmp_path_factory.mktemp("pdf") / "paper.pdf")
+    doc.save(path)
+    return path
+
+
+def test_budgeted_extraction_matches_the_truncated_full_text(long_pdf):
+    enc = WordTokenizer()
+    full = extract_markdown_from_pdf(long_pdf)
+    partial = extract_markdown_from_pdf(long_pdf, max_tokens=2000)
+    assert len(partial) < len(full) / 3
+    assert "### Subsection 2.1" in partial
+    assert full.startswith(partial)
+    prompt = "Title:\n A paper\n\nPreview of main content:\n {}\n\n"
+    assert enc.decode(enc.encode(prompt.format(partial))[:2000]) == enc.decode(enc.encode(prompt.format(full))[:2000])
+
+
+def test_a_larger_heading_on_a_later_page_is_ranked_like_the_whole_document(long_pdf, tmp_path):
+    doc = pymupdf.open(long_pdf)
+    doc[-1].insert_text((72, 760), "Appendix", fontsize=18)
+    path = str(tmp_path / "appendix.pdf")
+    doc.save(path)
+    full = extract_markdown_from_pdf(path)
+    partial = extract_markdown_from_pdf(path, max_tokens=2000)
+    # The appendix heading pushes every section down a level, which the first pages cannot tell.
+    assert "#### Subsection 2.1" in full
+    assert full.startswith(partial)
+
+
+def test_extraction_stops_at_max_pages(long_pdf):
+    assert extract_markdown_from_pdf(long_pdf, max_pages=2).count("Section") == 2
+    assert extract_markdown_from_pdf(long_pdf, max_tokens=10**6, max_pages=3).count("Section") == 3
+
+
+def test_extraction_from_bytes_matches_the_file(long_pdf):
+    with open(long_pdf, "rb") as f:
+        data = f.read()
+    assert extract_markdown_from_pdf(data, max_tokens=2000) == extract_markdown_from_pdf(long_pdf, max_tokens=2000)
+
+
+@pytest.mark.benchmark
+def test_budgeted_extraction_parse_time(long_pdf):
+    start = perf_counter()
+    extract_markdown_from_pdf(long_pdf)
+    full_time = perf_counter() - start
+    start = perf_counter()
+    extract_markdown_from_pdf(long_pdf, max_tokens=4000)
+    budget_time = perf_counter() - start
+    print(f"Whole document: {full_time:.2f}s, 4000 token budget: {budget_time:.2f}s ({full_time / budget_time:.1f}x faster)")
+    assert budget_time < full_time
@@ -0,0 +1,96 @@
+import io
+import tarfile
+from time import perf_counter
+
+import pytest
+
+from zotero_arxiv_daily.utils import clean_tex, extract_tex_code_from_tar
+
+
+def make_tarball(path, files, mode="w:gz"):
+    with tarfile.open(path, mode) as tar:
+        for name, content in files.items():
+            data = content if isinstance(content, bytes) else content.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def test_clean_tex_strips_comments_in_one_pass():
+    source = "a 100\\% b % comment\n\\begin{comment}\nhidden\n\\end{comment}\nc\\iffalse gone \\fi d\n\n\ne"
+    assert clean_tex(source) == "a 100\\% b \n\nc d\ne".replace("\n\n", "\n")
+
+
+def test_includes_are_flattened_transitively(tmp_path):
+    path = make_tarball(tmp_path / "source.tar.gz", {
+        "paper/main.tex": "\\begin{document}\nIntro: \\input{sections/intro}\n\\include{sections/method}\n\\subfile{appendix.tex}\n\\end{document}",
+        "paper/main.bbl": "",
+        "paper/sections/intro.tex": "intro text % a comment\n\\input{sections/details}",
+        "paper/sections/details.tex": "details text",
+        "paper/sections/method.tex": "method text \\input{sections/missing}",
+        "paper/appendix.tex": "\\documentclass[main.tex]{subfiles}\n\\begin{document}\nappendix text\n\\end{document}",
+        "paper/figure.png": b"\x89PNG" + bytes(1000),
+    })
+    contents = extract_tex_code_from_tar(path, "1234.5678")
+    flattened = contents["all"]
+    for text in ["intro text", "details text", "method text", "appendix text"]:
+        assert text in flattened
+    assert "\\input" not in flattened and "\\include" not in flattened and "\\subfile" not in flattened
+    assert "a comment" not in flattened
+    assert "documentclass[main.tex]" not in flattened
+
+
+def test_inclusion_cycles_are_cut(tmp_path):
+    path = make_tarball(tmp_path / "source.tar", {
+        "main.tex": "\\begin{document}\n\\input{a}\n\\end{document}",
+        "a.tex": "a text \\input{b}",
+        "b.tex": "b text \\input{a} \\input{main}",
+    }, mode="w")
+    flattened = extract_tex_code_from_tar(path, "1234.5678")["all"]
+    assert flattened.count("a text") == 1
+    assert flattened.count("b text") == 1
+
+
+def test_only_the_main_file_and_its_inclusions_are_decoded(tmp_path):
+    files = {f"vendor/package{i}.tex": f"\\begin{{document}} vendored {i}" for i in range(50)}
+    files.update({"main.tex": "\\begin{document}\n\\input{body}\n\\end{document}", "body.tex": "body", "main.bbl": ""})
+    contents = extract_tex_code_from_tar(make_tarball(tmp_path / "source.tar.gz", files), "1234.5678")
+    assert set(contents) == {"main.tex", "body.tex", "all"}
+
+
+def test_main_file_falls_back_to_the_document_block(tmp_path):
+    path = make_tarball(tmp_path / "source.tar.gz", {
+        "sample.tex": "\\begin{document} sample \\end{document}",
+        "commented.tex": "% \\begin{document}\nnot the main file",
+        "paper.tex": "\\begin{document} the paper \\end{document}",
+    })
+    assert "the paper" in extract_tex_code_from_tar(path, "1234.5678")["all"]
+    assert extract_tex_code_from_tar(make_tarball(tmp_path / "figures.tar.gz", {"fig.png": b"png"}), "1234.5678") is None
+    (tmp_path / "plain.tex").write_text("not a tarball")
+    assert extract_tex_code_from_tar(str(tmp_path / "plain.tex"), "1234.5678") is None
+
+
+def test_tarball_content_is_read_like_the_file(tmp_path):
+    path = make_tarball(tmp_path / "source.tar.gz", {"main.tex": "\\begin{document}\n\\input{body}\n\\end{document}", "body.tex": "body"})
+    with open(path, "rb") as f:
+        data = f.read()
+    assert extract_tex_code_from_tar(data, "1234.5678") == extract_tex_code_from_tar(path, "1234.5678")
+    assert "body" in extract_tex_code_from_tar(data, "1234.5678")["all"]
+    assert extract_tex_code_from_tar(b"not a tarball", "1234.5678") is None
+
+
+@pytest.mark.benchmark
+def test_flattening_throughput(tmp_path):
+    files = {f"vendor/package{i}.tex": "\\newcommand{\\x}{y} % vendored\n" * 2000 for i in range(200)}
+    files.update({f"figures/fig{i}.pdf": bytes(200_000) for i in range(20)})
+    files.update({f"sections/s{i}.tex": f"Section {i}. " + "Some text. % note\n" * 500 for i in range(10)})
+    files["main.tex"] = "\\begin{document}\n" + "\n".join(f"\\input{{sections/s{i}}}" for i in range(10)) + "\n\\end{document}"
+    files["main.bbl"] = ""
+    path = make_tarball(tmp_path / "source.tar.gz", files)
+    start = perf_counter()
+    for _ in range(5):
+        contents = extract_tex_code_from_tar(path, "1234.5678")
+    elapsed = (perf_counter() - start) / 5
+    print(f"Flattened a {len(files)}-member source in {elapsed * 1000:.1f} ms")
+    assert contents["all"].count("Some text.") == 5000